@@ -278,7 +278,7 @@ class Handler:
 
     def validSource(self) -> bool:
         try:
-            return net.ipInNetwork(self._request.ip, GlobalConfig.ADMIN_TRUSTED_SOURCES.get(True))
+            return net.ipInNetwork(self._request.ip, GlobalConfig.ADMIN_TRUSTED_SOURCES.get())
         except Exception as e:
             logger.warning('Error checking truted ADMIN source: "%s" does not seems to be a valid network string. Using Unrestricted access.', GlobalConfig.ADMIN_TRUSTED_SOURCES.get())
 
@@ -304,8 +304,8 @@ class Handler:
         authId = self.getValue('auth')
         username = self.getValue('username')
         # Maybe it's root user??
-        if (GlobalConfig.SUPER_USER_ALLOW_WEBACCESS.getBool(True) and
-                username == GlobalConfig.SUPER_USER_LOGIN.get(True) and
+        if (GlobalConfig.SUPER_USER_ALLOW_WEBACCESS.getBool() and
+                username == GlobalConfig.SUPER_USER_LOGIN.get() and
                 authId == -1):
             return getRootUser()
         return Authenticator.objects.get(pk=authId).users.get(name=username)
@@ -48,6 +48,7 @@ class Cache(Handler):
     def get(self):
         """
         Processes get method. Basically, clears & purges the cache, no matter what params
+        except for "stats", that returns the local (per process) cache counters
         """
         logger.debug('Params: %s', self._params)
         if not self._args:
@@ -56,6 +57,14 @@ class Cache(Handler):
         if len(self._args) != 1:
             raise RequestError('Invalid Request')
 
+        if self._args[0] == 'stats':
+            return {
+                'hits': uCache.hits,
+                'misses': uCache.misses,
+                'local_items': len(uCache.local),
+                'owners': uCache.stats(),
+            }
+
         uCache.purge()
         djCache.clear()
         return 'done'
@@ -127,7 +127,7 @@ class Login(Handler):
             username, password = self._params['username'], self._params['password']
             locale: str = self._params.get('locale', 'en')
             if authName == 'admin' or authSmallName == 'admin':
-                if GlobalConfig.SUPER_USER_LOGIN.get(True) == username and GlobalConfig.SUPER_USER_PASS.get(True) == password:
+                if GlobalConfig.SUPER_USER_LOGIN.get() == username and GlobalConfig.SUPER_USER_PASS.get() == password:
                     self.genAuthToken(-1, username, password, locale, platform, True, True, scrambler)
                     return Login.result(result='ok', token=self.getAuthToken())
                 return Login.result(error='Invalid credentials')
@@ -107,6 +107,13 @@ class Providers(ModelHandler):
         if item.services.count() > 0:
             raise RequestError(ugettext('Can\'t delete providers with services'))
 
+    def beforeUpdate(self, item: Provider) -> None:
+        # Connection data may change, so connections to current backend are not reused
+        try:
+            item.getInstance().releaseConnections()
+        except Exception:
+            logger.exception('Releasing connections of provider %s', item.name)
+
     # Types related
     def enum_types(self) -> typing.Iterable[typing.Type[services.ServiceProvider]]:
         return services.factory().providers().values()
@@ -34,9 +34,10 @@ import datetime
 import logging
 import typing
 
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Sum, Subquery, OuterRef
+from django.db.models.functions import Coalesce
 from django.utils.translation import ugettext, ugettext_lazy as _
-from uds.models import ServicePool, OSManager, Service, Image, ServicePoolGroup, Account, User, getSqlDatetime
+from uds.models import ServicePool, ServicePoolOccupancy, OSManager, Service, Image, ServicePoolGroup, Account, User, UserService, getSqlDatetime
 from uds.models.calendar_action import (
     CALENDAR_ACTION_INITIAL,
     CALENDAR_ACTION_MAX,
@@ -123,10 +124,13 @@ class ServicesPools(ModelHandler):
         d = getSqlDatetime() - datetime.timedelta(seconds=GlobalConfig.RESTRAINT_TIME.getInt())
         return super().getItems(overview=kwargs.get('overview', True),
             query=(ServicePool.objects.prefetch_related('service', 'service__provider', 'servicesPoolGroup', 'image', 'tags', 'meta', 'account')
-                    .annotate(valid_count=Count('userServices', filter=~Q(userServices__state__in=State.INFO_STATES)))
-                    .annotate(preparing_count=Count('userServices', filter=Q(userServices__state=State.PREPARING)))
-                    .annotate(error_count=Count('userServices', filter=Q(userServices__state=State.ERROR, userServices__state_date__gt=d)))
-                    .annotate(usage_count=Count('userServices', filter=Q(userServices__state__in=State.VALID_STATES, userServices__cache_level=0)))
+                    .annotate(valid_count=Coalesce(Sum('occupancy__count', filter=~Q(occupancy__state__in=State.INFO_STATES)), 0))
+                    .annotate(preparing_count=Coalesce(Sum('occupancy__count', filter=Q(occupancy__state=State.PREPARING)), 0))
+                    .annotate(usage_count=Coalesce(Sum('occupancy__count', filter=Q(occupancy__state__in=State.VALID_STATES, occupancy__cache_level=0)), 0))
+                    .annotate(error_count=Coalesce(Subquery(
+                        UserService.objects.filter(deployed_service=OuterRef('pk'), state=State.ERROR, state_date__gt=d)
+                        .values('deployed_service').annotate(how_many=Count('id')).values('how_many')
+                    ), 0))
             )
         )
         # return super().getItems(overview=kwargs.get('overview', True), prefetch=['service', 'service__provider', 'servicesPoolGroup', 'image', 'tags'])
@@ -189,8 +193,8 @@ class ServicesPools(ModelHandler):
                 restrained = item.error_count >= GlobalConfig.RESTRAINT_COUNT.getInt()
                 usage_count = item.usage_count
             else:
-                valid_count = item.userServices.exclude(state__in=State.INFO_STATES).count()
-                preparing_count = item.userServices.filter(state=State.PREPARING).count()
+                valid_count = ServicePoolOccupancy.countFor(item, excludeStates=State.INFO_STATES)
+                preparing_count = ServicePoolOccupancy.countFor(item, states=[State.PREPARING])
                 restrained = item.isRestrained()
                 usage_count = -1
 
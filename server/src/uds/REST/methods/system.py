@@ -41,6 +41,7 @@ from uds.core.util.stats import counters
 from uds.core.util.cache import Cache
 from uds.core.util.state import State
 from uds.core.util import encoders
+from uds.core.util import http_sessions
 from uds.REST import Handler, RequestError, ResponseError
 
 logger = logging.getLogger(__name__)
@@ -114,6 +115,8 @@ class System(Handler):
                     return getServicesPoolsCounters(None, counters.CT_ASSIGNED)
                 if self._args[1] == 'inuse':
                     return getServicesPoolsCounters(None, counters.CT_INUSE)
+                if self._args[1] == 'http':  # Requests & latency of service providers http clients (this process only)
+                    return http_sessions.stats()
 
         raise RequestError('invalid request')
 
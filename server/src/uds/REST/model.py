@@ -690,6 +690,10 @@ class ModelHandler(BaseModelHandler):
     def beforeSave(self, fields: typing.Dict[str, typing.Any]) -> None:
         pass
 
+    # Invoked right before an existing item is modified (item data is still the stored one)
+    def beforeUpdate(self, item: models.Model) -> None:
+        pass
+
     # Invoked right after saved an item (no matter if new or edition)
     def afterSave(self, item: models.Model) -> None:
         pass
@@ -974,6 +978,7 @@ class ModelHandler(BaseModelHandler):
 
         if not deleteOnError:
             self.checkSave(item)  # Will raise an exception if item can't be saved (only for modify operations..)
+            self.beforeUpdate(item)
 
         # Store associated object if requested (data_type)
         try:
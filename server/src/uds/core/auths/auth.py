@@ -87,7 +87,7 @@ def getRootUser() -> User:
     # pylint: disable=unexpected-keyword-arg, no-value-for-parameter
     user = User(
         id=ROOT_ID,
-        name=GlobalConfig.SUPER_USER_LOGIN.get(True),
+        name=GlobalConfig.SUPER_USER_LOGIN.get(),
         real_name=_('System Administrator'),
         state=State.ACTIVE,
         staff_member=True,
@@ -144,7 +144,7 @@ def trustedSourceRequired(view_func: typing.Callable[..., RT]) -> typing.Callabl
         Wrapped function for decorator
         """
         try:
-            if net.ipInNetwork(request.ip, GlobalConfig.TRUSTED_SOURCES.get(True)) is False:
+            if net.ipInNetwork(request.ip, GlobalConfig.TRUSTED_SOURCES.get()) is False:
                 return HttpResponseForbidden()
         except Exception as e:
             logger.warning('Error checking trusted source: "%s" does not seems to be a valid network string. Using Unrestricted access.', GlobalConfig.TRUSTED_SOURCES.get())
@@ -206,7 +206,7 @@ def authenticate(username: str, password: str, authenticator: Authenticator, use
     logger.debug('Authenticating user %s with authenticator %s', username, authenticator)
 
     # If global root auth is enabled && user/password is correct,
-    if not useInternalAuthenticate and GlobalConfig.SUPER_USER_ALLOW_WEBACCESS.getBool(True) and username == GlobalConfig.SUPER_USER_LOGIN.get(True) and password == GlobalConfig.SUPER_USER_PASS.get(True):
+    if not useInternalAuthenticate and GlobalConfig.SUPER_USER_ALLOW_WEBACCESS.getBool() and username == GlobalConfig.SUPER_USER_LOGIN.get() and password == GlobalConfig.SUPER_USER_PASS.get():
         return getRootUser()
 
     gm = auths.GroupsManager(authenticator)
@@ -30,6 +30,7 @@
 """
 .. moduleauthor:: Adolfo Gómez, dkmaster at dkmon dot com
 """
+import functools
 import typing
 
 from uds.core.util.cache import Cache
@@ -40,32 +41,51 @@ TEMP_ENV = 'temporary'
 GLOBAL_ENV = 'global'
 
 
+# Cache & Storage facades are immutable, so the ones for a same key are shared
+@functools.lru_cache(maxsize=4096)
+def _cacheFor(key: str) -> Cache:
+    return Cache(key)
+
+
+@functools.lru_cache(maxsize=4096)
+def _storageFor(key: str) -> Storage:
+    return Storage(key)
+
+
 class Environment:
     """
     Class to manipulate the associated environment with "environmentable" classes (mainly modules).
     It purpose is to provide an "object owned" environment, so every db record can contain associated values
     not stored with main module data.
     The environment is composed of a "cache" and a "storage". First are volatile data, while second are persistent data.
+    Cache, storage and id generators are created on first access, as most of the environments are never used.
     """
     _key: str
-    _cache: Cache
-    _storage: Storage
-    _idGenerators: typing.Optional[typing.Dict[str, UniqueIDGenerator]]
-
-    def __init__(self, uniqueKey: str, idGenerators: typing.Optional[typing.Dict[str, UniqueIDGenerator]] = None):
+    _cache: typing.Optional[Cache]
+    _storage: typing.Optional[Storage]
+    _idGenerators: typing.Dict[str, UniqueIDGenerator]
+    _idGeneratorsTypes: typing.Dict[str, typing.Callable[[str], UniqueIDGenerator]]
+
+    def __init__(
+            self,
+            uniqueKey: str,
+            idGenerators: typing.Optional[typing.Dict[str, UniqueIDGenerator]] = None,
+            idGeneratorsTypes: typing.Optional[typing.Dict[str, typing.Callable[[str], UniqueIDGenerator]]] = None
+        ):
         """
         Initialized the Environment for the specified id
         @param uniqueKey: Key for this environment
         @param idGenerators: Hash of generators of ids for this environment. This "generators of ids" feature
             is used basically at User Services to auto-create ids for macs or names, using
             {'mac' : UniqueMacGenerator, 'name' : UniqueNameGenerator } as argument.
+        @param idGeneratorsTypes: Same as idGenerators, but with the types of the generators, that will be
+            created (with the key of this environment) on first use.
         """
-        if idGenerators is None:
-            idGenerators = dict()
         self._key = uniqueKey
-        self._cache = Cache(uniqueKey)
-        self._storage = Storage(uniqueKey)
-        self._idGenerators = idGenerators
+        self._cache = None
+        self._storage = None
+        self._idGenerators = dict(idGenerators) if idGenerators else {}
+        self._idGeneratorsTypes = idGeneratorsTypes or {}
 
     @property
     def cache(self) -> Cache:
@@ -73,6 +93,8 @@ class Environment:
         Method to acces the cache of the environment.
         @return: a referente to a Cache instance
         """
+        if self._cache is None:
+            self._cache = _cacheFor(self._key)
         return self._cache
 
     @property
@@ -81,6 +103,8 @@ class Environment:
         Method to acces the cache of the environment.
         @return: a referente to an Storage Instance
         """
+        if self._storage is None:
+            self._storage = _storageFor(self._key)
         return self._storage
 
     def idGenerators(self, generatorId: str) -> UniqueIDGenerator:
@@ -91,8 +115,11 @@ class Environment:
         @param generatorId: Id of the generator to obtain
         @return: Generator for that id, or None if no generator for that id is found
         """
-        if not self._idGenerators or generatorId not in self._idGenerators:
-            raise Exception('No generator found for {}'.format(generatorId))
+        if generatorId not in self._idGenerators:
+            if generatorId not in self._idGeneratorsTypes:
+                raise Exception('No generator found for {}'.format(generatorId))
+            # Generators are not shared, as they keep state (basename)
+            self._idGenerators[generatorId] = self._idGeneratorsTypes[generatorId](self._key)
         return self._idGenerators[generatorId]
 
     @property
@@ -108,8 +135,8 @@ class Environment:
         """
         Cache.delete(self._key)
         Storage.delete(self._key)
-        for _, v in self._idGenerators.items():
-            v.release()
+        for k in set(self._idGenerators) | set(self._idGeneratorsTypes):
+            self.idGenerators(k).release()
 
     @staticmethod
     def getEnvForTableElement(tblName, id_, idGeneratorsTypes: typing.Optional[typing.Dict[str, typing.Any]] = None) -> 'Environment':
@@ -122,13 +149,8 @@ class Environment:
         @param idGeneratorsTypes: Associated Generators. Defaults to none
         @return: Obtained associated environment (may be empty if none exists at database, but it will be valid)
         """
-        if idGeneratorsTypes is None:
-            idGeneratorsTypes = {}
         name = 't-' + tblName + '-' + str(id_)
-        idGenerators = {}
-        for k, v in idGeneratorsTypes.items():
-            idGenerators[k] = v(name)
-        return Environment(name, idGenerators)
+        return Environment(name, idGeneratorsTypes=idGeneratorsTypes)
 
     @staticmethod
     def getEnvForType(type_) -> 'Environment':
@@ -31,6 +31,7 @@
 @author: Adolfo Gómez, dkmaster at dkmon dot com
 """
 import logging
+import typing
 
 from uds.core.environment import Environmentable
 
@@ -42,6 +43,21 @@ class DelayedTask(Environmentable):
     This class represents a single delayed task object.
     This is an object that represents an execution to be done "later"
     """
+    # Stable identifier of this task type. If set, task is stored on db using the compact format (see marshal/unmarshal)
+    # instead of being pickled. Must be unique, and must not change across versions
+    typeId: typing.ClassVar[str] = ''
+    # Version of data returned by marshal, so unmarshal can read data stored by older versions
+    version: typing.ClassVar[int] = 1
+
+    # Registered task types, by typeId
+    _types: typing.ClassVar[typing.Dict[str, typing.Type['DelayedTask']]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.typeId:
+            if DelayedTask._types.get(cls.typeId, cls) is not cls:
+                raise Exception('Delayed task type id {} already registered by {}'.format(cls.typeId, DelayedTask._types[cls.typeId]))
+            DelayedTask._types[cls.typeId] = cls
 
     def __init__(self):
         """
@@ -50,6 +66,47 @@ class DelayedTask(Environmentable):
         super().__init__(None)
 
 
+    @classmethod
+    def maxConcurrency(cls) -> int:
+        """
+        Max number of tasks of this type executing at once on a server workers pool (0 means no limit).
+        Override it on tasks that must not take all workers (i.e. the ones that talks to service providers)
+        """
+        return 0
+
+    @staticmethod
+    def limits() -> typing.Dict[str, int]:
+        """
+        Returns the concurrency limit of every registered task type that has one
+        """
+        limits = {typeId: cls.maxConcurrency() for typeId, cls in DelayedTask._types.items()}
+        return {typeId: limit for typeId, limit in limits.items() if limit > 0}
+
+    @staticmethod
+    def lookup(typeId: str) -> typing.Optional[typing.Type['DelayedTask']]:
+        """
+        Returns the task class registered with this type id, or None if not found
+        """
+        return DelayedTask._types.get(typeId)
+
+    def marshal(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns the minimal data (json serializable) needed to recreate this task.
+        Default implementation returns instance attributes, so it's fine for tasks that only keeps ids, states, etc..
+        """
+        return {k: v for k, v in self.__dict__.items() if k != '_env'}
+
+    @classmethod
+    def unmarshal(cls, version: int, data: typing.Dict[str, typing.Any]) -> 'DelayedTask':
+        """
+        Recreates a task from the data returned by marshal of "version" version.
+        Constructor is not invoked, so override this if marshal is overriden or data changes between versions
+        """
+        task = cls.__new__(cls)
+        DelayedTask.__init__(task)
+        task.__dict__.update(data)
+        return task
+
     def execute(self) -> None:
         """
         Executes the job
@@ -32,7 +32,9 @@ import threading
 import time
 import logging
 import pickle
+import json
 import typing
+from collections import deque
 from socket import gethostname
 from datetime import timedelta
 
@@ -41,9 +43,10 @@ from django.db import transaction
 from django.db.models import Q
 
 from uds.models import DelayedTask as DBDelayedTask
-from uds.models import getSqlDatetime
+from uds.models import getSqlDatetime, selectForUpdateSkipLocked
 from uds.core.environment import Environment
 from uds.core.util import encoders
+from uds.core.util.config import GlobalConfig
 
 from .delayed_task import DelayedTask
 
@@ -69,21 +72,166 @@ class DelayedTaskThread(threading.Thread):
             connections['default'].close()
 
 
+class DelayedTaskPool:
+    """
+    Fixed size pool of workers executing claimed delayed tasks.
+    Honors the per type concurrency limits (DelayedTask.maxConcurrency()), but tasks should only be added if
+    their type has headroom (see busy), so they are not kept waiting here (out of db) for long
+    """
+    _size: int
+    _loader: typing.Callable[[DBDelayedTask], typing.Optional[DelayedTask]]
+    _cond: threading.Condition
+    _pending: typing.Deque[typing.Tuple[int, DBDelayedTask]]  # (max concurrency, task)
+    _running: typing.Dict[str, int]
+    _threads: typing.List[threading.Thread]
+    _keepRunning: bool
+    executed: int
+    failed: int
+
+    def __init__(self, size: int, loader: typing.Callable[[DBDelayedTask], typing.Optional[DelayedTask]]):
+        """
+        Args:
+            size: Number of workers
+            loader: Used to create the task instance from the claimed db task, just before executing it
+        """
+        self._size = size
+        self._loader = loader
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._running = {}
+        self._keepRunning = True
+        self.executed = self.failed = 0
+        self._threads = [threading.Thread(target=self._worker, name='DelayedTaskWorker-{}'.format(i)) for i in range(size)]
+        for t in self._threads:
+            t.start()
+
+    def freeSlots(self) -> int:
+        """
+        Number of tasks that can be added without making them wait for a worker
+        """
+        with self._cond:
+            if not self._keepRunning:
+                return 0
+            return max(0, self._size - len(self._pending) - sum(self._running.values()))
+
+    def busy(self, types: typing.Iterable[str]) -> typing.Dict[str, int]:
+        """
+        Number of tasks of each of the types that are running or waiting for a worker
+        """
+        with self._cond:
+            busy = {t: self._running.get(t, 0) for t in types}
+            for _, task in self._pending:
+                if task.type in busy:
+                    busy[task.type] += 1
+            return busy
+
+    def add(self, task: DBDelayedTask, maxConcurrency: int = 0) -> bool:
+        """
+        Queues a claimed task for execution. Returns False if pool has been stopped
+        """
+        with self._cond:
+            if not self._keepRunning:
+                return False
+            self._pending.append((maxConcurrency, task))
+            self._cond.notify()
+            return True
+
+    def _next(self) -> typing.Optional[DBDelayedTask]:
+        """
+        Returns (and marks as running) first pending task that is not over its type limit.
+        Must be invoked with condition acquired
+        """
+        for item in self._pending:
+            limit, task = item
+            if limit <= 0 or self._running.get(task.type, 0) < limit:
+                self._pending.remove(item)
+                self._running[task.type] = self._running.get(task.type, 0) + 1
+                return task
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                task = self._next()
+                while task is None and self._keepRunning:
+                    self._cond.wait()
+                    task = self._next()
+                if task is None:
+                    return
+
+            failed = False
+            try:
+                logger.debug('Executing delayedTask:>%s<', task)
+                taskInstance = self._loader(task)
+                if taskInstance is None:
+                    raise Exception('Delayed task {} could not be loaded'.format(task.type))
+                taskInstance.execute()
+            except Exception as e:
+                failed = True
+                logger.exception("Exception in delayed task worker %s: %s", e.__class__, e)
+            finally:
+                connections['default'].close()
+                with self._cond:
+                    self._running[task.type] -= 1
+                    if failed:
+                        self.failed += 1
+                    else:
+                        self.executed += 1
+                    self._cond.notify_all()
+
+    def stop(self) -> typing.List[DBDelayedTask]:
+        """
+        Stops the workers, waiting for running tasks to finish.
+        Returns the claimed tasks that have not been executed
+        """
+        with self._cond:
+            self._keepRunning = False
+            notExecuted = [task for _, task in self._pending]
+            self._pending.clear()
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+        return notExecuted
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self._cond:
+            pendingByType: typing.Dict[str, int] = {}
+            for _, task in self._pending:
+                pendingByType[task.type] = pendingByType.get(task.type, 0) + 1
+            return {
+                'workers': self._size,
+                'pending': len(self._pending),
+                'running': sum(self._running.values()),
+                'pending_by_type': pendingByType,
+                'running_by_type': {k: v for k, v in self._running.items() if v},
+                'executed': self.executed,
+                'failed': self.failed,
+            }
+
+
 class DelayedTaskRunner:
     """
     Delayed task runner class
     """
     # How often tasks r checked
     granularity: int = 2
+    # How often (in seconds) workers pool stats are logged
+    statsInterval: int = 300
 
     # to keep singleton DelayedTaskRunner
     _runner: typing.Optional['DelayedTaskRunner'] = None
     _hostname: str
     _keepRunning: bool
+    _pool: typing.Optional[DelayedTaskPool]
+    _lock: threading.Lock
+    _lastStats: float
 
     def __init__(self):
         self._hostname = gethostname()
         self._keepRunning = True
+        self._pool = None
+        self._lock = threading.Lock()
+        self._lastStats = time.time()
         logger.debug("Initializing delayed task runner for host %s", self._hostname)
 
     def notifyTermination(self) -> None:
@@ -93,6 +241,23 @@ class DelayedTaskRunner:
         """
         self._keepRunning = False
 
+    def pool(self) -> DelayedTaskPool:
+        """
+        Returns the workers pool shared by all delayed task runner threads, creating it if needed
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = DelayedTaskPool(GlobalConfig.DELAYED_TASKS_WORKERS.getInt(), self.load)
+            return self._pool
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns the workers pool stats (queue depth, running tasks, ...) of this server
+        """
+        if self._pool is None:
+            return {}
+        return self._pool.stats()
+
     @staticmethod
     def runner() -> 'DelayedTaskRunner':
         """
@@ -114,9 +279,8 @@ class DelayedTaskRunner:
                 task = DBDelayedTask.objects.select_for_update().filter(filt).order_by('execution_time')[0]  # @UndefinedVariable
                 if task.insert_date > now + timedelta(seconds=30):
                     logger.warning('EXecuted %s due to insert_date being in the future!', task.type)
-                taskInstanceDump = typing.cast(bytes, encoders.decode(task.instance, 'base64'))
                 task.delete()
-            taskInstance = pickle.loads(taskInstanceDump)
+            taskInstance = self.load(task)
         except IndexError:
             return  # No problem, there is no waiting delayed task
         except Exception:
@@ -127,15 +291,105 @@ class DelayedTaskRunner:
 
         if taskInstance:
             logger.debug('Executing delayedTask:>%s<', task)
-            taskInstance.env = Environment.getEnvForType(taskInstance.__class__)
             DelayedTaskThread(taskInstance).start()
 
+    @staticmethod
+    def load(task: DBDelayedTask) -> typing.Optional[DelayedTask]:
+        """
+        Creates the task instance from its stored data, either compact format ("version:json data", for tasks with a typeId)
+        or legacy pickled instance (base64 encoded, so it never contains ":")
+        """
+        if ':' in task.instance:
+            cls = DelayedTask.lookup(task.type)
+            if cls is None:
+                logger.error('Delayed task type %s is not registered', task.type)
+                return None
+            version, data = task.instance.split(':', 1)
+            taskInstance = cls.unmarshal(int(version), json.loads(data))
+        else:
+            taskInstance = pickle.loads(typing.cast(bytes, encoders.decode(task.instance, 'base64')))
+
+        taskInstance.env = Environment.getEnvForType(taskInstance.__class__)
+        return taskInstance
+
+    @staticmethod
+    def dump(instance: DelayedTask) -> typing.Tuple[str, str]:
+        """
+        Returns the (type, instance data) to be stored for a task
+        """
+        cls = instance.__class__
+        if cls.typeId:
+            try:
+                return cls.typeId, '{}:{}'.format(cls.version, json.dumps(instance.marshal(), separators=(',', ':')))
+            except TypeError:  # Not json serializable, fallback to pickle
+                logger.warning('Delayed task %s data is not serializable, pickling it', cls.typeId)
+        return str(cls.__module__ + '.' + cls.__name__), encoders.encodeAsStr(pickle.dumps(instance), 'base64')
+
+    def executeDueDelayedTasks(self, pool: DelayedTaskPool) -> int:
+        """
+        Claims, on just one transaction, as many due tasks as free workers are on pool, and feeds the pool with them.
+        Only tasks whose type is below its concurrency limit are claimed, the rest are kept on db (visible to remove,
+        checkExists and other servers) until there is room for them.
+        Returns the number of claimed tasks
+        """
+        slots = pool.freeSlots()
+        if slots == 0:
+            return 0
+
+        limits = DelayedTask.limits()
+        busy = pool.busy(limits)
+        headroom = {t: limit - busy[t] for t, limit in limits.items()}
+
+        now = getSqlDatetime()
+        filt = Q(execution_time__lt=now) | Q(insert_date__gt=now + timedelta(seconds=30))
+        try:
+            with transaction.atomic():
+                # Tasks locked by other runners (on this or other servers) are skipped if db supports it
+                candidates: typing.List[DBDelayedTask] = list(
+                    DBDelayedTask.objects.select_for_update(**selectForUpdateSkipLocked())  # @UndefinedVariable
+                    .filter(filt).exclude(type__in=[t for t, room in headroom.items() if room <= 0])
+                    .order_by('execution_time')[:slots * 2]
+                )
+                tasks: typing.List[DBDelayedTask] = []
+                for task in candidates:
+                    if len(tasks) == slots:
+                        break
+                    if task.type in headroom:
+                        if headroom[task.type] <= 0:
+                            continue  # Stays on db
+                        headroom[task.type] -= 1
+                    tasks.append(task)
+                if tasks:
+                    DBDelayedTask.objects.filter(id__in=[t.id for t in tasks]).delete()  # @UndefinedVariable
+        except Exception:
+            logger.exception('Claiming delayed tasks')
+            return 0
+
+        for task in tasks:
+            if task.insert_date > now + timedelta(seconds=30):
+                logger.warning('EXecuted %s due to insert_date being in the future!', task.type)
+            # Task instance is created by the worker, just before executing it
+            # Limits are only known for registered types (legacy pickled tasks has no limit)
+            if not pool.add(task, limits.get(task.type, 0)):
+                self._restore([task])
+
+        return len(tasks)
+
+    def _restore(self, tasks: typing.List[DBDelayedTask]) -> None:
+        """
+        Returns to db claimed tasks that have not been executed
+        """
+        for task in tasks:
+            task.id = None
+        try:
+            DBDelayedTask.objects.bulk_create(tasks)  # @UndefinedVariable
+        except Exception:
+            logger.exception('Returning %s not executed delayed tasks', len(tasks))
+
     def __insert(self, instance: DelayedTask, delay: int, tag: str) -> None:
         now = getSqlDatetime()
         exec_time = now + timedelta(seconds=delay)
-        cls = instance.__class__
-        instanceDump = encoders.encodeAsStr(pickle.dumps(instance), 'base64')
-        typeName = str(cls.__module__ + '.' + cls.__name__)
+        typeName, instanceDump = self.dump(instance)
 
         logger.debug('Inserting delayed task %s with %s bytes (%s)', typeName, len(instanceDump), exec_time)
 
@@ -181,16 +435,40 @@ class DelayedTaskRunner:
 
         return number > 0
 
+    def _stopPool(self) -> None:
+        """
+        Stops workers pool, returning to db the claimed but not executed tasks
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        notExecuted = pool.stop()
+        logger.info('Delayed tasks workers stopped: %s', pool.stats())
+        if notExecuted:
+            self._restore(notExecuted)
+
     def run(self) -> None:
         logger.debug("At loop")
+        pool = self.pool() if GlobalConfig.DELAYED_TASKS_WORKERS.getInt() > 0 else None
         while self._keepRunning:
             try:
-                time.sleep(self.granularity)
-                self.executeOneDelayedTask()
+                if pool:
+                    # If a full batch has been claimed, do not wait to claim again
+                    if self.executeDueDelayedTasks(pool) == 0:
+                        time.sleep(self.granularity)
+                    if time.time() - self._lastStats > self.statsInterval:
+                        self._lastStats = time.time()
+                        logger.info('Delayed tasks workers: %s', pool.stats())
+                else:
+                    time.sleep(self.granularity)
+                    self.executeOneDelayedTask()
             except Exception as e:
                 logger.error('Unexpected exception at run loop %s: %s', e.__class__, e)
                 try:
                     connections['default'].close()
                 except Exception:
                     logger.exception('Exception clossing connection at delayed task')
+        if pool:
+            self._stopPool()
         logger.info('Exiting DelayedTask Runner because stop has been requested')
@@ -38,10 +38,11 @@ import logging
 from datetime import timedelta
 
 from django.db import transaction, DatabaseError, connections
-from django.db.models import Q
+from django.db.models import Q, Min
 
-from uds.models import Scheduler as DBScheduler, getSqlDatetime
+from uds.models import Scheduler as DBScheduler, getSqlDatetime, selectForUpdateSkipLocked
 from uds.core.util.state import State
+from uds.core.util.config import GlobalConfig
 from .jobs_factory import JobsFactory
 
 logger = logging.getLogger(__name__)
@@ -91,6 +92,8 @@ class JobThread(threading.Thread):
 
         # Ensures DB connection is released after job is done
         connections['default'].close()
+        # Next execution of this job has changed, so wake up waiting schedulers
+        Scheduler.notifyChange()
 
     def __updateDb(self):
         """
@@ -110,10 +113,14 @@ class Scheduler:
     Class responsible of maintain/execute scheduled jobs
     """
     granularity = 2  # We check for cron jobs every THIS seconds
+    maxWait = 30  # On wakeup mode, max seconds to wait before checking again db (for changes made by other servers)
 
     # to keep singleton Scheduler
     _scheduler = None
 
+    # Used to wake up, on this server, schedulers waiting for next due job
+    _wakeup: typing.ClassVar[threading.Condition] = threading.Condition()
+
     def __init__(self):
         self._hostname = platform.node()
         self._keepRunning = True
@@ -133,12 +140,73 @@ class Scheduler:
         Invoked to signal that termination of scheduler task(s) is requested
         """
         self._keepRunning = False
+        Scheduler.notifyChange()
+
+    @staticmethod
+    def notifyChange():
+        """
+        Invoked whenever scheduled jobs changes on this server (a job is released, new jobs are registered, ...),
+        so schedulers waiting for next due job recalculates it
+        """
+        with Scheduler._wakeup:
+            Scheduler._wakeup.notify_all()
+
+    def _launch(self, job: DBScheduler) -> None:
+        """
+        Executes, on its own thread, an already claimed job
+        """
+        jobInstance = job.getInstance()
+
+        if jobInstance is None:
+            logger.error('Job instance can\'t be resolved for %s, removing it', job)
+            job.delete()
+            return
+        logger.debug('Executing job:>%s<', job.name)
+        JobThread(jobInstance, job).start()  # Do not instatiate thread, just run it
+
+    def executeDueJobs(self) -> typing.Optional[float]:
+        """
+        Claims, on just one transaction, all jobs due for execution and executes them.
+        Returns the number of seconds until next job is due, or None if no job is waiting
+        """
+        try:
+            now = getSqlDatetime()  # Datetimes are based on database server times
+            fltr = Q(state=State.FOR_EXECUTE) & (Q(last_execution__gt=now) | Q(next_execution__lt=now))
+            with transaction.atomic():
+                # Jobs locked by other schedulers (on this or other servers) are simply skipped if db supports it
+                dueJobs: typing.List[DBScheduler] = list(DBScheduler.objects.select_for_update(**selectForUpdateSkipLocked()).filter(fltr).order_by('next_execution'))  # @UndefinedVariable
+                if dueJobs:
+                    DBScheduler.objects.filter(id__in=[job.id for job in dueJobs]).update(state=State.RUNNING, owner_server=self._hostname, last_execution=now)  # @UndefinedVariable
+
+            for job in dueJobs:
+                if job.last_execution > now:
+                    logger.warning('EXecuted %s due to last_execution being in the future!', job.name)
+                self._launch(job)
+
+            # Due jobs not claimed here are locked (being claimed) by other schedulers, so they are not waited for
+            # (a failed claim will be retried after maxWait at most)
+            nextExecution = DBScheduler.objects.filter(state=State.FOR_EXECUTE, next_execution__gte=now).aggregate(Min('next_execution'))['next_execution__min']  # @UndefinedVariable
+        except DatabaseError as e:
+            # Same as executeOneJob, retry will happen on main loop
+            raise DatabaseError('Database access problems. Retrying connection ({})'.format(e))
+
+        if nextExecution is None:
+            return None
+        return max(0.0, (nextExecution - now).total_seconds())
+
+    def waitForNextJob(self, wait: typing.Optional[float]) -> None:
+        """
+        Sleeps until next job is due (at most maxWait seconds), or until someone notifies a change
+        """
+        wait = self.maxWait if wait is None else min(wait, self.maxWait)
+        with Scheduler._wakeup:
+            if self._keepRunning:
+                Scheduler._wakeup.wait(wait)
 
     def executeOneJob(self):
         """
         Looks for the best waiting job and executes it
         """
-        jobInstance = None
         try:
             now = getSqlDatetime()  # Datetimes are based on database server times
             fltr = Q(state=State.FOR_EXECUTE) & (Q(last_execution__gt=now) | Q(next_execution__lt=now))
@@ -153,14 +221,7 @@ class Scheduler:
                 job.last_execution = now
                 job.save()
 
-            jobInstance = job.getInstance()
-
-            if jobInstance is None:
-                logger.error('Job instance can\'t be resolved for %s, removing it', job)
-                job.delete()
-                return
-            logger.debug('Executing job:>%s<', job.name)
-            JobThread(jobInstance, job).start()  # Do not instatiate thread, just run it
+            self._launch(job)
         except IndexError:
             # Do nothing, there is no jobs for execution
             return
@@ -191,11 +252,16 @@ class Scheduler:
         # We ensure that the jobs are also in database so we can
         logger.debug('Run Scheduler thread')
         JobsFactory.factory().ensureJobsInDatabase()
+        Scheduler.notifyChange()
+        wakeupMode = GlobalConfig.SCHEDULER_WAKEUP.getBool()
         logger.debug("At loop")
         while self._keepRunning:
             try:
-                time.sleep(self.granularity)
-                self.executeOneJob()
+                if wakeupMode:
+                    self.waitForNextJob(self.executeDueJobs())
+                else:
+                    time.sleep(self.granularity)
+                    self.executeOneJob()
             except Exception as e:
                 # This can happen often on sqlite, and this is not problem at all as we recover it.
                 # The log is removed so we do not get increased workers.log file size with no information at all
@@ -205,5 +271,7 @@ class Scheduler:
                     connections['default'].close()
                 except Exception:
                     logger.exception('Exception clossing connection at delayed task')
+                if wakeupMode:  # Do not retry inmediately
+                    time.sleep(self.granularity)
         logger.info('Exiting Scheduler because stop has been requested')
         self.releaseOwnShedules()
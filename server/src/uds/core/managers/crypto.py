@@ -37,7 +37,9 @@ import struct
 import random
 import string
 import logging
+import threading
 import typing
+from collections import OrderedDict
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
@@ -62,11 +64,18 @@ logger = logging.getLogger(__name__)
 class CryptoManager:
     instance = None
 
+    # Max number of decrypted values kept in memory
+    decryptedCacheSize: int = 256
+
+    _decrypted: 'OrderedDict[bytes, str]'  # Digest of crypted value -> decrypted value
+
     def __init__(self):
         self._rsa = serialization.load_pem_private_key(settings.RSA_KEY.encode(), password=None, backend=default_backend())
         self._oldRsa = RSA.importKey(settings.RSA_KEY)
         self._namespace = uuid.UUID('627a37a5-e8db-431a-b783-73f7d20b4934')
         self._counter = 0
+        self._decrypted = OrderedDict()
+        self._decryptedLock = threading.Lock()
 
     @staticmethod
     def AESKey(key: typing.Union[str, bytes], length: int) -> bytes:
@@ -112,9 +121,37 @@ class CryptoManager:
 
 
     def decrypt(self, value: typing.Union[str, bytes]) -> str:
+        """
+        Decrypts a value crypted with our RSA key. As RSA decryption is expensive, and same values (config, osmanagers
+        data, ...) are decrypted again and again, results are kept on a bounded in memory cache, keyed by the digest of
+        the crypted value (so crypted values are not kept)
+        """
         if isinstance(value, str):
             value = value.encode('utf-8')
 
+        digest = hashlib.sha256(value).digest()
+        with self._decryptedLock:
+            decryptedValue = self._decrypted.get(digest)
+            if decryptedValue is not None:
+                self._decrypted.move_to_end(digest)
+                return decryptedValue
+
+        decryptedValue = self._decrypt(value)
+        if decryptedValue != 'decript error':
+            with self._decryptedLock:
+                self._decrypted[digest] = decryptedValue
+                while len(self._decrypted) > CryptoManager.decryptedCacheSize:
+                    self._decrypted.popitem(last=False)
+        return decryptedValue
+
+    def wipeDecrypted(self) -> None:
+        """
+        Removes all cached decrypted values. Must be invoked if RSA key is changed
+        """
+        with self._decryptedLock:
+            self._decrypted.clear()
+
+    def _decrypt(self, value: bytes) -> str:
         data: bytes = typing.cast(bytes, encoders.decode(value, 'base64'))
         decrypted: bytes
 
@@ -29,9 +29,17 @@
 """
 @author: Adolfo Gómez, dkmaster at dkmon dot com
 """
+import datetime
+import time
+import atexit
+import threading
+import collections
 import logging
 import typing
 
+from django.db import connections
+from django.db.models import Count
+
 from uds import models
 
 from uds.core.util import log
@@ -61,14 +69,243 @@ transDict: typing.Dict['Model', int] = {
 }
 
 
+class LogBuffer:
+    """
+    Write behind buffer for database logs.
+
+    Duplicates are checked against an in memory index of last message per owner, level & source, and
+    records are written by a background thread, in bulk, when buffer reaches its size or every flushInterval seconds.
+    Owners that exceeds max logs per element are trimmed (also in bulk) every trimInterval seconds.
+    """
+    flushInterval: int = 2
+    trimInterval: int = 60
+    # Max number of (owner, level, source) entries kept for duplicates detection
+    indexSize: int = 16384
+    maxPendingFactor: int = 16
+
+    _size: int
+    _cond: threading.Condition
+    _pending: typing.List[models.Log]
+    _last: 'collections.OrderedDict[typing.Tuple[int, int, int, str], str]'
+    _touched: typing.Set[typing.Tuple[int, int]]
+    _lastTrim: float
+    _sqlOffset: typing.Optional[datetime.timedelta]
+    _thread: typing.Optional[threading.Thread]
+    _keepRunning: bool
+    flushed: int
+    dropped: int
+    duplicated: int
+
+    def __init__(self, size: int):
+        self._size = size
+        self._cond = threading.Condition()
+        self._pending = []
+        self._last = collections.OrderedDict()
+        self._touched = set()
+        self._lastTrim = time.time()
+        self._sqlOffset = None
+        self._thread = None
+        self._keepRunning = True
+        self.flushed = self.dropped = self.duplicated = 0
+
+    def _now(self) -> datetime.datetime:
+        """
+        Database datetime, without querying database on every log
+        """
+        if self._sqlOffset is None:
+            try:
+                self._sqlOffset = models.getSqlDatetime() - datetime.datetime.now()
+            except Exception:
+                return datetime.datetime.now()
+        return datetime.datetime.now() + self._sqlOffset
+
+    def add(self, owner_type: int, owner_id: int, level: int, message: str, source: str, avoidDuplicates: bool) -> bool:
+        """
+        Buffers a log record. Returns False if it is a duplicate or it has been dropped
+        """
+        key = (owner_type, owner_id, level, source)
+        created = self._now()
+        with self._cond:
+            if not self._keepRunning:
+                return False
+            if avoidDuplicates and self._last.get(key) == message:
+                self._last.move_to_end(key)
+                self.duplicated += 1
+                return False
+            self._last[key] = message
+            self._last.move_to_end(key)
+            if len(self._last) > self.indexSize:
+                self._last.popitem(last=False)
+
+            if len(self._pending) >= self._size * self.maxPendingFactor:
+                self.dropped += 1
+                return False
+
+            self._pending.append(models.Log(owner_type=owner_type, owner_id=owner_id, created=created, source=source, level=level, data=message))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flusher, name='LogFlusher', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self._size:
+                self._cond.notify()
+        return True
+
+    def forget(self, owner_type: int, owner_id: int) -> None:
+        """
+        Removes pending logs and duplicates index entries of an owner
+        """
+        with self._cond:
+            self._pending = [i for i in self._pending if i.owner_type != owner_type or i.owner_id != owner_id]
+            for key in [k for k in self._last if k[0] == owner_type and k[1] == owner_id]:
+                del self._last[key]
+            self._touched.discard((owner_type, owner_id))
+
+    @staticmethod
+    def _ofExistingOwners(records: typing.List[models.Log]) -> typing.List[models.Log]:
+        """
+        Removes the records of owners that no longer exists. Logs of an owner can be buffered on any server, so
+        logs buffered on others when the owner was removed (and its logs cleared) are discarded here
+        """
+        ownerModels = {v: k for k, v in transDict.items()}
+        byType: typing.Dict[int, typing.Set[int]] = {}
+        for record in records:
+            if record.owner_id >= 0 and record.owner_type in ownerModels:  # Negative ids are "virtual" owners (i.e. root user)
+                byType.setdefault(record.owner_type, set()).add(record.owner_id)
+
+        missing: typing.Set[typing.Tuple[int, int]] = set()
+        for owner_type, ids in byType.items():
+            existing = set(ownerModels[owner_type].objects.filter(id__in=ids).values_list('id', flat=True))
+            missing.update((owner_type, i) for i in ids - existing)
+
+        if not missing:
+            return records
+        return [r for r in records if (r.owner_type, r.owner_id) not in missing]
+
+    def hasPending(self) -> bool:
+        with self._cond:
+            return bool(self._pending)
+
+    def flush(self) -> int:
+        """
+        Writes all buffered logs to database. Returns number of records written
+        """
+        with self._cond:
+            pending, self._pending = self._pending, []
+
+        if not pending:
+            return 0
+
+        written = 0
+        try:
+            toWrite = self._ofExistingOwners(pending)
+        except Exception:
+            logger.exception('Checking owners of buffered logs')
+            toWrite = pending
+        try:
+            models.Log.objects.bulk_create(toWrite, batch_size=self._size)  # @UndefinedVariable
+            written = len(toWrite)
+        except Exception:
+            # Bulk insert is atomic, so nothing was written. Retry one by one, so only the offending rows are lost
+            logger.warning('Exception writing %s buffered logs, retrying one by one', len(pending))
+            for record in toWrite:
+                try:
+                    record.save(force_insert=True)
+                    written += 1
+                except Exception:
+                    # Some objects will not get logged, such as System administrator objects, but this is fine
+                    logger.exception('Dropped buffered log for %s:%s', record.owner_type, record.owner_id)
+
+        with self._cond:
+            self.flushed += written
+            self.dropped += len(pending) - written
+            self._touched.update((i.owner_type, i.owner_id) for i in pending)
+
+        try:
+            self._sqlOffset = models.getSqlDatetime() - datetime.datetime.now()
+        except Exception:
+            pass
+
+        return written
+
+    def trim(self) -> int:
+        """
+        Removes the oldest logs of owners logged since last trim that exceeds max logs per element.
+        Returns number of trimmed owners
+        """
+        with self._cond:
+            touched, self._touched = self._touched, set()
+            self._lastTrim = time.time()
+
+        maxLogs = GlobalConfig.MAX_LOGS_PER_ELEMENT.getInt()
+        trimmed = 0
+        byType: typing.Dict[int, typing.List[int]] = {}
+        for owner_type, owner_id in touched:
+            byType.setdefault(owner_type, []).append(owner_id)
+
+        for owner_type, ids in byType.items():
+            exceeding = models.Log.objects.filter(owner_type=owner_type, owner_id__in=ids).values('owner_id').annotate(  # @UndefinedVariable
+                total=Count('id')
+            ).filter(total__gt=maxLogs).values_list('owner_id', flat=True).order_by()
+            for owner_id in exceeding:
+                qs = models.Log.objects.filter(owner_type=owner_type, owner_id=owner_id)  # @UndefinedVariable
+                # Newest log that must be removed, and all older than it
+                oldest = qs.order_by('-created', '-id').values_list('created', 'id')[maxLogs:maxLogs + 1]
+                for created, id_ in oldest:
+                    qs.filter(created__lte=created).exclude(created=created, id__gt=id_).delete()
+                    trimmed += 1
+        return trimmed
+
+    def _flusher(self) -> None:
+        while True:
+            with self._cond:
+                if self._keepRunning and len(self._pending) < self._size:
+                    self._cond.wait(self.flushInterval)
+                keepRunning = self._keepRunning
+            try:
+                self.flush()
+                if not keepRunning or time.time() - self._lastTrim > self.trimInterval:
+                    self.trim()
+            except Exception:
+                logger.exception('Flushing logs')
+            finally:
+                connections['default'].close()
+            if not keepRunning:
+                return
+
+    def stop(self) -> None:
+        """
+        Stops accepting logs and writes the buffered ones
+        """
+        with self._cond:
+            self._keepRunning = False
+            thread = self._thread
+            self._cond.notify_all()
+        if thread:
+            thread.join()
+        else:
+            self.flush()
+        logger.debug('Log buffer stopped: %s', self.stats())
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'duplicated': self.duplicated,
+            }
+
+
 class LogManager:
     """
     Manager for logging (at database) events
     """
     _manager: typing.Optional['LogManager'] = None
+    _buffer: typing.Optional[LogBuffer]
+    _lock: threading.Lock
 
     def __init__(self):
-        pass
+        self._buffer = None
+        self._lock = threading.Lock()
 
     @staticmethod
     def manager() -> 'LogManager':
@@ -76,6 +313,28 @@ class LogManager:
             LogManager._manager = LogManager()
         return LogManager._manager
 
+    def buffer(self) -> typing.Optional[LogBuffer]:
+        """
+        Returns the write behind buffer of this process, or None if logs are written synchronously
+        """
+        if self._buffer is None:
+            size = GlobalConfig.LOG_BUFFER_SIZE.getInt()
+            if size <= 0:
+                return None
+            with self._lock:
+                if self._buffer is None:
+                    self._buffer = LogBuffer(size)
+                    atexit.register(self._buffer.stop)
+        return self._buffer
+
+    def flush(self) -> int:
+        """
+        Writes pending buffered logs to database. Returns number of records written
+        """
+        if self._buffer is None:
+            return 0
+        return self._buffer.flush()
+
     def __log(self, owner_type: int, owner_id: int, level: int, message: str, source: str, avoidDuplicates: bool):
         """
         Logs a message associated to owner
@@ -83,6 +342,11 @@ class LogManager:
         # Ensure message fits on space
         message = str(message)[:255]
 
+        buffer = self.buffer()
+        if buffer:
+            buffer.add(owner_type, owner_id, level, message, source, avoidDuplicates)
+            return
+
         qs = models.Log.objects.filter(owner_id=owner_id, owner_type=owner_type)
         # First, ensure we do not have more than requested logs, and we can put one more log item
         if qs.count() >= GlobalConfig.MAX_LOGS_PER_ELEMENT.getInt():
@@ -109,6 +373,8 @@ class LogManager:
         """
         Get all logs associated with an user service, ordered by date
         """
+        if self._buffer and self._buffer.hasPending():
+            self._buffer.flush()
         qs = models.Log.objects.filter(owner_id=owner_id, owner_type=owner_type)
         return [{'date': x.created, 'level': x.level, 'source': x.source, 'message': x.data} for x in reversed(qs.order_by('-created', '-id')[:limit])]
 
@@ -116,6 +382,8 @@ class LogManager:
         """
         Clears all logs related to user service
         """
+        if self._buffer:
+            self._buffer.forget(owner_type, owner_id)
         models.Log.objects.filter(owner_id=owner_id, owner_type=owner_type).delete()
 
     def doLog(self, wichObject: 'Model', level: int, message: str, source: str, avoidDuplicates: bool = True):
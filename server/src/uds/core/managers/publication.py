@@ -43,7 +43,7 @@ from uds.core.services.exceptions import PublishException
 from uds.core.util.state import State
 from uds.core.util import log
 
-from uds.models import ServicePoolPublication, getSqlDatetime, ServicePool
+from uds.models import ServicePoolPublication, ServicePoolOccupancy, getSqlDatetime, ServicePool
 
 if typing.TYPE_CHECKING:
     from uds.core import services
@@ -57,6 +57,7 @@ class PublicationOldMachinesCleaner(DelayedTask):
     """
     This delayed task is for removing a pending "removable" publication
     """
+    typeId = 'uds.publication.oldmachinescleaner'
 
     def __init__(self, publicationId: int):
         super().__init__()
@@ -71,6 +72,7 @@ class PublicationOldMachinesCleaner(DelayedTask):
             now = getSqlDatetime()
             activePub: typing.Optional[ServicePoolPublication] = servicePoolPub.deployed_service.activePublication()
             servicePoolPub.deployed_service.userServices.filter(in_use=True).update(in_use=False, state_date=now)
+            ServicePoolOccupancy.reconcile([servicePoolPub.deployed_service_id])  # Bulk updates bypasses occupancy counters
             servicePoolPub.deployed_service.markOldUserServicesAsRemovables(activePub)
         except Exception:
             pass
@@ -81,6 +83,11 @@ class PublicationLauncher(DelayedTask):
     """
     This delayed task if for launching a new publication
     """
+    typeId = 'uds.publication.launcher'
+
+    @classmethod
+    def maxConcurrency(cls) -> int:
+        return GlobalConfig.DELAYED_TASKS_PUBLICATION_CONCURRENCY.getInt()
 
     def __init__(self, publication: ServicePoolPublication):
         super().__init__()
@@ -121,6 +128,11 @@ class PublicationFinishChecker(DelayedTask):
     """
     This delayed task is responsible of checking if a publication is finished
     """
+    typeId = 'uds.publication.finishchecker'
+
+    @classmethod
+    def maxConcurrency(cls) -> int:
+        return GlobalConfig.DELAYED_TASKS_PUBLICATION_CONCURRENCY.getInt()
 
     def __init__(self, publication: ServicePoolPublication):
         super(PublicationFinishChecker, self).__init__()
@@ -31,17 +31,135 @@
 """
 import datetime
 import time
+import atexit
+import threading
 import logging
 import typing
 
+from django.db import connections
+
 from uds.core.util.config import GlobalConfig
 from uds.models import StatsCounters
+from uds.models import StatsCountersAccum
 from uds.models import getSqlDatetime, getSqlDatetimeAsUnix
 from uds.models import StatsEvents
 
 logger = logging.getLogger(__name__)
 
 
+class StatsBuffer:
+    """
+    Write behind buffer for stats events & counters.
+
+    Records are kept in memory and written to database (using bulk inserts) by a background thread
+    when buffer reaches its size, when flush interval has elapsed or on process termination.
+    If database can't keep up (or is not available), records over maxPendingFactor * size are dropped.
+    """
+    maxPendingFactor: int = 16
+
+    _size: int
+    _interval: int
+    _cond: threading.Condition
+    _pending: typing.Dict[typing.Type, typing.List]
+    _thread: typing.Optional[threading.Thread]
+    _keepRunning: bool
+    flushed: int
+    dropped: int
+    _reportedDropped: int
+
+    def __init__(self, size: int, interval: int):
+        self._size = size
+        self._interval = max(interval, 1)
+        self._cond = threading.Condition()
+        self._pending = {StatsEvents: [], StatsCounters: []}
+        self._thread = None
+        self._keepRunning = True
+        self.flushed = self.dropped = self._reportedDropped = 0
+
+    def _pendingCount(self) -> int:
+        return sum(len(v) for v in self._pending.values())
+
+    def add(self, record: typing.Union[StatsEvents, StatsCounters]) -> bool:
+        """
+        Buffers a (not saved) stats record. Returns False if it has been dropped
+        """
+        with self._cond:
+            if not self._keepRunning:
+                return False
+            pending = self._pendingCount()
+            if pending >= self._size * self.maxPendingFactor:
+                self.dropped += 1
+                return False
+            self._pending[record.__class__].append(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flusher, name='StatsFlusher', daemon=True)
+                self._thread.start()
+            if pending + 1 >= self._size:
+                self._cond.notify()
+        return True
+
+    def flush(self) -> int:
+        """
+        Writes all buffered records to database. Returns number of records written
+        """
+        with self._cond:
+            pending, self._pending = self._pending, {StatsEvents: [], StatsCounters: []}
+
+        written = 0
+        for model, records in pending.items():
+            if not records:
+                continue
+            try:
+                model.objects.bulk_create(records, batch_size=self._size)  # @UndefinedVariable
+                written += len(records)
+            except Exception:
+                logger.exception('Exception writing %s buffered stats (maybe database is full?)', len(records))
+                with self._cond:
+                    self.dropped += len(records)
+
+        with self._cond:
+            self.flushed += written
+            dropped, self._reportedDropped = self.dropped - self._reportedDropped, self.dropped
+        if dropped:
+            logger.warning('Dropped %s stats records (%s flushed so far)', dropped, self.flushed)
+        return written
+
+    def _flusher(self) -> None:
+        while True:
+            with self._cond:
+                if self._keepRunning and self._pendingCount() < self._size:
+                    self._cond.wait(self._interval)
+                keepRunning = self._keepRunning
+            try:
+                self.flush()
+            finally:
+                connections['default'].close()
+            if not keepRunning:
+                return
+
+    def stop(self) -> None:
+        """
+        Stops accepting records and writes the buffered ones
+        """
+        with self._cond:
+            self._keepRunning = False
+            thread = self._thread
+            self._cond.notify_all()
+        if thread:
+            thread.join()
+        else:
+            self.flush()
+        logger.debug('Stats buffer stopped: %s', self.stats())
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self._cond:
+            return {
+                'pending': self._pendingCount(),
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+            }
+
+
 class StatsManager:
     """
     Manager for statistics, so we can provide usefull info about platform usage
@@ -51,9 +169,12 @@ class StatsManager:
     are assigned, are in use, in cache, etc...
     """
     _manager: typing.Optional['StatsManager'] = None
+    _buffer: typing.Optional[StatsBuffer]
+    _lock: threading.Lock
 
     def __init__(self):
-        pass
+        self._buffer = None
+        self._lock = threading.Lock()
 
     @staticmethod
     def manager():
@@ -61,6 +182,43 @@ class StatsManager:
             StatsManager._manager = StatsManager()
         return StatsManager._manager
 
+    def buffer(self) -> typing.Optional[StatsBuffer]:
+        """
+        Returns the write behind buffer of this process, or None if stats are written synchronously
+        """
+        if self._buffer is None:
+            size = GlobalConfig.STATS_BUFFER_SIZE.getInt()
+            if size <= 0:
+                return None
+            with self._lock:
+                if self._buffer is None:
+                    self._buffer = StatsBuffer(size, GlobalConfig.STATS_FLUSH_INTERVAL.getInt())
+                    atexit.register(self._buffer.stop)
+        return self._buffer
+
+    def flush(self) -> int:
+        """
+        Writes pending buffered stats to database. Returns number of records written
+        """
+        if self._buffer is None:
+            return 0
+        return self._buffer.flush()
+
+    def bufferStats(self) -> typing.Dict[str, int]:
+        """
+        Returns pending, flushed & dropped records counters of write behind buffer
+        """
+        if self._buffer is None:
+            return {}
+        return self._buffer.stats()
+
+    def _store(self, record: typing.Union[StatsEvents, StatsCounters]) -> bool:
+        buffer = self.buffer()
+        if buffer:
+            return buffer.add(record)
+        record.save()
+        return True
+
     def __doCleanup(self, model):
         minTime = time.mktime((getSqlDatetime() - datetime.timedelta(days=GlobalConfig.STATS_DURATION.getInt())).timetuple())
         model.objects.filter(stamp__lt=minTime).delete()
@@ -90,8 +248,7 @@ class StatsManager:
         stampInt = int(time.mktime(stamp.timetuple()))  # pylint: disable=maybe-no-member
 
         try:
-            StatsCounters.objects.create(owner_type=owner_type, owner_id=owner_id, counter_type=counterType, value=counterValue, stamp=stampInt)
-            return True
+            return self._store(StatsCounters(owner_type=owner_type, owner_id=owner_id, counter_type=counterType, value=counterValue, stamp=stampInt))
         except Exception:
             logger.error('Exception handling counter stats saving (maybe database is full?)')
         return False
@@ -144,6 +301,7 @@ class StatsManager:
         Removes all counters previous to configured max keep time for stat information from database.
         """
         self.__doCleanup(StatsCounters)
+        self.__doCleanup(StatsCountersAccum)
 
     def getEventFldFor(self, fld: str) -> typing.Optional[str]:
         return {
@@ -191,8 +349,7 @@ class StatsManager:
             fld3 = noneToEmpty(kwargs.get('fld3', kwargs.get('dstip', kwargs.get('version', ''))))
             fld4 = noneToEmpty(kwargs.get('fld4', kwargs.get('uniqueid', '')))
 
-            StatsEvents.objects.create(owner_type=owner_type, owner_id=owner_id, event_type=eventType, stamp=stamp, fld1=fld1, fld2=fld2, fld3=fld3, fld4=fld4)
-            return True
+            return self._store(StatsEvents(owner_type=owner_type, owner_id=owner_id, event_type=eventType, stamp=stamp, fld1=fld1, fld2=fld2, fld3=fld3, fld4=fld4))
         except Exception:
             logger.exception('Exception handling event stats saving (maybe database is full?)')
         return False
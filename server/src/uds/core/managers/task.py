@@ -93,6 +93,10 @@ class TaskManager:
         # Simply import this to make workers "auto import themself"
         from uds.core import workers  # @UnusedImport pylint: disable=unused-import
 
+        # Delayed tasks stored on compact format are located by its type id, so ensure that they are registered
+        from uds.core.managers import publication  # @UnusedImport pylint: disable=unused-import
+        from uds.core.managers.userservice import opchecker  # @UnusedImport pylint: disable=unused-import
+
     @staticmethod
     def run() -> None:
         TaskManager.keepRunning = True
@@ -47,7 +47,7 @@ from uds.core.services.exceptions import (
     ServiceNotReadyError,
     ServiceAccessDeniedByCalendar
 )
-from uds.models import MetaPool, ServicePool, UserService, getSqlDatetime, Transport, User, ServicePoolPublication
+from uds.models import MetaPool, ServicePool, UserService, getSqlDatetime, Transport, User, ServicePoolPublication, ServicePoolOccupancy
 from uds.core import services, transports
 from uds.core.util.stats import events
 
@@ -87,7 +87,7 @@ class UserServiceManager:
         if serviceInstance.maxDeployed == services.Service.UNLIMITED:
             return
 
-        numberOfServices = servicePool.userServices.filter(state__in=[State.PREPARING, State.USABLE]).count()
+        numberOfServices = ServicePoolOccupancy.countFor(servicePool, states=[State.PREPARING, State.USABLE])
 
         if serviceInstance.maxDeployed <= numberOfServices:
             raise MaxServicesReachedError('Max number of allowed deployments for service reached')
@@ -345,7 +345,7 @@ class UserServiceManager:
             cache.assignToUser(user)
 
             logger.debug('Found a cached-ready service from %s for user %s, item %s', servicePool, user, cache)
-            events.addEvent(servicePool, events.ET_CACHE_HIT, fld1=servicePool.cachedUserServices().filter(cache_level=services.UserDeployment.L1_CACHE, state=State.USABLE).count())
+            events.addEvent(servicePool, events.ET_CACHE_HIT, fld1=ServicePoolOccupancy.countFor(servicePool, states=[State.USABLE], cacheLevel=services.UserDeployment.L1_CACHE))
             return cache
 
         # Cache missed
@@ -365,14 +365,14 @@ class UserServiceManager:
             cache.assignToUser(user)
 
             logger.debug('Found a cached-preparing service from %s for user %s, item %s', servicePool, user, cache)
-            events.addEvent(servicePool, events.ET_CACHE_MISS, fld1=servicePool.cachedUserServices().filter(cache_level=services.UserDeployment.L1_CACHE, state=State.PREPARING).count())
+            events.addEvent(servicePool, events.ET_CACHE_MISS, fld1=ServicePoolOccupancy.countFor(servicePool, states=[State.PREPARING], cacheLevel=services.UserDeployment.L1_CACHE))
             return cache
 
         # Can't assign directly from L2 cache... so we check if we can create e new service in the limits requested
         serviceType = servicePool.service.getType()
         if serviceType.usesCache:
             # inCacheL1 = ds.cachedUserServices().filter(UserServiceManager.getCacheStateFilter(services.UserDeployment.L1_CACHE)).count()
-            inAssigned = servicePool.assignedUserServices().filter(UserServiceManager.getStateFilter()).count()
+            inAssigned = ServicePoolOccupancy.countFor(servicePool, states=[State.PREPARING, State.USABLE], cacheLevel=0)
             # totalL1Assigned = inCacheL1 + inAssigned
             if inAssigned >= servicePool.max_srvs:  # cacheUpdater will drop unnecesary L1 machines, so it's not neccesary to check against inCacheL1
                 log.doLog(servicePool, log.WARN, 'Max number of services reached: {}'.format(servicePool.max_srvs), log.INTERNAL)
@@ -386,7 +386,7 @@ class UserServiceManager:
         """
         Returns the number of services of a service provider in the state indicated
         """
-        return UserService.objects.filter(deployed_service__service__provider__id=provider_id, state=state).count()
+        return ServicePoolOccupancy.countForProvider(provider_id, [state])
 
     def canRemoveServiceFromDeployedService(self, servicePool: ServicePool) -> bool:
         """
@@ -36,6 +36,7 @@ import typing
 from uds.core.jobs.delayed_task import DelayedTask
 from uds.core.jobs.delayed_task_runner import DelayedTaskRunner
 from uds.core.util.state import State
+from uds.core.util.config import GlobalConfig
 from uds.core.util import log
 from uds.core.services import UserDeployment
 from uds.models import UserService
@@ -181,6 +182,12 @@ class UserServiceOpChecker(DelayedTask):
     """
     This is the delayed task responsible of executing the service tasks and the service state transitions
     """
+    typeId = 'uds.userservice.opchecker'
+
+    @classmethod
+    def maxConcurrency(cls) -> int:
+        return GlobalConfig.DELAYED_TASKS_OPCHECKER_CONCURRENCY.getInt()
+
     def __init__(self, service):
         super().__init__()
         self._svrId = service.id
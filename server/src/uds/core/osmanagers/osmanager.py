@@ -255,7 +255,7 @@ class OSManager(Module):
             counter -= 1
         userService.setProperty('loginsCounter', str(counter))
 
-        if GlobalConfig.EXCLUSIVE_LOGOUT.getBool(True) and counter > 0:
+        if GlobalConfig.EXCLUSIVE_LOGOUT.getBool() and counter > 0:
             return
 
         uniqueId = userService.unique_id
@@ -174,6 +174,14 @@ class ServiceProvider(Module):
         Default implementation does nothing
         """
 
+    def releaseConnections(self) -> None:
+        """
+        Invoked (with current data) right before the provider is modified from administration interface or deleted,
+        so the connections kept alive to the provider backend can be dropped.
+
+        Default implementation does nothing
+        """
+
     def getMaxPreparingServices(self) -> int:
         val = self.maxPreparingServices
         if val is None:
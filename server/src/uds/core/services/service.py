@@ -257,6 +257,14 @@ class Service(Module):
         """
         return typing.cast('UniqueNameGenerator', self.idGenerators('name'))
 
+    def prefetchIds(self, count: int) -> None:
+        """
+        Invoked before creating a batch of "count" user services of this service, so the unique ids (names, macs, ...)
+        that they will request can be reserved at once (see prefetch method of unique ids generators)
+
+        Default implementation does nothing
+        """
+
     def listAssignables(self) -> typing.Iterable[typing.Tuple[str, str]]:
         """
         If overrided, will provide list of assignables elements, so we can "add" an element manually to the list of assigned user services
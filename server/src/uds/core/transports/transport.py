@@ -39,7 +39,6 @@ from uds.core.util import os_detector as OsDetector
 from uds.core import Module
 from uds.core.transports import protocols
 from uds.core.util import encoders
-from uds.core.util import connection
 
 # Not imported at runtime, just for type checking
 if typing.TYPE_CHECKING:
@@ -111,10 +110,10 @@ class Transport(Module):
         """
 
     def testServer(self, userService: 'models.UserService', ip: str, port: typing.Union[str, int], timeout: int = 4) -> bool:
+        from uds.core.util import reachability  # pylint: disable=import-outside-toplevel
+
         proxy: typing.Optional['models.Proxy'] = userService.deployed_service.service.proxy
-        if proxy:
-            return proxy.doTestServer(ip, port, timeout)
-        return connection.testServer(ip, str(port), timeout)
+        return reachability.prober().isReachable(ip, str(port), timeout, proxy)
 
     def isAvailableFor(self, userService: 'models.UserService', ip: str) -> bool:
         """
@@ -35,6 +35,8 @@ import datetime
 import typing
 import time
 import pickle
+import struct
+import zlib
 import logging
 import copy
 
@@ -47,6 +49,31 @@ logger = logging.getLogger(__name__)
 
 UDSB = b'udsprotect'
 
+# Serialization of forms. Header can't be the start of a zipped (legacy) serialization
+SERIALIZATION_HEADER = b'\x00UDSF'
+SERIALIZATION_VERSION = b'\x01'
+SERIALIZATION_ZIP_THRESHOLD = 256
+FLAG_ZIPPED = 0x01
+FIELD_TEXT = b's'
+FIELD_LIST = b'l'
+FIELD_CRYPT = b'c'
+FIELD_PICKLE = b'p'
+
+
+def _packList(values: typing.Iterable[str]) -> bytes:
+    encoded = [v.encode('utf8') for v in values]
+    return struct.pack('>I', len(encoded)) + b''.join(struct.pack('>I', len(v)) + v for v in encoded)
+
+
+def _unpackList(data: bytes) -> typing.List[str]:
+    count, pos, res = struct.unpack_from('>I', data)[0], 4, []
+    for _i in range(count):
+        length = struct.unpack_from('>I', data, pos)[0]
+        res.append(data[pos + 4:pos + 4 + length].decode('utf8'))
+        pos += 4 + length
+    return res
+
+
 class gui:
     """
     This class contains the representations of fields needed by UDS modules and
@@ -922,10 +949,13 @@ class   UserInterface(metaclass=UserInterfaceType):
     def serializeForm(self) -> bytes:
         """
         All values stored at form fields are serialized and returned as a single
-        string
-        Separating char is
+        bytes string.
 
-        The returned string is zipped and then converted to base 64
+        Format is SERIALIZATION_HEADER + version (1 byte) + flags (1 byte) + fields, where every field is:
+          * field name length (2 bytes) + field name (utf8)
+          * field type (1 byte): text, list of texts, crypted (password) or pickled (lists of non texts)
+          * value length (4 bytes) + value
+        If fields data is big enough, it is zipped (and flags indicates it)
 
         Note: Hidens are not serialized, they are ignored
 
@@ -935,7 +965,7 @@ class   UserInterface(metaclass=UserInterfaceType):
         # logger.debug('Caller is : {}'.format(inspect.stack()))
 
         arr = []
-        val: typing.Any
+        val: bytes
         for k, v in self._gui.items():
             logger.debug('serializing Key: %s/%s', k, v.value)
             if v.isType(gui.InputField.HIDDEN_TYPE) and v.isSerializable() is False:
@@ -946,30 +976,38 @@ class   UserInterface(metaclass=UserInterfaceType):
                 continue
             if v.isType(gui.InputField.EDITABLE_LIST) or v.isType(gui.InputField.MULTI_CHOICE_TYPE):
                 # logger.debug('Serializing value {0}'.format(v.value))
-                val = b'\001' + pickle.dumps(v.value, protocol=0)
+                if isinstance(v.value, (list, tuple)) and all(isinstance(i, str) for i in v.value):
+                    fieldType, val = FIELD_LIST, _packList(v.value)
+                else:
+                    fieldType, val = FIELD_PICKLE, pickle.dumps(v.value)
             elif v.isType(gui.InfoField.PASSWORD_TYPE):
-                val = b'\004' + cryptoManager().AESCrypt(v.value.encode('utf8'), UDSB, True)
+                fieldType, val = FIELD_CRYPT, cryptoManager().AESCrypt(v.value.encode('utf8'), UDSB)
             elif v.isType(gui.InputField.NUMERIC_TYPE):
-                val = str(int(v.num())).encode('utf8')
+                fieldType, val = FIELD_TEXT, str(int(v.num())).encode('utf8')
             elif v.isType(gui.InputField.CHECKBOX_TYPE):
-                val = v.isTrue()
+                fieldType, val = FIELD_TEXT, (gui.TRUE if v.isTrue() else gui.FALSE).encode('utf8')
             else:
-                val = v.value.encode('utf8')
-            if val is True:
-                val = gui.TRUE.encode('utf8')
-            elif val is False:
-                val = gui.FALSE.encode('utf8')
+                fieldType, val = FIELD_TEXT, v.value.encode('utf8')
 
-            arr.append(k.encode('utf8') + b'\003' + val)
+            kb = k.encode('utf8')
+            arr.append(struct.pack('>H', len(kb)) + kb + fieldType + struct.pack('>I', len(val)) + val)
         logger.debug('Arr, >>%s<<', arr)
 
-        return typing.cast(bytes, encoders.encode(b'\002'.join(arr), 'zip'))
+        data = b''.join(arr)
+        flags = 0
+        if len(data) > SERIALIZATION_ZIP_THRESHOLD:
+            zipped = zlib.compress(data)
+            if len(zipped) < len(data):
+                data, flags = zipped, flags | FLAG_ZIPPED
+
+        return SERIALIZATION_HEADER + SERIALIZATION_VERSION + bytes([flags]) + data
 
     def unserializeForm(self, values: bytes):
         """
         This method unserializes the values previously obtained using
         :py:meth:`serializeForm`, and stores
         the valid values form form fileds inside its corresponding field
+        Also reads data serialized with legacy format (zipped fields joined with separators)
         """
         if not values:  # Has nothing
             return
@@ -982,33 +1020,74 @@ class   UserInterface(metaclass=UserInterfaceType):
                     continue
                 self._gui[k].value = self._gui[k].defValue
 
-            values = typing.cast(bytes, encoders.decode(values, 'zip'))
-            if not values:  # Has nothing
+            if not values.startswith(SERIALIZATION_HEADER):
+                self.__unserializeLegacyForm(values)
                 return
 
-            for txt in values.split(b'\002'):
-                kb, v = txt.split(b'\003')
-                k = kb.decode('utf8')  # Convert name to unicode
-                if k in self._gui:
-                    try:
-                        if v and v[0] == 1:
-                            val = pickle.loads(v[1:])
-                        elif v and v[0] == 4:
-                            val = cryptoManager().AESDecrypt(v[1:], UDSB, True).decode()
-                        else:
-                            val = v
-                            # Ensure "legacy bytes" values are loaded correctly as unicode
-                            if isinstance(val, bytes):
-                                val = val.decode('utf_8')
-                    except Exception:
-                        logger.exception('Pickling {} from {}'.format(k, self))
-                        val = ''
-                    self._gui[k].value = val
-                # logger.debug('Value for {0}:{1}'.format(k, val))
+            pos = len(SERIALIZATION_HEADER)
+            version = values[pos:pos + 1]
+            if version != SERIALIZATION_VERSION:  # Only version 1 exists right now, so this has been stored by a newer one
+                logger.error('Unsupported form serialization version %s on %s, using default values', version, self.__class__)
+                return
+            flags = values[pos + 1]
+            data = values[pos + 2:]
+            if flags & FLAG_ZIPPED:
+                data = zlib.decompress(data)
+
+            pos, length = 0, len(data)
+            while pos < length:
+                nameLength = struct.unpack_from('>H', data, pos)[0]
+                k = data[pos + 2:pos + 2 + nameLength].decode('utf8')
+                pos += 2 + nameLength
+                fieldType = data[pos:pos + 1]
+                valueLength = struct.unpack_from('>I', data, pos + 1)[0]
+                v = data[pos + 5:pos + 5 + valueLength]
+                pos += 5 + valueLength
+                if k not in self._gui:
+                    continue
+                try:
+                    if fieldType == FIELD_TEXT:
+                        val = v.decode('utf8')
+                    elif fieldType == FIELD_LIST:
+                        val = _unpackList(v)
+                    elif fieldType == FIELD_CRYPT:
+                        val = cryptoManager().AESDecrypt(v, UDSB).decode()
+                    else:
+                        val = pickle.loads(v)
+                except Exception:
+                    logger.exception('Unserializing {} from {}'.format(k, self))
+                    val = ''
+                self._gui[k].value = val
         except Exception:
             logger.exception('Exception on unserialization on %s', self.__class__)
-            # Values can contain invalid characters, so we log every single char
-            # logger.info('Invalid serialization data on {0} {1}'.format(self, values.encode('hex')))
+
+    def __unserializeLegacyForm(self, values: bytes):
+        """
+        Unserializes data stored with the legacy format (zipped and "separated" values)
+        """
+        values = typing.cast(bytes, encoders.decode(values, 'zip'))
+        if not values:  # Has nothing
+            return
+
+        for txt in values.split(b'\002'):
+            kb, v = txt.split(b'\003')
+            k = kb.decode('utf8')  # Convert name to unicode
+            if k in self._gui:
+                try:
+                    if v and v[0] == 1:
+                        val = pickle.loads(v[1:])
+                    elif v and v[0] == 4:
+                        val = cryptoManager().AESDecrypt(v[1:], UDSB, True).decode()
+                    else:
+                        val = v
+                        # Ensure "legacy bytes" values are loaded correctly as unicode
+                        if isinstance(val, bytes):
+                            val = val.decode('utf_8')
+                except Exception:
+                    logger.exception('Pickling {} from {}'.format(k, self))
+                    val = ''
+                self._gui[k].value = val
+            # logger.debug('Value for {0}:{1}'.format(k, val))
 
     @classmethod
     def guiDescription(cls, obj: typing.Optional['UserInterface'] = None) -> typing.List[typing.Dict[str, str]]:
@@ -33,9 +33,13 @@
 import hashlib
 import logging
 import pickle
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import typing
 
+from django.conf import settings
 from django.db import transaction
 from uds.models.cache import Cache as DBCache
 from uds.models.util import getSqlDatetime
@@ -43,12 +47,116 @@ from uds.core.util import encoders
 
 logger = logging.getLogger(__name__)
 
+# Types that can be returned "as is" from local cache, because they can't be modified by caller
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def _isImmutable(value: typing.Any) -> bool:
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(_isImmutable(v) for v in value)
+    return False
+
+
+class LocalCache:
+    """
+    Bounded, per process, LRU tier that sits in front of the database cache table.
+    Local entries never live longer than the database entry, and also never longer than
+    "maxTTL" seconds, so changes made by other processes (brokers, workers) are seen soon enough.
+    """
+    _lock: threading.Lock
+    _items: 'OrderedDict[str, typing.Tuple[str, float, bool, typing.Any]]'  # key -> (owner, expiration, pickled, value)
+    _stats: typing.Dict[str, typing.List[int]]  # owner -> [hits, misses, evictions]
+    _size: int
+    _maxTTL: int
+
+    def __init__(self, size: int, maxTTL: int):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._stats = {}
+        self._size = size
+        self._maxTTL = maxTTL
+
+    def _counters(self, owner: str) -> typing.List[int]:
+        try:
+            return self._stats[owner]
+        except KeyError:
+            self._stats[owner] = counters = [0, 0, 0]
+            return counters
+
+    def get(self, owner: str, key: str) -> typing.Tuple[bool, typing.Any]:
+        """
+        Returns a tuple (found, value)
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._items[key]
+                self._counters(owner)[1] += 1
+                return False, None
+            self._items.move_to_end(key)
+            self._counters(owner)[0] += 1
+
+        # Unpickle outside the lock
+        return True, pickle.loads(item[3]) if item[2] else item[3]
+
+    def put(self, owner: str, key: str, value: typing.Any, validity: float, pickled: typing.Optional[bytes] = None) -> None:
+        if self._size <= 0 or validity <= 0:
+            return
+        if _isImmutable(value):
+            item = (owner, time.monotonic() + min(validity, self._maxTTL), False, value)
+        else:
+            item = (owner, time.monotonic() + min(validity, self._maxTTL), True, pickled or pickle.dumps(value))
+
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self._size:
+                _, (evictedOwner, *_) = self._items.popitem(last=False)
+                self._counters(evictedOwner)[2] += 1
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def removeOwner(self, owner: typing.Optional[str] = None) -> None:
+        with self._lock:
+            if owner is None:
+                self._items.clear()
+                return
+            for k in [k for k, v in self._items.items() if v[0] == owner]:
+                del self._items[k]
+
+    def cleanUp(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for k in [k for k, v in self._items.items() if v[1] < now]:
+                del self._items[k]
+
+    def stats(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        with self._lock:
+            return {
+                owner: {'hits': v[0], 'misses': v[1], 'evictions': v[2]}
+                for owner, v in self._stats.items()
+            }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
 
 class Cache:
     # Simple hits vs missses counters
     hits = 0
     misses = 0
 
+    # Process wide tier in front of DB. Size 0 disables it
+    local: LocalCache = LocalCache(
+        getattr(settings, 'CACHE_LOCAL_SIZE', 2048),
+        getattr(settings, 'CACHE_LOCAL_MAX_TTL', 10)
+    )
+
     DEFAULT_VALIDITY = 60
 
     _owner: str
@@ -66,24 +174,32 @@ class Cache:
         return h.hexdigest()
 
     def get(self, skey: typing.Union[str, bytes], defValue: typing.Any = None) -> typing.Any:
-        now: datetime = typing.cast(datetime, getSqlDatetime())
         # logger.debug('Requesting key "%s" for cache "%s"', skey, self._owner)
+        key = self.__getKey(skey)
+        found, val = Cache.local.get(self._owner, key)
+        if found:
+            Cache.hits += 1
+            return val
+
+        now: datetime = typing.cast(datetime, getSqlDatetime())
         try:
-            key = self.__getKey(skey)
             # logger.debug('Key: %s', key)
             c: DBCache = DBCache.objects.get(pk=key)  # @UndefinedVariable
             # If expired
-            if now > c.created + timedelta(seconds=c.validity):
+            remaining = (c.created + timedelta(seconds=c.validity) - now).total_seconds()
+            if remaining < 0:
                 return defValue
 
             try:
                 # logger.debug('value: %s', c.value)
-                val = pickle.loads(typing.cast(bytes, encoders.decode(c.value, 'base64')))
+                pickled = typing.cast(bytes, encoders.decode(c.value, 'base64'))
+                val = pickle.loads(pickled)
             except Exception:  # If invalid, simple do no tuse it
                 logger.exception('Invalid pickle from cache. Removing it.')
                 c.delete()
                 return defValue
 
+            Cache.local.put(self._owner, key, val, remaining, pickled)
             Cache.hits += 1
             return val
         except DBCache.DoesNotExist:  # @UndefinedVariable
@@ -101,8 +217,9 @@ class Cache:
         If cached item does not exists, nothing happens (no exception thrown)
         """
         # logger.debug('Removing key "%s" for uService "%s"' % (skey, self._owner))
+        key = self.__getKey(skey)
+        Cache.local.remove(key)
         try:
-            key = self.__getKey(skey)
             DBCache.objects.get(pk=key).delete()  # @UndefinedVariable
             return True
         except DBCache.DoesNotExist:  # @UndefinedVariable
@@ -117,27 +234,132 @@ class Cache:
         if validity is None:
             validity = Cache.DEFAULT_VALIDITY
         key = self.__getKey(skey)
-        value = typing.cast(str, encoders.encode(pickle.dumps(value), 'base64', asText=True))
+        pickled = pickle.dumps(value)
+        strValue = typing.cast(str, encoders.encode(pickled, 'base64', asText=True))
         now: datetime = typing.cast(datetime, getSqlDatetime())
+        # Local copy is invalidated before storing, so a failed store does not leaves an stale value
+        Cache.local.remove(key)
         try:
-            DBCache.objects.create(owner=self._owner, key=key, value=value, created=now, validity=validity)  # @UndefinedVariable
+            DBCache.objects.create(owner=self._owner, key=key, value=strValue, created=now, validity=validity)  # @UndefinedVariable
         except Exception:
             try:
                 # Already exists, modify it
                 c: DBCache = DBCache.objects.get(pk=key)  # @UndefinedVariable
                 c.owner = self._owner
                 c.key = key
-                c.value = value
+                c.value = strValue
                 c.created = now
                 c.validity = validity
                 c.save()
             except transaction.TransactionManagementError:
                 logger.debug('Transaction in course, cannot store value')
+                return
+        Cache.local.put(self._owner, key, value, validity, pickled)
+
+    def getMany(self, skeys: typing.Iterable[typing.Union[str, bytes]], defValue: typing.Any = None) -> typing.Dict[typing.Union[str, bytes], typing.Any]:
+        """
+        Gets several keys at once, with just one query for the ones not found on local cache.
+        Returns a dictionary with requested keys as keys. Not found or expired keys will have "defValue" as value
+        """
+        result: typing.Dict[typing.Union[str, bytes], typing.Any] = {}
+        pending: typing.Dict[str, typing.Union[str, bytes]] = {}  # db key -> requested key
+        for skey in skeys:
+            key = self.__getKey(skey)
+            found, val = Cache.local.get(self._owner, key)
+            if found:
+                Cache.hits += 1
+                result[skey] = val
+            else:
+                result[skey] = defValue
+                pending[key] = skey
+
+        if not pending:
+            return result
+
+        now: datetime = typing.cast(datetime, getSqlDatetime())
+        invalid: typing.List[str] = []
+        try:
+            for c in DBCache.objects.filter(pk__in=list(pending.keys())):  # @UndefinedVariable
+                remaining = (c.created + timedelta(seconds=c.validity) - now).total_seconds()
+                if remaining < 0:
+                    continue
+                try:
+                    pickled = typing.cast(bytes, encoders.decode(c.value, 'base64'))
+                    val = pickle.loads(pickled)
+                except Exception:
+                    logger.exception('Invalid pickle from cache. Removing it.')
+                    invalid.append(c.key)
+                    continue
+                Cache.local.put(self._owner, c.key, val, remaining, pickled)
+                result[pending.pop(c.key)] = val
+                Cache.hits += 1
+        except Exception:
+            logger.debug('Cache inaccesible')
+
+        Cache.misses += len(pending)
+        if invalid:
+            DBCache.objects.filter(pk__in=invalid).delete()  # @UndefinedVariable
+        return result
+
+    def putMany(self, values: typing.Mapping[typing.Union[str, bytes], typing.Any], validity: typing.Optional[int] = None) -> None:
+        """
+        Stores several keys at once. Existing keys are updated, new ones are created, using bulk operations
+        """
+        if validity is None:
+            validity = Cache.DEFAULT_VALIDITY
+        now: datetime = typing.cast(datetime, getSqlDatetime())
+        items: typing.Dict[str, typing.Tuple[typing.Any, bytes, DBCache]] = {}
+        for skey, value in values.items():
+            key = self.__getKey(skey)
+            pickled = pickle.dumps(value)
+            Cache.local.remove(key)
+            items[key] = (
+                value,
+                pickled,
+                DBCache(
+                    owner=self._owner,
+                    key=key,
+                    value=typing.cast(str, encoders.encode(pickled, 'base64', asText=True)),
+                    created=now,
+                    validity=validity
+                )
+            )
+
+        if not items:
+            return
+
+        try:
+            with transaction.atomic():
+                existing = set(DBCache.objects.filter(pk__in=list(items.keys())).values_list('key', flat=True))  # @UndefinedVariable
+                DBCache.objects.bulk_create([v[2] for k, v in items.items() if k not in existing])  # @UndefinedVariable
+                DBCache.objects.bulk_update([v[2] for k, v in items.items() if k in existing], ['owner', 'value', 'created', 'validity'])  # @UndefinedVariable
+        except transaction.TransactionManagementError:
+            logger.debug('Transaction in course, cannot store values')
+            return
+        except Exception:
+            # Concurrently created by someone else, fallback to one by one storing
+            for skey, value in values.items():
+                self.put(skey, value, validity)
+            return
+
+        for key, (value, pickled, _) in items.items():
+            Cache.local.put(self._owner, key, value, validity, pickled)
+
+    def deleteMany(self, skeys: typing.Iterable[typing.Union[str, bytes]]) -> None:
+        """
+        Removes several keys at once. Non existing keys are simply ignored
+        """
+        keys = [self.__getKey(skey) for skey in skeys]
+        for key in keys:
+            Cache.local.remove(key)
+        DBCache.objects.filter(pk__in=keys).delete()  # @UndefinedVariable
 
     def refresh(self, skey: typing.Union[str, bytes]) -> None:
         # logger.debug('Refreshing key "%s" for cache "%s"' % (skey, self._owner,))
+        key = self.__getKey(skey)
+        # Simply drop local copy, next "get" will read refreshed validity from db
+        Cache.local.remove(key)
         try:
-            key = self.__getKey(skey)
             c = DBCache.objects.get(pk=key)  # @UndefinedVariable
             c.created = getSqlDatetime()
             c.save()
@@ -147,15 +369,25 @@ class Cache:
 
     @staticmethod
     def purge() -> None:
+        Cache.local.removeOwner()
         DBCache.objects.all().delete()  # @UndefinedVariable
 
     @staticmethod
     def cleanUp() -> None:
+        Cache.local.cleanUp()
         DBCache.cleanUp()  # @UndefinedVariable
 
+    @staticmethod
+    def stats() -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        Returns local tier hits, misses & evictions, per owner
+        """
+        return Cache.local.stats()
+
     @staticmethod
     def delete(owner: typing.Optional[str] = None) -> None:
         # logger.info("Deleting cache items")
+        Cache.local.removeOwner(owner)
         if owner is None:
             objects = DBCache.objects.all()  # @UndefinedVariable
         else:
@@ -33,6 +33,7 @@
 import datetime
 import time
 import logging
+import typing
 
 import bitarray
 
@@ -49,6 +50,10 @@ from uds.core.util.cache import Cache
 logger = logging.getLogger(__name__)
 
 
+# Compiled horizon of a calendar: (modified, first day ordinal, days, active bits, start events bits, end events bits, events are exact)
+HorizonType = typing.Tuple[str, int, int, bytes, bytes, bytes, bool]
+
+
 class CalendarChecker:
     calendar: Calendar
 
@@ -57,11 +62,172 @@ class CalendarChecker:
     cache_hit: int = 0
     hits: int = 0
 
+    # Days ahead compiled on calendar "horizon" (plus the previous one)
+    horizonDays: int = 7
+
     cache = Cache('calChecker')
 
     def __init__(self, calendar: Calendar):
         self.calendar = calendar
 
+    @staticmethod
+    def _horizonKey(calendarId: int, firstDay: typing.Optional[int] = None) -> str:
+        """
+        Key of the "rolling" horizon of a calendar, or, if firstDay is given, of the horizon compiled for dates out of it
+        """
+        return 'horizon' + str(calendarId) + ('-' + str(firstDay) if firstDay is not None else '')
+
+    def _compile(self, fromDate: datetime.date) -> HorizonType:
+        """
+        Compiles the calendar rules for "horizonDays" days from fromDate (and the day before it) on three bitmaps (minute granularity),
+        active minutes, minutes where a rule starts and minutes where a rule ends
+        """
+        logger.debug('Compiling calendar %s from %s', self.calendar.name, fromDate)
+        CalendarChecker.updates += 1
+
+        days = CalendarChecker.horizonDays + 1
+        size = days * 24 * 60
+        start = datetime.datetime.combine(fromDate - datetime.timedelta(days=1), datetime.datetime.min.time())
+        end = start + datetime.timedelta(minutes=size) - datetime.timedelta(microseconds=1)
+
+        active, starts, ends = bitarray.bitarray(size), bitarray.bitarray(size), bitarray.bitarray(size)
+        for bits in (active, starts, ends):
+            bits.setall(False)
+
+        def position(dtime: datetime.datetime) -> int:
+            return int((dtime - start).total_seconds() // 60)
+
+        exact = True
+        for rule in self.calendar.rules.all():
+            # Events not at exact minutes can't be represented by the bitmap
+            if rule.start.second or rule.start.microsecond:
+                exact = False
+
+            rr = rule.as_rrule()
+            for val in rr.between(start, end, inc=True):
+                starts[position(val)] = True
+            for val in rule.as_rrule_end().between(start, end, inc=True):
+                ends[position(val)] = True
+
+            ruleDurationMinutes = rule.duration_as_minutes
+            ruleFrequencyMinutes = rule.frequency_as_minutes
+
+            # Skip "bogus" definitions
+            if ruleDurationMinutes == 0 or ruleFrequencyMinutes == 0:
+                continue
+
+            # Occurrences starting before the horizon can still be active on it
+            diff = ruleFrequencyMinutes if ruleFrequencyMinutes > ruleDurationMinutes else ruleDurationMinutes
+            _start = (start if start > rule.start else rule.start) - datetime.timedelta(minutes=diff)
+
+            for val in rr.between(_start, end, inc=True):
+                pos = position(val)
+                posEnd = min(pos + ruleDurationMinutes, size)
+                if posEnd <= 0:
+                    continue
+                active[max(pos, 0):posEnd] = True
+
+        return (
+            str(self.calendar.modified), start.date().toordinal(), days,
+            active.tobytes(), starts.tobytes(), ends.tobytes(), exact
+        )
+
+    def _storeHorizon(self, horizon: HorizonType, key: typing.Optional[str] = None) -> None:
+        key = key or CalendarChecker._horizonKey(self.calendar.id)
+        CalendarChecker.cache.put(key, horizon, 3600 * 24 * CalendarChecker.horizonDays)
+        caches['memory'].set(key + horizon[0], horizon, 3600 * 24)
+
+    def _storedHorizons(self, key: str) -> typing.Iterator[HorizonType]:
+        """
+        Yields the valid (not outdated) horizons stored for key, first the one on local memory and then the one on db cache
+        """
+        modified = str(self.calendar.modified)
+        horizon: typing.Optional[HorizonType] = caches['memory'].get(key + modified)
+        if horizon:
+            yield horizon
+        horizon = CalendarChecker.cache.get(key)
+        if horizon and horizon[0] == modified:
+            caches['memory'].set(key + modified, horizon, 3600 * 24)
+            yield horizon
+
+    @staticmethod
+    def _horizonContains(horizon: HorizonType, dtime: datetime.datetime, margin: int = 0) -> bool:
+        """
+        Checks if dtime is inside the horizon, with at least "margin" days left until its end
+        """
+        day = dtime.date().toordinal()
+        return horizon[1] <= day < horizon[1] + horizon[2] - margin
+
+    def _horizon(self, dtime: datetime.datetime) -> typing.Optional[HorizonType]:
+        """
+        Returns the compiled horizon that contains dtime, compiling it if needed, or None if dtime is "behind" the
+        current horizon (so the caller can compute it by other means)
+        """
+        key = CalendarChecker._horizonKey(self.calendar.id)
+        rolling: typing.Optional[HorizonType] = None
+        for rolling in self._storedHorizons(key):
+            if CalendarChecker._horizonContains(rolling, dtime):
+                CalendarChecker.cache_hit += 1
+                return rolling
+
+        if rolling is None:  # Missing or outdated, compile it from today
+            rolling = self._compile(getSqlDatetime().date())
+            self._storeHorizon(rolling, key)
+            if CalendarChecker._horizonContains(rolling, dtime):
+                return rolling
+
+        day = dtime.date().toordinal()
+        if day < rolling[1]:
+            return None
+
+        # Beyond rolling horizon, use (or compile) the one for its "block" of days, keeping the rolling one untouched
+        firstDay = day - day % CalendarChecker.horizonDays
+        key = CalendarChecker._horizonKey(self.calendar.id, firstDay)
+        for horizon in self._storedHorizons(key):
+            CalendarChecker.cache_hit += 1
+            return horizon
+        horizon = self._compile(datetime.date.fromordinal(firstDay))
+        self._storeHorizon(horizon, key)
+        return horizon
+
+    @staticmethod
+    def _bits(data: bytes) -> bitarray.bitarray:
+        bits = bitarray.bitarray()
+        bits.frombytes(data)
+        return bits
+
+    def precompile(self, now: typing.Optional[datetime.datetime] = None) -> bool:
+        """
+        Ensures that the compiled horizon of this calendar is up to date and covers at least one day after now
+
+        Returns:
+            True if it was compiled, False if it was already fine
+        """
+        now = now or getSqlDatetime()
+        horizon: typing.Optional[HorizonType] = CalendarChecker.cache.get(CalendarChecker._horizonKey(self.calendar.id))
+        if horizon and horizon[0] == str(self.calendar.modified) and CalendarChecker._horizonContains(horizon, now, 1):
+            return False
+        self._storeHorizon(self._compile(now.date()))
+        return True
+
+    @staticmethod
+    def precompileAll(now: typing.Optional[datetime.datetime] = None) -> int:
+        """
+        Precompiles the horizon of all calendars that needs it. Returns the number of calendars compiled
+        """
+        now = now or getSqlDatetime()
+        compiled = 0
+        for calendar in Calendar.objects.all().prefetch_related('rules'):
+            try:
+                compiled += CalendarChecker(calendar).precompile(now)
+            except Exception:
+                logger.exception('Compiling calendar %s', calendar)
+        return compiled
+
+    @staticmethod
+    def invalidate(calendarId: int) -> None:
+        CalendarChecker.cache.remove(CalendarChecker._horizonKey(calendarId))
+
     def _updateData(self, dtime: datetime.datetime):
         logger.debug('Updating %s', dtime)
         # Else, update the array
@@ -137,6 +303,12 @@ class CalendarChecker:
         if dtime is None:
             dtime = getSqlDatetime()
 
+        horizon = self._horizon(dtime)
+        if horizon is not None:
+            pos = (dtime.date().toordinal() - horizon[1]) * 24 * 60 + dtime.hour * 60 + dtime.minute
+            return CalendarChecker._bits(horizon[3])[pos]
+
+        # Out of compiled horizon, compute just the day requested
         # memcached access
         memCache = caches['memory']
 
@@ -171,6 +343,18 @@ class CalendarChecker:
         if offset is None:
             offset = datetime.timedelta(minutes=0)
 
+        # Look for the event on the compiled horizon. Events are "after" checkFrom, so search starts on next minute
+        checkAt = checkFrom + offset
+        horizon = self._horizon(checkAt)
+        if horizon is not None and horizon[6]:
+            pos = (checkAt.date().toordinal() - horizon[1]) * 24 * 60 + checkAt.hour * 60 + checkAt.minute + 1
+            try:
+                found = CalendarChecker._bits(horizon[4] if startEvent else horizon[5]).index(True, pos)
+                CalendarChecker.hits += 1
+                return datetime.datetime.fromordinal(horizon[1]) + datetime.timedelta(minutes=found) + offset
+            except ValueError:
+                pass  # Not on horizon, look for it using rules
+
         cacheKey = str(hash(self.calendar.modified)) + self.calendar.uuid + str(
             offset.seconds) + str(int(time.mktime(checkFrom.timetuple()))) + 'event' + ('x' if startEvent is True else '_')
         next_event = CalendarChecker.cache.get(cacheKey, None)
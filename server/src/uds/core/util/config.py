@@ -30,6 +30,9 @@
 @author: Adolfo Gómez, dkmaster at dkmon dot com
 """
 import sys
+import time
+import uuid
+import threading
 import typing
 import logging
 
@@ -51,6 +54,12 @@ _getLater = []
 # For custom params (for choices mainly)
 _configParams = {}
 
+# Hidden section & key of the version stamp of configuration, changed whenever any value is changed
+VERSION_SECTION: str = '__config'
+VERSION_KEY: str = 'version'
+# Interval, in seconds, between checks of version stamp
+VERSION_CHECK_INTERVAL: int = 5
+
 
 class Config:
     # Fields types, so inputs get more "beautiful"
@@ -62,6 +71,54 @@ class Config:
     READ_FIELD: int = 5  # Only can viewed, but not changed (can be changed througn API, it's just read only to avoid "mistakes")
     HIDDEN_FIELD: int = 6  # Not visible on "admin" config edition
 
+    # Process wide copy of configuration table, reloaded (in just one query) when version stamp changes
+    # (section, key) -> (value, crypt, long, field_type)
+    _values: typing.ClassVar[typing.Dict[typing.Tuple[str, str], typing.Tuple[str, bool, bool, int]]] = {}
+    _generation: typing.ClassVar[int] = 0  # Incremented on every reload of _values
+    _version: typing.ClassVar[typing.Optional[str]] = None
+    _nextCheck: typing.ClassVar[float] = 0
+    _lock: typing.ClassVar[threading.Lock] = threading.Lock()
+
+    @staticmethod
+    def checkVersion(force: bool = False) -> None:
+        """
+        Checks (at most every VERSION_CHECK_INTERVAL seconds, unless forced) the version stamp of configuration,
+        reloading all values if it has been changed (by this or any other server)
+        """
+        now = time.monotonic()
+        if not force and now < Config._nextCheck:
+            return
+        with Config._lock:
+            if not force and now < Config._nextCheck:
+                return
+            Config._nextCheck = now + VERSION_CHECK_INTERVAL
+            try:
+                version = DBConfig.objects.filter(section=VERSION_SECTION, key=VERSION_KEY).values_list('value', flat=True).first()  # @UndefinedVariable
+                if Config._generation and version == Config._version:
+                    return
+                Config._values = {
+                    (c.section, c.key): (c.value, c.crypt, c.long, c.field_type)
+                    for c in DBConfig.objects.all()  # @UndefinedVariable
+                }
+                Config._version = version
+                Config._generation += 1
+                logger.debug('Reloaded configuration, version %s', version)
+            except Exception:  # i.e. table do not exists yet (migrating)
+                logger.debug('Could not check configuration version')
+
+    @staticmethod
+    def changed() -> None:
+        """
+        Notifies all servers (including this one) that configuration has been changed
+        """
+        try:
+            DBConfig.objects.update_or_create(  # @UndefinedVariable
+                section=VERSION_SECTION, key=VERSION_KEY, defaults={'value': uuid.uuid4().hex, 'field_type': Config.HIDDEN_FIELD}
+            )
+        except Exception:
+            logger.debug('Could not update configuration version')
+        Config._nextCheck = 0  # Next get will reload values
+
     class Value:
 
         def __init__(self, section: 'Config.Section', key: str, default: str = '', crypt: bool = False, longText: bool = False, **kwargs):
@@ -77,6 +134,7 @@ class Config:
             else:
                 self._default = cryptoManager().encrypt(default)
             self._data: typing.Optional[str] = None
+            self._generation: int = 0
 
         def get(self, force: bool = False) -> str:
             # Ensures DB contains configuration values
@@ -89,7 +147,19 @@ class Config:
                 _getLater.append(self)
                 return self._default
 
+            Config.checkVersion()
             try:
+                if not force and self._generation != Config._generation:
+                    # Values are kept in memory, and reloaded when changed on any server
+                    cached = Config._values.get((self._section.name(), self._key))
+                    if cached is not None and self._type in (-1, cached[3]):
+                        self._data = cached[0]
+                        self._crypt = [self._crypt, True][cached[1]]  # True has "higher" precedende than False
+                        self._longText = cached[2]
+                        self._type = cached[3]
+                        self._generation = Config._generation
+                    else:
+                        self._data = None  # Not stored yet (or type changed), go to database
                 if force or self._data is None:
                     # logger.debug('Accessing db config {0}.{1}'.format(self._section.name(), self._key))
                     readed = DBConfig.objects.get(section=self._section.name(), key=self._key)  # @UndefinedVariable
@@ -100,6 +170,7 @@ class Config:
                         readed.field_type = self._type
                         readed.save(update_fields=['field_type'])
                     self._type = readed.field_type
+                    self._generation = Config._generation
             except Exception:
                 # Not found
                 if self._default != '' and self._crypt:
@@ -164,6 +235,8 @@ class Config:
                 obj, _ = DBConfig.objects.get_or_create(section=self._section.name(), key=self._key)  # @UndefinedVariable
                 obj.value, obj.crypt, obj.long, obj.field_type = value, self._crypt, self._longText, self._type
                 obj.save()
+                self._data = value
+                Config.changed()
             except Exception:
                 if 'migrate' in sys.argv:  # During migration, set could be saved as part of initialization...
                     return
@@ -224,6 +297,7 @@ class Config:
                 value = cryptoManager().encrypt(value)
             cfg.value = value
             cfg.save()
+            Config.changed()
             logger.debug('Updated value for %s.%s to %s', section, key, value)
             return True
         except Exception:
@@ -237,10 +311,22 @@ class GlobalConfig:
     SESSION_EXPIRE_TIME: Config.Value = Config.section(GLOBAL_SECTION).value('sessionExpireTime', '24', type=Config.NUMERIC_FIELD)  # Max session duration (in use) after a new publishment has been made
     # Delay between cache checks. reducing this number will increase cache generation speed but also will load service providers
     CACHE_CHECK_DELAY: Config.Value = Config.section(GLOBAL_SECTION).value('cacheCheckDelay', '19', type=Config.NUMERIC_FIELD)
+    # Max number of cache services created per service pool on every cache check. Pools are grown in parallel if greater than 1
+    CACHE_GROW_BURST: Config.Value = Config.section(GLOBAL_SECTION).value('cacheGrowBurst', '1', type=Config.NUMERIC_FIELD)
     # Delayed task number of threads PER SERVER, with higher number of threads, deplayed task will complete sooner, but it will give more load to overall system
     DELAYED_TASKS_THREADS: Config.Value = Config.section(GLOBAL_SECTION).value('delayedTasksThreads', '4', type=Config.NUMERIC_FIELD)
+    # Number of workers PER SERVER executing delayed tasks. Delayed tasks threads claims due tasks in batches to feed them.
+    # 0 means that every delayed task thread claims one task at a time and executes it on a new thread
+    DELAYED_TASKS_WORKERS: Config.Value = Config.section(GLOBAL_SECTION).value('delayedTasksWorkers', '16', type=Config.NUMERIC_FIELD)
+    # Max number of publication tasks (launch and finish checks, per type) executing at once on delayed tasks workers PER SERVER. 0 means no limit
+    DELAYED_TASKS_PUBLICATION_CONCURRENCY: Config.Value = Config.section(GLOBAL_SECTION).value('delayedTasksPublicationConcurrency', '2', type=Config.NUMERIC_FIELD)
+    # Max number of user services operations checks executing at once on delayed tasks workers PER SERVER. 0 means no limit
+    # Keep it below delayedTasksWorkers, so a slow service provider do not stall every other delayed task
+    DELAYED_TASKS_OPCHECKER_CONCURRENCY: Config.Value = Config.section(GLOBAL_SECTION).value('delayedTasksOpCheckerConcurrency', '12', type=Config.NUMERIC_FIELD)
     # Number of scheduler threads running PER SERVER, with higher number of threads, deplayed task will complete sooner, but it will give more load to overall system
     SCHEDULER_THREADS: Config.Value = Config.section(GLOBAL_SECTION).value('schedulerThreads', '3', type=Config.NUMERIC_FIELD)
+    # If scheduler threads sleep until next job is due, claiming all due jobs at once, instead of checking for one job every few seconds
+    SCHEDULER_WAKEUP: Config.Value = Config.section(GLOBAL_SECTION).value('schedulerWakeup', '1', type=Config.BOOLEAN_FIELD)
     # Waiting time before removing "errored" and "removed" publications, cache, and user assigned machines. Time is in seconds
     CLEANUP_CHECK: Config.Value = Config.section(GLOBAL_SECTION).value('cleanupCheck', '3607', type=Config.NUMERIC_FIELD)
     # Time to maintaing "info state" items before removing it, in seconds
@@ -289,6 +375,8 @@ class GlobalConfig:
     MAX_INITIALIZING_TIME: Config.Value = Config.section(GLOBAL_SECTION).value('maxInitTime', '3601', type=Config.NUMERIC_FIELD)
     # Maximum logs per user service
     MAX_LOGS_PER_ELEMENT: Config.Value = Config.section(GLOBAL_SECTION).value('maxLogPerElement', '100', type=Config.NUMERIC_FIELD)
+    # Number of logs kept in memory before writing them to database. 0 writes them (and trims old ones) as soon as they are generated
+    LOG_BUFFER_SIZE: Config.Value = Config.section(GLOBAL_SECTION).value('logBufferSize', '128', type=Config.NUMERIC_FIELD)
     # Time to restrain a deployed service in case it gives some errors at some point
     RESTRAINT_TIME: Config.Value = Config.section(GLOBAL_SECTION).value('restrainTime', '600', type=Config.NUMERIC_FIELD)
     # Number of errors that must occurr in RESTRAIN_TIME to restrain deployed service
@@ -296,6 +384,16 @@ class GlobalConfig:
 
     # Statistics duration, in days
     STATS_DURATION: Config.Value = Config.section(GLOBAL_SECTION).value('statsDuration', '365', type=Config.NUMERIC_FIELD)
+    # Number of stats events & counters kept in memory before writing them to database. 0 writes them as soon as they are generated
+    STATS_BUFFER_SIZE: Config.Value = Config.section(GLOBAL_SECTION).value('statsBufferSize', '256', type=Config.NUMERIC_FIELD)
+    # Max time, in seconds, that buffered stats are kept in memory before writing them to database
+    STATS_FLUSH_INTERVAL: Config.Value = Config.section(GLOBAL_SECTION).value('statsFlushInterval', '5', type=Config.NUMERIC_FIELD)
+    # Number of keep-alive connections kept per hypervisor host (REST clients of service providers)
+    HTTP_POOL_SIZE: Config.Value = Config.section(GLOBAL_SECTION).value('httpPoolSize', '10', type=Config.NUMERIC_FIELD)
+    # Number of retries (with backoff) of failed connections to hypervisors REST apis
+    HTTP_RETRIES: Config.Value = Config.section(GLOBAL_SECTION).value('httpRetries', '3', type=Config.NUMERIC_FIELD)
+    # Number of unique ids (names, macs, ...) reserved at once by every process, so they are assigned without locking. 0 disables it
+    UNIQUEID_LEASE_SIZE: Config.Value = Config.section(GLOBAL_SECTION).value('uniqueIdLeaseSize', '8', type=Config.NUMERIC_FIELD)
     # If disallow login using /login url, and must go to an authenticator
     DISALLOW_GLOBAL_LOGIN: Config.Value = Config.section(GLOBAL_SECTION).value('disallowGlobalLogin', '0', type=Config.BOOLEAN_FIELD)
 
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2020 Virtual Cable S.L.U.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice,
+#      this list of conditions and the following disclaimer in the documentation
+#      and/or other materials provided with the distribution.
+#    * Neither the name of Virtual Cable S.L. nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+@author: Adolfo Gómez, dkmaster at dkmon dot com
+"""
+import re
+import time
+import threading
+import urllib.parse
+import logging
+import typing
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from uds.core.util.config import GlobalConfig
+
+logger = logging.getLogger(__name__)
+
+# Path segments containing digits (ids, uuids, upids, ...) are grouped on metrics
+_idSegmentRe = re.compile(r'/[^/]*[0-9][^/]*')
+
+_sessions: typing.Dict[str, requests.Session] = {}
+_sessionsLock = threading.Lock()
+
+# (session key, method, endpoint) -> [requests, errors, total seconds, max seconds]
+_metrics: typing.Dict[typing.Tuple[str, str, str], typing.List[float]] = {}
+_metricsLock = threading.Lock()
+
+
+def _endpoint(url: str) -> str:
+    return _idSegmentRe.sub('/{id}', urllib.parse.urlparse(url).path)
+
+
+def _record(key: str, method: str, url: str, elapsed: float, failed: bool) -> None:
+    mkey = (key, method, _endpoint(url))
+    with _metricsLock:
+        m = _metrics.get(mkey)
+        if m is None:
+            m = _metrics[mkey] = [0, 0, 0.0, 0.0]
+        m[0] += 1
+        m[1] += 1 if failed else 0
+        m[2] += elapsed
+        m[3] = max(m[3], elapsed)
+
+
+class PooledSession(requests.Session):
+    """
+    Session that keeps alive its connections (so they are reused by every request to same host),
+    retries connection errors (and idempotent requests failed with a gateway error) with backoff,
+    and records latency metrics per endpoint.
+    """
+    _key: str
+
+    def __init__(self, key: str, poolSize: int, retries: int):
+        super().__init__()
+        self._key = key
+        adapter = HTTPAdapter(
+            pool_connections=poolSize,
+            pool_maxsize=poolSize,
+            max_retries=Retry(total=retries, read=0, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False)
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, *args, **kwargs):  # pylint: disable=arguments-differ
+        start = time.time()
+        failed = True
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            failed = not response.ok
+            return response
+        finally:
+            _record(self._key, method.upper(), url, time.time() - start, failed)
+
+
+def getSession(key: str) -> requests.Session:
+    """
+    Returns the pooled session shared (process wide) by all clients using same key (usually, one per provider host)
+    """
+    session = _sessions.get(key)
+    if session is None:
+        with _sessionsLock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = PooledSession(key, GlobalConfig.HTTP_POOL_SIZE.getInt(), GlobalConfig.HTTP_RETRIES.getInt())
+    return session
+
+
+def closeSession(key: str) -> None:
+    """
+    Closes (and forgets) the session, i.e. when provider connection data changes
+    """
+    with _sessionsLock:
+        session = _sessions.pop(key, None)
+    if session:
+        session.close()
+
+
+def stats(key: typing.Optional[str] = None) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Returns requests, errors, average & max latency (in milliseconds) per session and endpoint
+    """
+    with _metricsLock:
+        return [
+            {
+                'session': k[0],
+                'method': k[1],
+                'endpoint': k[2],
+                'requests': int(v[0]),
+                'errors': int(v[1]),
+                'avg_ms': int(v[2] * 1000 / v[0]) if v[0] else 0,
+                'max_ms': int(v[3] * 1000),
+            }
+            for k, v in sorted(_metrics.items())
+            if key is None or k[0] == key
+        ]
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2020 Virtual Cable S.L.U.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice,
+#      this list of conditions and the following disclaimer in the documentation
+#      and/or other materials provided with the distribution.
+#    * Neither the name of Virtual Cable S.L. nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+@author: Adolfo Gómez, dkmaster at dkmon dot com
+"""
+import bisect
+import threading
+import time
+import random
+import logging
+import typing
+
+from uds.core.util.cache import Cache
+
+# Not imported at runtime, just for type checking
+if typing.TYPE_CHECKING:
+    from uds.models import Network
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkIndex:
+    """
+    Process wide index of networks, so checks of "ip in networks" (for transports, or
+    for just listing networks of an ip) are done without database queries.
+
+    All networks ranges are splitted on "elementary" intervals (between consecutive range limits),
+    and every interval keeps a bitmap (python int) of the networks that covers it, so looking for the networks of an ip
+    is just a binary search. Transports keeps a bitmap of their networks.
+
+    The index is rebuilt on network/transport changes (signals). As other processes (brokers, workers) also modifies them,
+    a version stamp is shared using the cache, and checked at most every "checkInterval" seconds.
+    """
+    checkInterval: typing.ClassVar[int] = 10
+
+    _lock: threading.Lock
+    _cache: Cache
+    _loaded: bool
+    _version: typing.Any
+    _nextCheck: float
+
+    _bounds: typing.List[int]  # Sorted starts of elementary intervals
+    _masks: typing.List[int]  # Networks covering the elementary interval starting at _bounds[n]
+    _networks: typing.List['Network']
+    _transports: typing.Dict[int, int]  # transport id -> bitmap of its networks
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = Cache('networkIndex')
+        self._loaded = False
+        self._version = None
+        self._nextCheck = 0
+        self._bounds, self._masks, self._networks, self._transports = [], [], [], {}
+
+    def _build(self) -> None:
+        from uds.models import Network  # pylint: disable=import-outside-toplevel
+
+        networks = list(Network.objects.all().prefetch_related('transports'))
+        # Limits of all elementary intervals
+        bounds = sorted({n.net_start for n in networks} | {n.net_end + 1 for n in networks})
+        masks = [0] * len(bounds)
+        transports: typing.Dict[int, int] = {}
+        for pos, n in enumerate(networks):
+            bit = 1 << pos
+            for i in range(bisect.bisect_left(bounds, n.net_start), bisect.bisect_left(bounds, n.net_end + 1)):
+                masks[i] |= bit
+            for t in n.transports.all():
+                transports[t.id] = transports.get(t.id, 0) | bit
+
+        from uds.models import Transport  # pylint: disable=import-outside-toplevel
+
+        # Also transports without networks, to know that they exists on index
+        for tId in Transport.objects.values_list('id', flat=True):  # @UndefinedVariable
+            transports.setdefault(tId, 0)
+
+        self._bounds, self._masks, self._networks, self._transports = bounds, masks, networks, transports
+        logger.debug('Network index built: %s networks, %s intervals, %s transports', len(networks), len(bounds), len(transports))
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        if self._loaded and now < self._nextCheck:
+            return
+        with self._lock:
+            if self._loaded and now < self._nextCheck:
+                return
+            version = self._cache.get('version')
+            if not self._loaded or version != self._version:
+                self._build()
+                self._loaded, self._version = True, version
+            self._nextCheck = now + NetworkIndex.checkInterval
+
+    def _maskFor(self, ip: int) -> int:
+        pos = bisect.bisect_right(self._bounds, ip) - 1
+        return self._masks[pos] if pos >= 0 else 0
+
+    def networksFor(self, ip: int) -> typing.List['Network']:
+        self._check()
+        mask = self._maskFor(ip)
+        return [n for pos, n in enumerate(self._networks) if mask & (1 << pos)]
+
+    def transportMatches(self, transportId: int, ip: int) -> typing.Optional[typing.Tuple[bool, bool]]:
+        """
+        Returns a tuple (hasNetworks, ipIsInNetworks) for transport, or None if transport is not known by the index
+        """
+        self._check()
+        transportMask = self._transports.get(transportId)
+        if transportMask is None:
+            return None
+        return transportMask != 0, self._maskFor(ip) & transportMask != 0
+
+    def invalidate(self) -> None:
+        """
+        Invalidates the index on this process, and notifies the others (via cache) that they must rebuild theirs
+        """
+        with self._lock:
+            self._loaded = False
+        try:
+            self._cache.put('version', random.randint(0, 1 << 62), 3600 * 24 * 365)
+        except Exception as e:  # Ensure signals never fails because of this
+            logger.warning('Could not update network index version: %s', e)
+
+
+_index = NetworkIndex()
+
+
+def index() -> NetworkIndex:
+    return _index
+
+
+def invalidate(sender, **kwargs) -> None:  # pylint: disable=unused-argument
+    """
+    Signals receiver for changes on networks, transports or its relations
+    """
+    _index.invalidate()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2020 Virtual Cable S.L.U.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice,
+#      this list of conditions and the following disclaimer in the documentation
+#      and/or other materials provided with the distribution.
+#    * Neither the name of Virtual Cable S.L. nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+@author: Adolfo Gómez, dkmaster at dkmon dot com
+"""
+import time
+import threading
+import logging
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.db import connections
+
+from uds.core.util import connection
+from uds.core.util.cache import Cache
+
+# Not imported at runtime, just for type checking
+if typing.TYPE_CHECKING:
+    from uds import models
+
+logger = logging.getLogger(__name__)
+
+ProbeKey = typing.Tuple[str, str, str]
+
+
+class Prober:
+    """
+    Process wide reachability prober for (host, port) targets.
+
+    Probes are executed concurrently on a pool of threads, and concurrent requests for the same target
+    wait for the same probe. Results are kept on cache, so they are shared by all transports and server processes.
+    Targets requested recently (i.e. user services being accessed) are probed again before their result expires,
+    so users do not have to wait for connection timeouts when accessing them.
+    """
+    workers: int = 32
+    # Seconds that results are kept
+    validity: int = 30
+    failedValidity: int = 5
+    # Targets requested in the last hotTime seconds are probed again in background
+    hotTime: int = 300
+
+    _prober: typing.ClassVar[typing.Optional['Prober']] = None
+    _proberLock: typing.ClassVar[threading.Lock] = threading.Lock()
+
+    _executor: ThreadPoolExecutor
+    _lock: threading.Lock
+    _inFlight: typing.Dict[ProbeKey, 'Future[bool]']
+    _hot: typing.Dict[ProbeKey, typing.Tuple[float, float, typing.Optional['models.Proxy']]]
+    _probed: typing.Dict[ProbeKey, typing.Tuple[float, bool]]
+    _cache: Cache
+    _refresher: typing.Optional[threading.Thread]
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='Prober')
+        self._lock = threading.Lock()
+        self._inFlight = {}
+        self._hot = {}
+        self._probed = {}
+        self._cache = Cache('reachability')
+        self._refresher = None
+
+    @staticmethod
+    def prober() -> 'Prober':
+        if Prober._prober is None:
+            with Prober._proberLock:
+                if Prober._prober is None:
+                    Prober._prober = Prober()
+        return Prober._prober
+
+    @staticmethod
+    def _key(host: str, port: typing.Union[str, int], proxy: typing.Optional['models.Proxy']) -> ProbeKey:
+        return (host, str(port), proxy.uuid if proxy else '')
+
+    def _probe(self, key: ProbeKey, timeout: float, proxy: typing.Optional['models.Proxy']) -> bool:
+        host, port, _ = key
+        try:
+            result = proxy.doTestServer(host, port, timeout) if proxy else connection.testServer(host, port, timeout)
+            self._cache.put(':'.join(key), result, self.validity if result else self.failedValidity)
+            with self._lock:
+                self._probed[key] = (time.time(), result)
+            return result
+        finally:
+            with self._lock:
+                self._inFlight.pop(key, None)
+            connections['default'].close()
+
+    def probe(self, host: str, port: typing.Union[str, int], timeout: float = 4, proxy: typing.Optional['models.Proxy'] = None) -> 'Future[bool]':
+        """
+        Starts probing the target (if it is not already being probed), and returns the (maybe shared) probe future
+        """
+        key = Prober._key(host, port, proxy)
+        with self._lock:
+            future = self._inFlight.get(key)
+            if future is None:
+                future = self._inFlight[key] = self._executor.submit(self._probe, key, timeout, proxy)
+        return future
+
+    def isReachable(self, host: str, port: typing.Union[str, int], timeout: float = 4, proxy: typing.Optional['models.Proxy'] = None) -> bool:
+        """
+        Returns if target is reachable, using (if available) last probe result
+        """
+        key = Prober._key(host, port, proxy)
+        with self._lock:
+            self._hot[key] = (time.time(), timeout, proxy)
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh, name='ProberRefresher', daemon=True)
+                self._refresher.start()
+
+        result = self._cache.get(':'.join(key))
+        if result is not None:
+            return result
+
+        try:
+            return self.probe(host, port, timeout, proxy).result(timeout + 1)
+        except Exception as e:
+            logger.debug('Probing %s: %s', key, e)
+            return False
+
+    def _refresh(self) -> None:
+        """
+        Probes again recently requested targets, before their results expire
+        """
+        while True:
+            time.sleep(self.failedValidity)
+            try:
+                self._refreshHot()
+            except Exception:
+                logger.exception('Refreshing reachability of hot targets')
+
+    def _refreshHot(self) -> None:
+        now = time.time()
+        with self._lock:
+            for key in [k for k, v in self._hot.items() if v[0] < now - self.hotTime]:
+                del self._hot[key]
+                self._probed.pop(key, None)
+            hot = list(self._hot.items())
+            probed = dict(self._probed)
+        for key, (_, timeout, proxy) in hot:
+            probedAt, result = probed.get(key, (0.0, False))
+            # Probe again when result is about to expire
+            if now - probedAt >= (self.validity if result else self.failedValidity) - self.failedValidity:
+                self.probe(key[0], key[1], timeout, proxy)
+
+
+def prober() -> Prober:
+    return Prober.prober()
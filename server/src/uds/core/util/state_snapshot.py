@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2020 Virtual Cable S.L.U.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice,
+#      this list of conditions and the following disclaimer in the documentation
+#      and/or other materials provided with the distribution.
+#    * Neither the name of Virtual Cable S.L. nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+@author: Adolfo Gómez, dkmaster at dkmon dot com
+"""
+import threading
+import logging
+import typing
+
+# Not imported at runtime, just for type checking
+if typing.TYPE_CHECKING:
+    from uds.core.util.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+
+class StateSnapshot:
+    """
+    Short lived snapshot of the states of all the items (machines, tasks, ...) of a provider, obtained with just one
+    "list" call to the provider api, so the states of all its user services are checked with one api call per interval.
+
+    The snapshot is kept on a cache shared by all the user services of the provider (usually the cache of the provider or service),
+    and only one thread of a process requests it at a time.
+    Items not found on snapshot (i.e. just created after snapshot was taken) must be checked directly by caller.
+    """
+    _locks: typing.ClassVar[typing.Dict[str, threading.Lock]] = {}
+    _locksLock: typing.ClassVar[threading.Lock] = threading.Lock()
+
+    _cache: 'Cache'
+    _key: str
+    _validity: int
+    _fetcher: typing.Callable[[], typing.Mapping[str, typing.Any]]
+
+    def __init__(self, cache: 'Cache', key: str, validity: int, fetcher: typing.Callable[[], typing.Mapping[str, typing.Any]]):
+        self._cache = cache
+        self._key = key
+        self._validity = validity
+        self._fetcher = fetcher
+
+    def _lock(self) -> threading.Lock:
+        lockKey = self._cache._owner + self._key  # pylint: disable=protected-access
+        with StateSnapshot._locksLock:
+            return StateSnapshot._locks.setdefault(lockKey, threading.Lock())
+
+    def snapshot(self) -> typing.Optional[typing.Mapping[str, typing.Any]]:
+        """
+        Returns current snapshot, requesting it if needed. None if it could not be obtained
+        """
+        snapshot = self._cache.get(self._key)
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock():
+            # Another thread may have requested it while we were waiting
+            snapshot = self._cache.get(self._key)
+            if snapshot is None:
+                try:
+                    snapshot = dict(self._fetcher())
+                except Exception as e:
+                    logger.warning('Could not get states snapshot %s: %s', self._key, e)
+                    return None
+                self._cache.put(self._key, snapshot, self._validity)
+        return snapshot
+
+    def get(self, itemId: typing.Any) -> typing.Optional[typing.Any]:
+        """
+        Returns the state of item on snapshot, or None if it is not on snapshot
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.get(str(itemId))
+
+    def invalidate(self) -> None:
+        self._cache.remove(self._key)
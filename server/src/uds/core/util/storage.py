@@ -37,7 +37,7 @@ import base64
 import hashlib
 from collections.abc import MutableMapping
 
-from django.db import transaction, models
+from django.db import transaction, models, IntegrityError
 from uds.models.storage import Storage as DBStorage
 from uds.core.util import encoders
 
@@ -75,6 +75,33 @@ def _decodeValue(dbk: str, value: typing.Optional[str]) -> typing.Tuple[str, typ
     return ('', None)
 
 
+def _bulkStore(toStore: typing.Dict[str, DBStorage], toRemove: typing.Iterable[str] = ()) -> None:
+    """
+    Upserts (and removes) several storage items at once, using one query for locating existing ones,
+    and bulk create/update for the rest
+    """
+    try:
+        with transaction.atomic():
+            if toRemove:
+                DBStorage.objects.filter(key__in=list(toRemove)).delete()  # @UndefinedVariable
+            if not toStore:
+                return
+            existing = set(DBStorage.objects.filter(key__in=list(toStore.keys())).select_for_update().values_list('key', flat=True))  # @UndefinedVariable
+            DBStorage.objects.bulk_create([v for k, v in toStore.items() if k not in existing])  # @UndefinedVariable
+            DBStorage.objects.bulk_update([v for k, v in toStore.items() if k in existing], ['owner', 'data', 'attr1'])  # @UndefinedVariable
+    except IntegrityError:
+        # Concurrently created by someone else, fallback to one by one storing (as saveData does)
+        if toRemove:
+            DBStorage.objects.filter(key__in=list(toRemove)).delete()  # @UndefinedVariable
+        for key, item in toStore.items():
+            try:
+                with transaction.atomic():
+                    DBStorage.objects.create(owner=item.owner, key=key, data=item.data, attr1=item.attr1)  # @UndefinedVariable
+            except IntegrityError:
+                with transaction.atomic():
+                    DBStorage.objects.filter(key=key).select_for_update().update(owner=item.owner, data=item.data, attr1=item.attr1)  # @UndefinedVariable
+
+
 class StorageAsDict(MutableMapping):
     '''
     Accesses storage as dictionary. Much more convenient that old method
@@ -139,11 +166,37 @@ class StorageAsDict(MutableMapping):
         logger.debug('Delitem: %s --> %s', key, dbk)
         DBStorage.objects.filter(key=dbk).delete()
 
+    def getMany(self, keys: typing.Iterable[str]) -> typing.Dict[str, typing.Any]:
+        """
+        Gets several items with just one query. Not found items will have None as value
+        """
+        dbks = {self._key(k): k for k in keys}
+        result: typing.Dict[str, typing.Any] = {k: None for k in dbks.values()}
+        for c in self._db.filter(key__in=list(dbks.keys())):
+            result[dbks[c.key]] = _decodeValue(c.key, c.data)[1]
+        return result
+
+    def update(self, *args, **kwargs) -> None:  # pylint: disable=arguments-differ
+        """
+        Bulk version of MutableMapping update, so all items are stored using a fixed number of queries
+        """
+        values = dict(*args, **kwargs)
+        for k in values:
+            if not isinstance(k, str):
+                raise TypeError('Key must be str type, {} found'.format(type(k)))
+        _bulkStore({
+            self._key(k): DBStorage(key=self._key(k), data=_encodeValue(k, v, self._compat), attr1=self._group, owner=self._owner)
+            for k, v in values.items()
+        })
+
+    def deleteMany(self, keys: typing.Iterable[str]) -> None:
+        DBStorage.objects.filter(key__in=[self._key(k) for k in keys]).delete()
+
     def __iter__(self):
         '''
         Iterates through keys
         '''
-        return iter(_decodeValue(i.key, i.data)[0] for i in self._filtered)
+        return iter(i[0] for i in self._decoded())
 
     def __contains__(self, key: object) -> bool:
         logger.debug('Contains: %s', key)
@@ -155,11 +208,17 @@ class StorageAsDict(MutableMapping):
         return self._filtered.count()
 
     # Optimized methods, avoid re-reading from DB
+    def _decoded(self) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        return (_decodeValue(key, data) for key, data in self._filtered.values_list('key', 'data'))
+
     def items(self):
-        return iter(_decodeValue(i.key, i.data) for i in self._filtered)
+        return iter(self._decoded())
 
     def values(self):
-        return iter(_decodeValue(i.key, i.data)[1] for i in self._filtered)
+        return iter(i[1] for i in self._decoded())
+
+    def clear(self) -> None:
+        self._filtered.delete()
 
     # Custom utility methods
     @property
@@ -271,6 +330,51 @@ class Storage:
         except Exception:
             pass
 
+    def getMany(self, skeys: typing.Iterable[typing.Union[str, bytes]], fromPickle: bool = False) -> typing.Dict[typing.Union[str, bytes], typing.Optional[typing.Union[str, bytes]]]:
+        """
+        Reads several keys using just one query.
+        Returns a dictionary with requested keys as keys. Not found keys will have None as value
+        """
+        keys = {self.getKey(k): k for k in skeys}
+        result: typing.Dict[typing.Union[str, bytes], typing.Optional[typing.Union[str, bytes]]] = {k: None for k in keys.values()}
+        for c in DBStorage.objects.filter(key__in=list(keys.keys())):  # @UndefinedVariable
+            val: bytes = typing.cast(bytes, encoders.decode(c.data, 'base64'))
+            if fromPickle:
+                result[keys[c.key]] = val
+                continue
+            try:
+                result[keys[c.key]] = val.decode('utf-8')
+            except Exception:
+                result[keys[c.key]] = val
+        return result
+
+    def getManyPickle(self, skeys: typing.Iterable[typing.Union[str, bytes]]) -> typing.Dict[typing.Union[str, bytes], typing.Any]:
+        return {k: pickle.loads(typing.cast(bytes, v)) if v else None for k, v in self.getMany(skeys, True).items()}
+
+    def putMany(self, values: typing.Mapping[typing.Union[str, bytes], typing.Any], attr1: typing.Optional[str] = None) -> None:
+        """
+        Saves several keys using bulk operations. As with saveData, "empty" values are removed
+        """
+        attr1 = attr1 or ''
+        toRemove: typing.List[str] = []
+        toStore: typing.Dict[str, DBStorage] = {}
+        for skey, data in values.items():
+            key = self.getKey(skey)
+            if not data:
+                toRemove.append(key)
+                continue
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            toStore[key] = DBStorage(owner=self._owner, key=key, data=encoders.encodeAsStr(data, 'base64'), attr1=attr1)
+
+        _bulkStore(toStore, toRemove)
+
+    def putManyPickle(self, values: typing.Mapping[typing.Union[str, bytes], typing.Any], attr1: typing.Optional[str] = None) -> None:
+        self.putMany({k: pickle.dumps(v) for k, v in values.items()}, attr1)
+
+    def deleteMany(self, skeys: typing.Iterable[typing.Union[str, bytes]]) -> None:
+        self.remove(skeys)
+
     def lock(self):
         """
         Use with care. If locked, it must be unlocked before returning
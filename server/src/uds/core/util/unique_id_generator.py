@@ -30,12 +30,17 @@
 """
 @author: Adolfo Gómez, dkmaster at dkmon dot com
 """
+import atexit
+import bisect
 import logging
+import threading
 import time
+import uuid
 import typing
 
 from django.db import transaction, OperationalError, connection
 from django.db.utils import IntegrityError
+from django.db.models import Max, Q
 from django.db.models.query import QuerySet
 
 from uds.models.unique_id import UniqueId
@@ -45,11 +50,81 @@ logger = logging.getLogger(__name__)
 
 MAX_SEQ = 1000000000000000
 
+# Leases not used after this time (seconds) are returned by maintenance job
+LEASE_TTL = 3600
+LEASE_PREFIX = '\x00lease:'
+# A process never leases more than 1/LEASE_RANGE_FRACTION of a range (so small ranges are not leased at all)
+LEASE_RANGE_FRACTION = 16
+
 
 class CreateNewIdException(Exception):
     pass
 
 
+class Leases:
+    """
+    Unique ids reserved on database (owned by this process "lease" owner), per basename,
+    so they can be assigned to their real owners without locking the whole range.
+
+    An id is handed out updating its row only if it is still owned by this lease, so ids
+    revoked by maintenance (or rolled back) are simply discarded and collisions are not possible.
+    """
+    owner: str
+    _lock: threading.Lock
+    _pools: typing.Dict[str, typing.List[int]]  # basename -> sorted leased seqs
+
+    def __init__(self):
+        self.owner = LEASE_PREFIX + uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def take(self, baseName: str, rangeStart: int, rangeEnd: int) -> typing.Optional[int]:
+        """
+        Takes the lowest leased seq in range, None if no one is available
+        """
+        with self._lock:
+            pool = self._pools.get(baseName)
+            if not pool:
+                return None
+            pos = bisect.bisect_left(pool, rangeStart)
+            if pos < len(pool) and pool[pos] <= rangeEnd:
+                return pool.pop(pos)
+        return None
+
+    def add(self, baseName: str, seqs: typing.Iterable[int]) -> None:
+        with self._lock:
+            pool = self._pools.setdefault(baseName, [])
+            for seq in seqs:
+                bisect.insort(pool, seq)
+
+    def size(self, baseName: str, rangeStart: int = 0, rangeEnd: int = MAX_SEQ) -> int:
+        with self._lock:
+            pool = self._pools.get(baseName, [])
+            return bisect.bisect_right(pool, rangeEnd) - bisect.bisect_left(pool, rangeStart)
+
+    def release(self) -> None:
+        """
+        Returns all leased ids to database
+        """
+        with self._lock:
+            self._pools = {}
+        try:
+            UniqueId.objects.filter(owner=self.owner).update(owner='', assigned=False, stamp=getSqlDatetimeAsUnix())  # @UndefinedVariable
+        except Exception:  # On exit, database may be unavailable
+            logger.debug('Could not release unique ids leases')
+
+    @staticmethod
+    def revokeOlderThan(stamp: int) -> int:
+        """
+        Returns to database all leased ids (of any process) not used since stamp (i.e. of processes that died)
+        """
+        return UniqueId.objects.filter(owner__startswith=LEASE_PREFIX, stamp__lt=stamp).update(owner='', assigned=False, stamp=stamp)  # @UndefinedVariable
+
+
+leases = Leases()
+atexit.register(leases.release)
+
+
 class UniqueIDGenerator:
     _owner: str
     _baseName: str
@@ -67,49 +142,37 @@ class UniqueIDGenerator:
         obj = UniqueId.objects.select_for_update() if forUpdate else UniqueId.objects
         return obj.filter(basename=self._baseName, seq__gte=rangeStart, seq__lte=rangeEnd)  # @UndefinedVariable
 
-    def get(self, rangeStart: int = 0, rangeEnd: int = MAX_SEQ) -> int:
+    def _reserve(self, count: int, rangeStart: int, rangeEnd: int, owner: str) -> typing.List[int]:
         """
-        Tries to generate a new unique id in the range provided. This unique id
-        is global to "unique ids' database
+        Reserves (assigns to owner) up to count ids in the range provided, in just one transaction.
+        First reuses freed ids, then creates new ones after the last one of the range.
+        Returns the list of reserved ids, that will contain less than count elements if range is exhausted
         """
-        # First look for a name in the range defined
         stamp = getSqlDatetimeAsUnix()
-        seq = rangeStart
-        # logger.debug(UniqueId)
         counter = 0
         while True:
             counter += 1
             try:
-                # logger.debug('Creating new seq in range {}-{}'.format(rangeStart, rangeEnd))
                 with transaction.atomic():
                     flt = self.__filter(rangeStart, rangeEnd, forUpdate=True)
-                    try:
-                        item = flt.filter(assigned=False).order_by('seq')[0]
-                        item.owner = self._owner
-                        item.assigned = True
-                        item.stamp = stamp
-                        item.save()
-                        # UniqueId.objects.filter(id=item.id).update(owner=self._owner, assigned=True, stamp=stamp)  # @UndefinedVariable
-                        seq = item.seq
-                        break
-                    except IndexError:  # No free element found
-                        item = None
-
-                    # No item was found on first instance (already created, but freed)
-                    if not item:
-                        # logger.debug('No free found, creating new one')
+                    seqs = list(flt.filter(assigned=False).order_by('seq').values_list('seq', flat=True)[:count])
+                    if seqs:
+                        self.__filter(rangeStart, rangeEnd).filter(seq__in=seqs).update(owner=owner, assigned=True, stamp=stamp)
+
+                    # Not enough freed ids, create new ones
+                    if len(seqs) < count:
                         try:
-                            last = flt.filter(assigned=True)[0]  # DB Returns correct order so the 0 item is the last
-                            seq = last.seq + 1
+                            seq = flt.values_list('seq', flat=True)[0] + 1  # DB Returns correct order so the 0 item is the last
                         except IndexError:  # If there is no assigned at database
                             seq = rangeStart
-                        # logger.debug('Found seq {0}'.format(seq))
-                        if seq > rangeEnd:
-                            return -1  # No ids free in range
+                        newSeqs = list(range(seq, min(seq + count - len(seqs), rangeEnd + 1)))
                         # May ocurr on some circustance that a concurrency access gives same item twice, in this case, we
                         # will get an "duplicate key error",
-                        UniqueId.objects.create(owner=self._owner, basename=self._baseName, seq=seq, assigned=True, stamp=stamp)  # @UndefinedVariable
-                        break
+                        UniqueId.objects.bulk_create([  # @UndefinedVariable
+                            UniqueId(owner=owner, basename=self._baseName, seq=s, assigned=True, stamp=stamp) for s in newSeqs
+                        ])
+                        seqs += newSeqs
+                    return seqs
             except OperationalError:  # Locked, may ocurr for example on sqlite. We will wait a bit
                 # logger.exception('Got database locked')
                 if counter % 5 == 0:
@@ -119,10 +182,90 @@ class UniqueIDGenerator:
                 pass
             except Exception:
                 logger.exception('Error')
-                return -1
+                return []
 
-        # logger.debug('Seq: {}'.format(seq))
-        return seq
+    @staticmethod
+    def _leaseSize(leaseSize: int, rangeStart: int, rangeEnd: int) -> int:
+        """
+        Number of ids of the range that can be leased at once, 0 if range is too small to be leased
+        """
+        leaseSize = min(leaseSize, (rangeEnd - rangeStart + 1) // LEASE_RANGE_FRACTION)
+        return leaseSize if leaseSize > 1 else 0
+
+    def _steal(self, rangeStart: int, rangeEnd: int) -> int:
+        """
+        Assigns to our owner an id of the range leased by any process. Used when range is otherwise exhausted, so ids leased
+        (and not used) by other processes are not lost. The process that leased it will discard it when trying to use it.
+        Returns -1 if there is no leased id on range
+        """
+        try:
+            with transaction.atomic():
+                seq = self.__filter(rangeStart, rangeEnd, forUpdate=True).filter(owner__startswith=LEASE_PREFIX).values_list('seq', flat=True).last()
+                if seq is None:
+                    return -1
+                self.__filter(rangeStart, rangeEnd).filter(seq=seq).update(owner=self._owner, assigned=True, stamp=getSqlDatetimeAsUnix())
+                return seq
+        except Exception:
+            logger.exception('Error')
+            return -1
+
+    def _getLeased(self, rangeStart: int, rangeEnd: int, leaseSize: int) -> typing.Optional[int]:
+        """
+        Gets an id from the ids leased by this process (leasing a new block if needed).
+        Returns None if could not be obtained this way
+        """
+        stamp = getSqlDatetimeAsUnix()
+        for _ in range(3):  # Leased ids may be revoked, so retry a few times
+            seq = leases.take(self._baseName, rangeStart, rangeEnd)
+            if seq is None:
+                leased = self._reserve(leaseSize, rangeStart, rangeEnd, leases.owner)
+                if not leased:
+                    return None
+                seq, leased = leased[0], leased[1:]
+                leases.add(self._baseName, leased)
+            # Only if it is still ours
+            if UniqueId.objects.filter(basename=self._baseName, seq=seq, owner=leases.owner).update(owner=self._owner, assigned=True, stamp=stamp):  # @UndefinedVariable
+                return seq
+        return None
+
+    def get(self, rangeStart: int = 0, rangeEnd: int = MAX_SEQ) -> int:
+        """
+        Tries to generate a new unique id in the range provided. This unique id
+        is global to "unique ids' database
+        """
+        from uds.core.util.config import GlobalConfig  # pylint: disable=import-outside-toplevel
+
+        leaseSize = UniqueIDGenerator._leaseSize(GlobalConfig.UNIQUEID_LEASE_SIZE.getInt(), rangeStart, rangeEnd)
+        if leaseSize > 0:
+            seq = self._getLeased(rangeStart, rangeEnd, leaseSize)
+            if seq is not None:
+                return seq
+
+        seqs = self._reserve(1, rangeStart, rangeEnd, self._owner)
+        # logger.debug('Seq: {}'.format(seqs))
+        return seqs[0] if seqs else self._steal(rangeStart, rangeEnd)
+
+    def prefetch(self, count: int, rangeStart: int = 0, rangeEnd: int = MAX_SEQ) -> int:
+        """
+        Ensures that this process has at least "count" ids of the range leased (in just one transaction), so
+        next "count" gets (of any owner with same basename) does not need to lock the range.
+        Used before creating a batch of user services. Does nothing if leases are disabled.
+
+        Returns:
+            Number of new ids leased
+        """
+        from uds.core.util.config import GlobalConfig  # pylint: disable=import-outside-toplevel
+
+        leaseSize = UniqueIDGenerator._leaseSize(GlobalConfig.UNIQUEID_LEASE_SIZE.getInt(), rangeStart, rangeEnd)
+        if leaseSize <= 0:
+            return 0
+        # Never lease more than allowed for the range, no matter how many ids are requested
+        needed = min(count, (rangeEnd - rangeStart + 1) // LEASE_RANGE_FRACTION) - leases.size(self._baseName, rangeStart, rangeEnd)
+        if needed <= 0:
+            return 0
+        leased = self._reserve(needed, rangeStart, rangeEnd, leases.owner)
+        leases.add(self._baseName, leased)
+        return len(leased)
 
     def transfer(self, seq: int, toUidGen: 'UniqueIDGenerator') -> bool:
         self.__filter(
@@ -135,17 +278,11 @@ class UniqueIDGenerator:
         return True
 
     def free(self, seq) -> None:
+        """
+        Frees the id, returning it to the shared pool (usable by any process). Unused ids at end of ranges are cleaned by maintenance job
+        """
         logger.debug('Freeing seq %s from %s (%s)', seq, self._owner, self._baseName)
-        with transaction.atomic():
-            flt = self.__filter(
-                0, forUpdate=True
-            ).filter(
-                owner=self._owner, seq=seq
-            ).update(
-                owner='', assigned=False, stamp=getSqlDatetimeAsUnix()
-            )
-        if flt > 0:
-            self.__purge()
+        self.__filter(0).filter(owner=self._owner, seq=seq).update(owner='', assigned=False, stamp=getSqlDatetimeAsUnix())
 
     def __purge(self) -> None:
         logger.debug('Purging UniqueID database')
@@ -167,3 +304,21 @@ class UniqueIDGenerator:
         stamp = getSqlDatetimeAsUnix() if stamp is None else stamp
         UniqueId.objects.select_for_update().filter(owner=self._owner, stamp__lt=stamp).update(assigned=False, owner='', stamp=stamp)  # @UndefinedVariable
         self.__purge()
+
+    @staticmethod
+    def compact() -> typing.Tuple[int, int]:
+        """
+        Maintenance of unique ids database. Revokes leases not used in LEASE_TTL seconds and removes
+        the unassigned ids after the last assigned one of every basename.
+
+        Returns:
+            Tuple (revoked leased ids, removed ids)
+        """
+        revoked = Leases.revokeOlderThan(getSqlDatetimeAsUnix() - LEASE_TTL)
+        removed = 0
+        for v in UniqueId.objects.values('basename').annotate(last=Max('seq', filter=Q(assigned=True))).order_by():  # @UndefinedVariable
+            with transaction.atomic():
+                removed += UniqueId.objects.filter(  # @UndefinedVariable
+                    basename=v['basename'], assigned=False, seq__gt=v['last'] if v['last'] is not None else -1
+                ).delete()[0]
+        return revoked, removed
@@ -56,6 +56,10 @@ class UniqueMacGenerator(UniqueIDGenerator):
         firstMac, lastMac = macRange.split('-')
         return self.__toMac(super().get(self.__toInt(firstMac), self.__toInt(lastMac)))
 
+    def prefetch(self, macRange: str, count: int) -> int:  # type: ignore # pylint: disable=arguments-differ
+        firstMac, lastMac = macRange.split('-')
+        return super().prefetch(count, self.__toInt(firstMac), self.__toInt(lastMac))
+
     def transfer(self, mac: str, toUMgen: 'UniqueMacGenerator'):  # type: ignore # pylint: disable=arguments-differ
         super().transfer(self.__toInt(mac), toUMgen)
 
@@ -53,6 +53,10 @@ class UniqueNameGenerator(UniqueIDGenerator):
         maxVal = 10 ** length - 1
         return self.__toName(super().get(minVal, maxVal), length)
 
+    def prefetch(self, baseName: str, count: int, length: int = 5) -> int:  # type: ignore  # pylint: disable=arguments-differ
+        self.setBaseName(baseName)
+        return super().prefetch(count, 0, 10 ** length - 1)
+
     def transfer(self, baseName: str, name: str, toUNGen: 'UniqueNameGenerator'):  # type: ignore # pylint: disable=arguments-differ
         self.setBaseName(baseName)
         super().transfer(int(name[len(self._baseName):]), toUNGen)
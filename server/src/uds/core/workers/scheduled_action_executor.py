@@ -33,6 +33,7 @@
 import logging
 
 from uds.core.util import states
+from uds.core.util.calendar import CalendarChecker
 
 from uds.models import CalendarAction, getSqlDatetime
 from uds.core.jobs import Job
@@ -45,6 +46,9 @@ class ScheduledAction(Job):
     friendly_name = 'Scheduled action runner'
 
     def run(self):
+        # Keep compiled calendars "rolling", so checks & next events are resolved from them
+        CalendarChecker.precompileAll()
+
         configuredAction: CalendarAction
         for configuredAction in CalendarAction.objects.filter(
                 service_pool__service__provider__maintenance_mode=False,  # Avoid maintenance
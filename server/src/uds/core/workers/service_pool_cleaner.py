@@ -36,7 +36,7 @@ import typing
 
 from django.db import transaction
 from uds.core.util.config import GlobalConfig
-from uds.models import ServicePool, UserService, getSqlDatetime
+from uds.models import ServicePool, ServicePoolOccupancy, UserService, getSqlDatetime
 from uds.core.util.state import State
 from uds.core.jobs import Job
 
@@ -106,6 +106,8 @@ class DeployedServiceRemover(Job):
 
         with transaction.atomic():
             servicePool.userServices.select_for_update().filter(state=State.USABLE).update(state=State.REMOVABLE, state_date=now)
+        # Bulk updates bypasses occupancy counters
+        ServicePoolOccupancy.reconcile([servicePool.id])
 
         # When no service is at database, we start with publications
         if servicePool.userServices.all().count() == 0:
@@ -30,18 +30,21 @@
 """
 @author: Adolfo Gómez, dkmaster at dkmon dot com
 """
+import time
 import logging
 import typing
+from datetime import timedelta
 
-from django.db import transaction
-from django.db.models import Q
+from django.db import transaction, connection
+from django.db.models import Q, Count, Sum
 from uds.core.util.config import GlobalConfig
 from uds.core.util.state import State
 from uds.core.managers import userServiceManager
 from uds.core.services.exceptions import MaxServicesReachedError
-from uds.models import ServicePool, ServicePoolPublication, UserService
+from uds.models import ServicePool, ServicePoolPublication, ServicePoolOccupancy, UserService, getSqlDatetime
 from uds.core import services
 from uds.core.util import log
+from uds.core.util.thread_pool import ThreadPool
 from uds.core.jobs import Job
 
 logger = logging.getLogger(__name__)
@@ -58,6 +61,14 @@ class ServiceCacheUpdater(Job):
     frecuency_cfg = GlobalConfig.CACHE_CHECK_DELAY  # Request run cache manager every configured seconds (defaults to 20 seconds).
     friendly_name = 'Service Cache Updater'
 
+    # Timings (in seconds) and number of service pools examined on last run on this server
+    lastRunTimes: typing.ClassVar[typing.Dict[str, float]] = {}
+    # Max threads used for growing caches of several service pools at once (on burst mode)
+    growThreads: typing.ClassVar[int] = 8
+
+    # Free "preparing" slots per provider, calculated on servicesPoolsNeedingCacheUpdate (None means no limit)
+    _providerSlots: typing.Dict[int, typing.Optional[int]]
+
     @staticmethod
     def calcProportion(max_, actual) -> int:
         return actual * 10000 // (max_ or 1)
@@ -67,44 +78,98 @@ class ServiceCacheUpdater(Job):
         log.doLog(servicePool, log.WARN, 'Service Pool is restrained due to excesive errors', log.INTERNAL)
         logger.info('%s is restrained, will check this later', servicePool.name)
 
+    def servicePoolsCounters(self, servicePoolsIds: typing.List[int]) -> typing.Dict[int, typing.Dict[str, int]]:
+        """
+        Returns, for every service pool, the number of L1 cached, L2 cached, assigned, preparing and recently errored
+        (for restraint) user services, computed with grouped aggregate queries (no matter how many service pools)
+        """
+        validStates = [State.PREPARING, State.USABLE]
+        aggregates: typing.Dict[str, Sum] = {
+            'l1': Sum('count', filter=Q(state__in=validStates, cache_level=services.UserDeployment.L1_CACHE)),
+            'l2': Sum('count', filter=Q(state__in=validStates, cache_level=services.UserDeployment.L2_CACHE)),
+            'assigned': Sum('count', filter=Q(state__in=validStates, cache_level=0)),
+            'preparing': Sum('count', filter=Q(state=State.PREPARING)),
+        }
+
+        counters: typing.Dict[int, typing.Dict[str, int]] = {
+            i: {'l1': 0, 'l2': 0, 'assigned': 0, 'preparing': 0, 'errors': 0} for i in servicePoolsIds
+        }
+        # Maintained occupancy counters avoids counting user services table
+        for v in ServicePoolOccupancy.objects.filter(deployed_service__in=servicePoolsIds).values('deployed_service').annotate(**aggregates).order_by():
+            counters[v['deployed_service']].update({k: v[k] or 0 for k in aggregates})
+
+        # Restraint needs to know when user services failed, so it's counted from user services
+        restraintTime = GlobalConfig.RESTRAINT_TIME.getInt()
+        if restraintTime > 0:
+            date = getSqlDatetime() - timedelta(seconds=restraintTime)
+            for v in UserService.objects.filter(
+                    deployed_service__in=servicePoolsIds, state=State.ERROR, state_date__gt=date
+                ).values('deployed_service').annotate(how_many=Count('id')).order_by():
+                counters[v['deployed_service']]['errors'] = v['how_many']
+        else:
+            for v in counters.values():
+                del v['errors']
+
+        # L1 elements marked for destruction after preparation are not taken into account
+        for v in UserService.objects.filter(
+                userServiceManager().getCacheStateFilter(services.UserDeployment.L1_CACHE),
+                deployed_service__in=servicePoolsIds,
+                properties__name='destroy_after',
+                properties__value='y'
+            ).values('deployed_service').annotate(how_many=Count('id', distinct=True)).order_by():
+            counters[v['deployed_service']]['l1'] -= v['how_many']
+
+        return counters
+
     def servicesPoolsNeedingCacheUpdate(self) -> typing.List[typing.Tuple[ServicePool, int, int, int]]:
         # State filter for cached and inAssigned objects
         # First we get all deployed services that could need cache generation
         # We start filtering out the deployed services that do not need caching at all.
-        servicePoolsNeedingCaching: typing.Iterable[ServicePool] = ServicePool.objects.filter(
+        startTime = time.time()
+        servicePoolsNeedingCaching: typing.List[ServicePool] = list(ServicePool.objects.filter(
             Q(initial_srvs__gte=0) | Q(cache_l1_srvs__gte=0)
         ).filter(
             max_srvs__gt=0, state=State.ACTIVE, service__provider__maintenance_mode=False
-        ).iterator()
+        ).select_related('service', 'service__provider'))
+        servicePoolsIds = [sp.id for sp in servicePoolsNeedingCaching]
+
+        # All the data needed for deciding is read with a fixed number of queries
+        counters = self.servicePoolsCounters(servicePoolsIds)
+        withActivePublication: typing.Set[int] = set()
+        withRunningPublication: typing.Set[int] = set()
+        for poolId, pubState in ServicePoolPublication.objects.filter(
+                deployed_service__in=servicePoolsIds, state__in=[State.USABLE, State.PREPARING]
+            ).values_list('deployed_service', 'state'):
+            (withActivePublication if pubState == State.USABLE else withRunningPublication).add(poolId)
+        preparingByProvider: typing.Dict[int, int] = dict(
+            ServicePoolOccupancy.objects.filter(state=State.PREPARING).values_list('deployed_service__service__provider').annotate(Sum('count')).order_by()
+        )
+        restraintCount = GlobalConfig.RESTRAINT_COUNT.getInt()
+        self._providerSlots = {}
+        queryTime = time.time()
 
         # We will get the one that proportionally needs more cache
         servicesPools: typing.List[typing.Tuple[ServicePool, int, int, int]] = []
         for servicePool in servicePoolsNeedingCaching:
-            servicePool.userServices.update()  # Cleans cached queries
             # If this deployedService don't have a publication active and needs it, ignore it
-            spServiceInstance = servicePool.service.getInstance()
-
-            if servicePool.activePublication() is None and spServiceInstance.publicationType is not None:
+            if servicePool.id not in withActivePublication and servicePool.service.getType().publicationType is not None:
                 logger.debug('Skipping. %s Needs publication but do not have one', servicePool.name)
                 continue
             # If it has any running publication, do not generate cache anymore
-            if servicePool.publications.filter(state=State.PREPARING).count() > 0:
+            if servicePool.id in withRunningPublication:
                 logger.debug('Skipping cache generation for service pool with publication running: %s', servicePool.name)
                 continue
 
-            if servicePool.isRestrained():
+            poolCounters = counters[servicePool.id]
+            if 'errors' in poolCounters and poolCounters['errors'] >= restraintCount:  # Same as servicePool.isRestrained()
                 logger.debug('StopSkippingped cache generation for restrained service pool: %s', servicePool.name)
                 ServiceCacheUpdater.__notifyRestrain(servicePool)
                 continue
 
             # Get data related to actual state of cache
-            inCacheL1: int = servicePool.cachedUserServices().filter(
-                userServiceManager().getCacheStateFilter(services.UserDeployment.L1_CACHE)
-            ).exclude(
-                Q(properties__name='destroy_after') & Q(properties__value='y')
-            ).count()
-            inCacheL2: int = servicePool.cachedUserServices().filter(userServiceManager().getCacheStateFilter(services.UserDeployment.L2_CACHE)).count()
-            inAssigned: int = servicePool.assignedUserServices().filter(userServiceManager().getStateFilter()).count()
+            inCacheL1: int = poolCounters['l1']
+            inCacheL2: int = poolCounters['l2']
+            inAssigned: int = poolCounters['assigned']
             # if we bypasses max cache, we will reduce it in first place. This is so because this will free resources on service provider
             logger.debug("Examining %s with %s in cache L1 and %s in cache L2, %s inAssigned", servicePool.name, inCacheL1, inCacheL2, inAssigned)
             totalL1Assigned = inCacheL1 + inAssigned
@@ -128,7 +193,12 @@ class ServiceCacheUpdater(Job):
                 continue
 
             # If this service don't allows more starting user services, continue
-            if userServiceManager().canInitiateServiceFromDeployedService(servicePool) is False:
+            # (same as userServiceManager().canInitiateServiceFromDeployedService, but using already readed counters)
+            providerId = servicePool.service.provider_id
+            if providerId not in self._providerSlots:
+                provider = servicePool.service.provider.getInstance()
+                self._providerSlots[providerId] = None if provider.getIgnoreLimits() else max(0, provider.getMaxPreparingServices() - preparingByProvider.get(providerId, 0))
+            if self._providerSlots[providerId] == 0:
                 logger.debug('This provider has the max allowed starting services running: %s', servicePool)
                 continue
 
@@ -148,10 +218,17 @@ class ServiceCacheUpdater(Job):
                 logger.debug('Needs to grow L1 cache for %s', servicePool)
                 servicesPools.append((servicePool, inCacheL1, inCacheL2, inAssigned))
 
+        ServiceCacheUpdater.lastRunTimes.update({
+            'pools': len(servicePoolsNeedingCaching),
+            'needing_update': len(servicesPools),
+            'query': queryTime - startTime,
+            'plan': time.time() - queryTime,
+        })
+
         # We also return calculated values so we can reuse then
         return servicesPools
 
-    def growL1Cache(self, servicePool: ServicePool, cacheL1: int, cacheL2: int, assigned: int) -> None:
+    def growL1Cache(self, servicePool: ServicePool, cacheL1: int, cacheL2: int, assigned: int) -> bool:
         """
         This method tries to enlarge L1 cache.
 
@@ -175,7 +252,7 @@ class ServiceCacheUpdater(Job):
 
             if valid is not None:
                 valid.moveToLevel(services.UserDeployment.L1_CACHE)
-                return
+                return True
         try:
             # This has a velid publication, or it will not be here
             userServiceManager().createCacheFor(
@@ -184,10 +261,13 @@ class ServiceCacheUpdater(Job):
         except MaxServicesReachedError:
             log.doLog(servicePool, log.ERROR, 'Max number of services reached for this service', log.INTERNAL)
             logger.warning('Max user services reached for %s: %s. Cache not created', servicePool.name, servicePool.max_srvs)
+            return False
         except Exception:
             logger.exception('Exception')
+            return False
+        return True
 
-    def growL2Cache(self, servicePool: ServicePool, cacheL1: int, cacheL2: int, assigned: int) -> None:
+    def growL2Cache(self, servicePool: ServicePool, cacheL1: int, cacheL2: int, assigned: int) -> bool:
         """
         Tries to grow L2 cache of service.
 
@@ -204,6 +284,38 @@ class ServiceCacheUpdater(Job):
         except MaxServicesReachedError:
             logger.warning('Max user services reached for %s: %s. Cache not created', servicePool.name, servicePool.max_srvs)
             # TODO: When alerts are ready, notify this
+            return False
+        return True
+
+    def _burstSize(self, servicePool: ServicePool, needed: int, burst: int) -> int:
+        """
+        Returns how many services can be created for this pool on this run, and reserves them from its provider free slots
+        """
+        providerId = servicePool.service.provider_id
+        count = max(1, min(needed, burst))
+        slots = self._providerSlots.get(providerId)
+        if slots is not None:
+            count = min(count, slots)
+            self._providerSlots[providerId] = slots - count
+        return count
+
+    def _grow(self, grow: typing.Callable[[ServicePool, int, int, int], bool], servicePool: ServicePool, count: int, cacheL1: int, cacheL2: int, assigned: int) -> None:
+        """
+        Creates up to "count" services for the pool, stopping on first failure. Executed on growing threads pool
+        """
+        try:
+            if count > 1:  # Reserve unique ids (names, macs, ...) of the whole batch at once
+                try:
+                    servicePool.service.getInstance().prefetchIds(count)
+                except Exception as e:  # Not a problem, ids will be requested one by one
+                    logger.warning('Could not prefetch unique ids for %s: %s', servicePool.name, e)
+            for _ in range(count):
+                if not grow(servicePool, cacheL1, cacheL2, assigned):
+                    break
+        except Exception:
+            logger.exception('Growing cache for %s', servicePool.name)
+        finally:
+            connection.close()  # Release this thread db connection
 
     def reduceL1Cache(self, servicePool: ServicePool, cacheL1: int, cacheL2: int, assigned: int):
         logger.debug("Reducing L1 cache erasing a service in cache for %s", servicePool)
@@ -252,8 +364,18 @@ class ServiceCacheUpdater(Job):
 
     def run(self):
         logger.debug('Starting cache checking')
+        startTime = time.time()
         # We need to get
         servicesThatNeedsUpdate = self.servicesPoolsNeedingCacheUpdate()
+        try:
+            self.updateCaches(servicesThatNeedsUpdate)
+        finally:
+            ServiceCacheUpdater.lastRunTimes['total'] = time.time() - startTime
+            logger.debug('Cache checking times: %s', ServiceCacheUpdater.lastRunTimes)
+
+    def updateCaches(self, servicesThatNeedsUpdate: typing.List[typing.Tuple[ServicePool, int, int, int]]) -> None:
+        burst = GlobalConfig.CACHE_GROW_BURST.getInt()
+        growPool: typing.Optional[ThreadPool] = None
         for servicePool, cacheL1, cacheL2, assigned in servicesThatNeedsUpdate:
             # We have cache to update??
             logger.debug("Updating cache for %s", servicePool)
@@ -272,8 +394,20 @@ class ServiceCacheUpdater(Job):
             elif cacheL2 > servicePool.cache_l2_srvs:  # We have excesives L2 items
                 self.reduceL2Cache(servicePool, cacheL1, cacheL2, assigned)
             elif totalL1Assigned < servicePool.max_srvs and (totalL1Assigned < servicePool.initial_srvs or cacheL1 < servicePool.cache_l1_srvs):  # We need more services
-                self.growL1Cache(servicePool, cacheL1, cacheL2, assigned)
+                if burst <= 1:
+                    self.growL1Cache(servicePool, cacheL1, cacheL2, assigned)
+                    continue
+                needed = min(servicePool.max_srvs - totalL1Assigned, max(servicePool.initial_srvs - totalL1Assigned, servicePool.cache_l1_srvs - cacheL1))
+                growPool = growPool or ThreadPool(self.growThreads)
+                growPool.add_task(self._grow, self.growL1Cache, servicePool, self._burstSize(servicePool, needed, burst), cacheL1, cacheL2, assigned)
             elif cacheL2 < servicePool.cache_l2_srvs:  # We need more L2 items
-                self.growL2Cache(servicePool, cacheL1, cacheL2, assigned)
+                if burst <= 1:
+                    self.growL2Cache(servicePool, cacheL1, cacheL2, assigned)
+                    continue
+                growPool = growPool or ThreadPool(self.growThreads)
+                growPool.add_task(self._grow, self.growL2Cache, servicePool, self._burstSize(servicePool, servicePool.cache_l2_srvs - cacheL2, burst), cacheL1, cacheL2, assigned)
             else:
                 logger.warning("We have more services than max requested for %s", servicePool.name)
+
+        if growPool:
+            growPool.wait_completion()
@@ -32,7 +32,7 @@
 import logging
 import typing
 
-from uds.models import ServicePool, Authenticator
+from uds.models import ServicePool, Authenticator, StatsCountersAccum
 from uds.core.util.state import State
 from uds.core.util.stats import counters
 from uds.core.managers import statsManager
@@ -72,6 +72,13 @@ class DeployedServiceStatsCollector(Job):
             counters.addCounter(auth, counters.CT_AUTH_SERVICES, number_assigned_services)
             counters.addCounter(auth, counters.CT_AUTH_USERS_WITH_SERVICES, users_with_service)
 
+        # Buffered counters must be on database before accumulating them
+        statsManager().flush()
+        try:
+            StatsCountersAccum.accumulateAll()
+        except Exception:
+            logger.exception('Accumulating counters')
+
         logger.debug('Done Deployed service stats collector')
 
 
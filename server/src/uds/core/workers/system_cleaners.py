@@ -35,6 +35,7 @@ import logging
 
 from django.conf import settings
 from uds.core.util.cache import Cache
+from uds.core.util.unique_id_generator import UniqueIDGenerator
 from uds.core.jobs import Job
 from uds.models import TicketStore
 
@@ -82,3 +83,14 @@ class SessionsCleaner(Job):
             pass  # No problem if no cleanup
 
         logger.debug('Done session cleanup')
+
+
+class UniqueIdCleaner(Job):
+
+    frecuency = 600  # every 10 minutes
+    friendly_name = 'Unique ids leases cleaner'
+
+    def run(self):
+        logger.debug('Starting unique ids cleanup')
+        revoked, removed = UniqueIDGenerator.compact()
+        logger.debug('Done unique ids cleanup, %s leased ids revoked, %s unused ids removed', revoked, removed)
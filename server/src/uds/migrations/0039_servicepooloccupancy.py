@@ -0,0 +1,42 @@
+# Generated by Django 3.0.3 on 2020-06-02 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populateOccupancy(apps, schema_editor) -> None:
+    UserService = apps.get_model('uds', 'UserService')
+    ServicePoolOccupancy = apps.get_model('uds', 'ServicePoolOccupancy')
+    ServicePoolOccupancy.objects.bulk_create([
+        ServicePoolOccupancy(deployed_service_id=v[0], state=v[1], cache_level=v[2], in_use=v[3], count=v[4])
+        for v in UserService.objects.values_list('deployed_service', 'state', 'cache_level', 'in_use').annotate(models.Count('id')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uds', '0038_auto_20200505_config'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServicePoolOccupancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(max_length=1)),
+                ('cache_level', models.PositiveSmallIntegerField(default=0)),
+                ('in_use', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+                ('deployed_service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='uds.ServicePool')),
+            ],
+            options={
+                'db_table': 'uds__pool_occupancy',
+                'unique_together': {('deployed_service', 'state', 'cache_level', 'in_use')},
+            },
+        ),
+        migrations.RunPython(
+            populateOccupancy,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.3 on 2020-06-04 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uds', '0039_servicepooloccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsCountersAccum',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_id', models.IntegerField(default=0)),
+                ('owner_type', models.SmallIntegerField(default=0)),
+                ('counter_type', models.SmallIntegerField(default=0)),
+                ('interval_type', models.IntegerField(default=3600)),
+                ('stamp', models.IntegerField(default=0)),
+                ('v_count', models.IntegerField(default=0)),
+                ('v_sum', models.BigIntegerField(default=0)),
+                ('v_max', models.IntegerField(default=0)),
+                ('v_min', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'uds_stats_c_accum',
+                'index_together': {('interval_type', 'counter_type', 'owner_type', 'stamp')},
+            },
+        ),
+    ]
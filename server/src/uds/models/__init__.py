@@ -39,6 +39,7 @@ from .permissions import Permissions
 from .util import (
     getSqlDatetime,
     getSqlDatetimeAsUnix,
+    selectForUpdateSkipLocked,
     NEVER,
     NEVER_UNIX
 )
@@ -67,12 +68,14 @@ from .service_pool_group import ServicePoolGroup
 from .service_pool_publication import ServicePoolPublication
 from .user_service import UserService
 from .user_service_property import UserServiceProperty
+from .service_pool_occupancy import ServicePoolOccupancy
 
 # Especific log information for an user service
 from .log import Log
 
 # Stats
 from .stats_counters import StatsCounters
+from .stats_counters_accum import StatsCountersAccum
 from .stats_events import StatsEvents
 
 # General utility models, such as a database cache (for caching remote content of slow connections to external services providers for example)
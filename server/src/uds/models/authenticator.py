@@ -41,7 +41,7 @@ from uds.core import environment
 from uds.core.util import log
 from uds.core.util.state import State
 
-from .managed_object_model import ManagedObjectModel
+from .managed_object_model import ManagedObjectModel, instancesCache
 from .tag import TaggingMixin
 from .util import NEVER
 
@@ -89,10 +89,20 @@ class Authenticator(ManagedObjectModel, TaggingMixin):
         if self.id is None:
             return auths.Authenticator(self, environment.Environment.getTempEnv(), values)
 
+        useCache = values is None
+        if useCache:
+            dataKey = self.instanceDataKey()
+            cached = typing.cast(typing.Optional[auths.Authenticator], instancesCache.get(self.instanceKey(), dataKey))
+            if cached is not None:
+                cached._dbAuth = self  # pylint: disable=protected-access
+                return cached
+
         auType = self.getType()
         env = self.getEnvironment()
         auth = auType(self, env, values)
         self.deserialize(auth, values)
+        if useCache:
+            instancesCache.put(self.instanceKey(), dataKey, auth)
         return auth
 
     def getType(self) -> typing.Type[auths.Authenticator]:
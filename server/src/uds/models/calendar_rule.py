@@ -36,6 +36,7 @@ import logging
 import typing
 
 from django.db import models
+from django.db.models import signals
 from django.utils.translation import ugettext_lazy as _
 from dateutil import rrule as rules
 
@@ -161,3 +162,12 @@ class CalendarRule(UUIDModel):
 
     def __str__(self):
         return 'Rule {0}: {1}-{2}, {3}, Interval: {4}, duration: {5}'.format(self.name, self.start, self.end, self.frequency, self.interval, self.duration)
+
+
+# Compiled calendars are discarded when its rules changes
+def _invalidateCompiled(sender, **kwargs):
+    from uds.core.util.calendar import CalendarChecker  # pylint: disable=import-outside-toplevel
+    CalendarChecker.invalidate(kwargs['instance'].calendar_id)
+
+signals.post_save.connect(_invalidateCompiled, sender=CalendarRule)
+signals.post_delete.connect(_invalidateCompiled, sender=CalendarRule)
@@ -30,10 +30,15 @@
 """
 .. moduleauthor:: Adolfo Gómez, dkmaster at dkmon dot com
 """
+import copy
+import hashlib
 import logging
+import threading
 import typing
+from collections import OrderedDict
 
 from django.db import models
+from django.db.models import signals
 
 from uds.core.environment import Environment
 from uds.core import Module
@@ -44,6 +49,65 @@ from .uuid_model import UUIDModel
 logger = logging.getLogger(__name__)
 
 
+class InstancesCache:
+    """
+    Process wide cache of deserialized module instances (providers, services, transports, ...), so
+    getInstance does not need to unserialize data (and build environment) on every request.
+
+    Instances are stored along with a key of the data they were created from, so changes made on
+    other processes are also detected. Callers always get their own clone of the cached instance (with
+    its own form fields, its own parent provider and no api client), so nothing is shared between threads.
+    """
+    size: int = 512
+
+    _lock: threading.Lock
+    _items: 'OrderedDict[typing.Tuple[str, int], typing.Tuple[bytes, Module]]'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key: typing.Tuple[str, int], dataKey: bytes) -> typing.Optional[Module]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != dataKey:
+                return None
+            self._items.move_to_end(key)
+        return InstancesCache.clone(item[1])
+
+    def put(self, key: typing.Tuple[str, int], dataKey: bytes, obj: Module) -> None:
+        with self._lock:
+            self._items[key] = (dataKey, InstancesCache.clone(obj))
+            self._items.move_to_end(key)
+            while len(self._items) > InstancesCache.size:
+                self._items.popitem(last=False)
+
+    @staticmethod
+    def clone(obj: Module) -> Module:
+        """
+        Copies obj so it can be used concurrently with the original one.
+        Gui fields are deep copied, connections to backends (_api) are not copied at all (will be recreated
+        on first use), and parent provider (if any) is also cloned the same way
+        """
+        new = copy.copy(obj)
+        new._gui = copy.deepcopy(obj._gui)
+        for key, val in new._gui.items():  # Refresh references to our own fields
+            setattr(new, key, val)
+        if '_api' in new.__dict__:
+            new._api = None  # type: ignore
+        provider = new.__dict__.get('_provider')
+        if provider is not None:
+            new._provider = InstancesCache.clone(provider)  # type: ignore
+        return new
+
+    def remove(self, key: typing.Tuple[str, int]) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+
+instancesCache = InstancesCache()
+
+
 class ManagedObjectModel(UUIDModel):
     """
     Base abstract model for models that are top level Managed Objects
@@ -68,6 +132,16 @@ class ManagedObjectModel(UUIDModel):
         """
         return Environment.getEnvForTableElement(self._meta.verbose_name, self.id)
 
+    def instanceKey(self) -> typing.Tuple[str, int]:
+        return (self._meta.label, self.id)
+
+    def instanceDataKey(self) -> bytes:
+        """
+        Digest of the data an instance of this record is created from.
+        Must be extended if the instance also depends on other records (i.e. services on its provider)
+        """
+        return hashlib.sha1((self.data_type + '\0' + self.data).encode()).digest()
+
     def deserialize(self, obj: Module, values: typing.Optional[typing.Dict[str, str]]):
         """
         Conditionally deserializes obj if not initialized via user interface and data holds something
@@ -98,11 +172,23 @@ class ManagedObjectModel(UUIDModel):
             # logger.debug('Got cached instance instead of deserializing a new one for {}'.format(self.name))
             return self._cachedInstance
 
+        # Instances created from values (i.e. from admin interface) are never cached
+        useCache = values is None and self.id is not None
+        if useCache:
+            dataKey = self.instanceDataKey()
+            cached = instancesCache.get(self.instanceKey(), dataKey)
+            if cached is not None:
+                self._cachedInstance = cached
+                return cached
+
         klass = self.getType()
         env = self.getEnvironment()
         obj = klass(env, values)
         self.deserialize(obj, values)
 
+        if useCache:
+            instancesCache.put(self.instanceKey(), dataKey, obj)
+
         self._cachedInstance = obj
 
         return obj
@@ -119,3 +205,13 @@ class ManagedObjectModel(UUIDModel):
         return True if self if of the requested type, else returns False
         """
         return self.data_type == type_
+
+
+# Cached instances are discarded as soon as records are saved or deleted (on this process, others will detect changes on data)
+def _discardInstance(sender, **kwargs):
+    instance = kwargs['instance']
+    if isinstance(instance, ManagedObjectModel) and instance.id is not None:
+        instancesCache.remove(instance.instanceKey())
+
+signals.post_save.connect(_discardInstance)
+signals.post_delete.connect(_discardInstance)
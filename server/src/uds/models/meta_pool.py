@@ -114,9 +114,12 @@ class MetaPool(UUIDModel, TaggingMixin):  # type: ignore
                 maintenance += 1
         return total == maintenance
 
-    def isAccessAllowed(self, chkDateTime: typing.Optional['datetime.datetime'] = None) -> bool:
+    def isAccessAllowed(self, chkDateTime: typing.Optional['datetime.datetime'] = None, checked: typing.Optional[typing.Dict[int, bool]] = None) -> bool:
         """
         Checks if the access for a service pool is allowed or not (based esclusively on associated calendars)
+
+        If "checked" is provided, calendar results are memoized on it (by calendar id), so
+        several pools sharing calendars can be checked for the same datetime in a batch
         """
         if chkDateTime is None:
             chkDateTime = typing.cast('datetime.datetime', getSqlDatetime())
@@ -124,7 +127,13 @@ class MetaPool(UUIDModel, TaggingMixin):  # type: ignore
         access = self.fallbackAccess
         # Let's see if we can access by current datetime
         for ac in sorted(self.calendarAccess.all(), key=lambda x: x.priority):
-            if CalendarChecker(ac.calendar).check(chkDateTime) is True:
+            if checked is None:
+                matches = CalendarChecker(ac.calendar).check(chkDateTime)
+            else:
+                if ac.calendar_id not in checked:
+                    checked[ac.calendar_id] = CalendarChecker(ac.calendar).check(chkDateTime)
+                matches = checked[ac.calendar_id]
+            if matches is True:
                 access = ac.access
                 break  # Stops on first rule match found
 
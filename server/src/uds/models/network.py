@@ -69,8 +69,9 @@ class Network(UUIDModel, TaggingMixin):  # type: ignore
         """
         Returns the networks that are valid for specified ip in dotted quad (xxx.xxx.xxx.xxx)
         """
-        ipInt = net.ipToLong(ip)
-        return Network.objects.filter(net_start__lte=ipInt, net_end__gte=ipInt)
+        from uds.core.util import network_index  # pylint: disable=import-outside-toplevel
+
+        return network_index.index().networksFor(net.ipToLong(ip))
 
     @staticmethod
     def create(name: str, netRange: str) -> 'Network':
@@ -138,3 +139,14 @@ class Network(UUIDModel, TaggingMixin):  # type: ignore
 
 # Connects a pre deletion signal to Authenticator
 signals.pre_delete.connect(Network.beforeDelete, sender=Network)
+
+# Keeps the networks index of every process up to date
+def _invalidateIndex(sender, **kwargs):
+    from uds.core.util import network_index  # pylint: disable=import-outside-toplevel
+    network_index.invalidate(sender, **kwargs)
+
+signals.post_save.connect(_invalidateIndex, sender=Network)
+signals.post_delete.connect(_invalidateIndex, sender=Network)
+signals.m2m_changed.connect(_invalidateIndex, sender=Network.transports.through)
+signals.post_save.connect(_invalidateIndex, sender=Transport)
+signals.post_delete.connect(_invalidateIndex, sender=Transport)
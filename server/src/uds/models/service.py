@@ -39,9 +39,8 @@ from django.db.models import signals
 from uds.core.environment import Environment
 from uds.core.util import log
 from uds.core.util import unique
-from uds.core.util import connection
 
-from .managed_object_model import ManagedObjectModel
+from .managed_object_model import ManagedObjectModel, instancesCache
 from .tag import TaggingMixin
 from .proxy import Proxy
 from .provider import Provider
@@ -93,6 +92,10 @@ class Service(ManagedObjectModel, TaggingMixin):  # type: ignore
             }
         )
 
+    def instanceDataKey(self) -> bytes:
+        # Service instances keeps its provider instance, so they also depends on provider data
+        return super().instanceDataKey() + self.provider.instanceDataKey()
+
     def getInstance(self, values=None) -> 'services.Service':
         """
         Instantiates the object this record contains.
@@ -112,6 +115,14 @@ class Service(ManagedObjectModel, TaggingMixin):  # type: ignore
             # logger.debug('Got cached instance instead of deserializing a new one for {}'.format(self.name))
             return self._cachedInstance
 
+        useCache = values is None and self.id is not None
+        if useCache:
+            dataKey = self.instanceDataKey()
+            cached = instancesCache.get(self.instanceKey(), dataKey)
+            if cached is not None:
+                self._cachedInstance = cached
+                return typing.cast('services.Service', cached)
+
         prov: 'services.ServiceProvider' = self.provider.getInstance()
         sType = prov.getServiceByType(self.data_type)
 
@@ -121,6 +132,9 @@ class Service(ManagedObjectModel, TaggingMixin):  # type: ignore
         else:
             raise Exception('Service type of {} is not recogniced by provider {}'.format(self.data_type, prov))
 
+        if useCache:
+            instancesCache.put(self.instanceKey(), dataKey, obj)
+
         self._cachedInstance = obj
 
         return obj
@@ -148,9 +162,9 @@ class Service(ManagedObjectModel, TaggingMixin):  # type: ignore
         return self.provider.isInMaintenance() if self.provider else True
 
     def testServer(self, host: str, port: typing.Union[str, int], timeout: int = 4) -> bool:
-        if self.proxy is not None:
-            return self.proxy.doTestServer(host, port, timeout)
-        return connection.testServer(host, port, timeout)
+        from uds.core.util import reachability  # pylint: disable=import-outside-toplevel
+
+        return reachability.prober().isReachable(host, port, timeout, self.proxy)
 
     def __str__(self):
         return '{} of type {} (id:{})'.format(self.name, self.data_type, self.id)
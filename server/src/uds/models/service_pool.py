@@ -37,6 +37,7 @@ from datetime import datetime, timedelta
 
 from django.db import models, transaction
 from django.db.models import signals, QuerySet
+from django.db.models.functions import Coalesce
 
 from uds.core.environment import Environment
 from uds.core.util import log
@@ -209,6 +210,12 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
         if GlobalConfig.RESTRAINT_TIME.getInt() <= 0:
             return False  # Do not perform any restraint check if we set the globalconfig to 0 (or less)
 
+        from uds.models.service_pool_occupancy import ServicePoolOccupancy  # pylint: disable=redefined-outer-name
+
+        # If there are not enough errored user services, no need to check when they failed
+        if ServicePoolOccupancy.countFor(self, states=[states.userService.ERROR]) < GlobalConfig.RESTRAINT_COUNT.getInt():
+            return False
+
         date = typing.cast(datetime, getSqlDatetime()) - timedelta(seconds=GlobalConfig.RESTRAINT_TIME.getInt())
         if self.userServices.filter(state=states.userService.ERROR, state_date__gt=date).count() >= GlobalConfig.RESTRAINT_COUNT.getInt():
             return True
@@ -246,9 +253,12 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
 
         return None
 
-    def isAccessAllowed(self, chkDateTime=None) -> bool:
+    def isAccessAllowed(self, chkDateTime=None, checked: typing.Optional[typing.Dict[int, bool]] = None) -> bool:
         """
         Checks if the access for a service pool is allowed or not (based esclusively on associated calendars)
+
+        If "checked" is provided, calendar results are memoized on it (by calendar id), so
+        several pools sharing calendars can be checked for the same datetime in a batch
         """
         if chkDateTime is None:
             chkDateTime = getSqlDatetime()
@@ -256,7 +266,13 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
         access = self.fallbackAccess
         # Let's see if we can access by current datetime
         for ac in sorted(self.calendarAccess.all(), key=lambda x:x.priority):
-            if CalendarChecker(ac.calendar).check(chkDateTime) is True:
+            if checked is None:
+                matches = CalendarChecker(ac.calendar).check(chkDateTime)
+            else:
+                if ac.calendar_id not in checked:
+                    checked[ac.calendar_id] = CalendarChecker(ac.calendar).check(chkDateTime)
+                matches = checked[ac.calendar_id]
+            if matches is True:
                 access = ac.access
                 break  # Stops on first rule match found
 
@@ -382,6 +398,9 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
                 nonActivePub.userServices.exclude(cache_level=0).filter(state=states.userService.USABLE).update(state=states.userService.REMOVABLE, state_date=now)
                 if not skipAssigned:
                     nonActivePub.userServices.filter(cache_level=0, state=states.userService.USABLE, in_use=False).update(state=states.userService.REMOVABLE, state_date=now)
+        # Bulk updates bypasses occupancy counters
+        from uds.models.service_pool_occupancy import ServicePoolOccupancy  # pylint: disable=redefined-outer-name
+        ServicePoolOccupancy.reconcile([self.id])
 
     def validateGroups(self, groups: typing.Iterable['Group']) -> None:
         """
@@ -441,6 +460,7 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
             List of accesible deployed services
         """
         from uds.core import services
+        from uds.models.service_pool_occupancy import ServicePoolOccupancy  # pylint: disable=redefined-outer-name
         servicesNotNeedingPub = [t.type() for t in services.factory().servicesThatDoNotNeedPublication()]
         # Get services that HAS publications
         query = (
@@ -451,7 +471,11 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
             visible=True
             )
             .annotate(pubs_active=models.Count('publications', filter=models.Q(publications__state=states.publication.USABLE)))
-            .annotate(usage_count=models.Count('userServices', filter=models.Q(userServices__state__in=states.userService.VALID_STATES, userServices__cache_level=0)))
+            .annotate(usage_count=Coalesce(models.Subquery(
+                ServicePoolOccupancy.objects.filter(
+                    deployed_service=models.OuterRef('pk'), state__in=states.userService.VALID_STATES, cache_level=0
+                ).values('deployed_service').annotate(total=models.Sum('count')).values('total')
+            ), 0))
             .prefetch_related(
                 'transports',
                 'transports__networks',
@@ -543,7 +567,8 @@ class ServicePool(UUIDModel, TaggingMixin):  #  type: ignore
             return 0
 
         if cachedValue == -1:
-            cachedValue = self.assignedUserServices().filter(state__in=states.userService.VALID_STATES).count()
+            from uds.models.service_pool_occupancy import ServicePoolOccupancy  # pylint: disable=redefined-outer-name
+            cachedValue = ServicePoolOccupancy.countFor(self, states=states.userService.VALID_STATES, cacheLevel=0)
 
         return 100 * cachedValue // maxs
 
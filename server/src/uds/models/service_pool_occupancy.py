@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2020 Virtual Cable S.L.U.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice,
+#      this list of conditions and the following disclaimer in the documentation
+#      and/or other materials provided with the distribution.
+#    * Neither the name of Virtual Cable S.L. nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. moduleauthor:: Adolfo Gómez, dkmaster at dkmon dot com
+"""
+import logging
+import typing
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Sum, Count
+
+from .service_pool import ServicePool
+
+logger = logging.getLogger(__name__)
+
+# (service pool id, state, cache level, in use)
+OccupancyKey = typing.Tuple[int, str, int, bool]
+
+
+class ServicePoolOccupancy(models.Model):
+    """
+    Maintained number of user services of a service pool, per state, cache level and in use flag.
+
+    It is updated by UserService on every save or delete, and periodically reconciled with the user services
+    table (to fix the drift of bulk updates), so common checks do not need to COUNT user services.
+    """
+    deployed_service = models.ForeignKey(ServicePool, on_delete=models.CASCADE, related_name='occupancy')
+    state = models.CharField(max_length=1)
+    cache_level = models.PositiveSmallIntegerField(default=0)
+    in_use = models.BooleanField(default=False)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        """
+        Meta class to declare db table
+        """
+        db_table = 'uds__pool_occupancy'
+        app_label = 'uds'
+        unique_together = (('deployed_service', 'state', 'cache_level', 'in_use'),)
+
+    @staticmethod
+    def adjust(key: OccupancyKey, delta: int) -> None:
+        """
+        Adds delta to the counter of the bucket.
+        Missing buckets are only created on increments (decrements of missing ones are left to reconciliation)
+        """
+        servicePoolId, state, cacheLevel, inUse = key
+        bucket = ServicePoolOccupancy.objects.filter(deployed_service_id=servicePoolId, state=state, cache_level=cacheLevel, in_use=inUse)
+        if bucket.update(count=F('count') + delta) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                ServicePoolOccupancy.objects.create(deployed_service_id=servicePoolId, state=state, cache_level=cacheLevel, in_use=inUse, count=delta)
+        except IntegrityError:  # Created concurrently
+            bucket.update(count=F('count') + delta)
+
+    @staticmethod
+    def move(previous: typing.Optional[OccupancyKey], current: OccupancyKey) -> None:
+        """
+        Moves one user service from previous bucket (if any) to current one.
+        Buckets are always updated (and so, locked) in the same (key) order, so concurrent
+        opposite changes on the same service pool can't deadlock.
+        """
+        changes: typing.List[typing.Tuple[OccupancyKey, int]] = [(current, 1)]
+        if previous is not None:
+            changes.append((previous, -1))
+        for key, delta in sorted(changes):
+            ServicePoolOccupancy.adjust(key, delta)
+
+    @staticmethod
+    def _fix(key: OccupancyKey) -> bool:
+        """
+        Sets the bucket counter to the real number of user services, locking just this bucket.
+        Returns True if the bucket had to be fixed
+        """
+        from .user_service import UserService  # pylint: disable=import-outside-toplevel
+
+        servicePoolId, state, cacheLevel, inUse = key
+        with transaction.atomic():
+            bucket = ServicePoolOccupancy.objects.select_for_update().filter(
+                deployed_service_id=servicePoolId, state=state, cache_level=cacheLevel, in_use=inUse
+            ).first()
+            # Counted while holding the bucket lock, so saves waiting on it will apply their change over this value
+            count = UserService.objects.filter(deployed_service_id=servicePoolId, state=state, cache_level=cacheLevel, in_use=inUse).count()
+            if bucket is None:
+                if count == 0:
+                    return False
+                try:
+                    with transaction.atomic():
+                        ServicePoolOccupancy.objects.create(deployed_service_id=servicePoolId, state=state, cache_level=cacheLevel, in_use=inUse, count=count)
+                except IntegrityError:  # Created concurrently, will be checked on next reconciliation
+                    return False
+                return True
+            if count == 0:  # Empty buckets are removed
+                bucket.delete()
+                return bucket.count != 0
+            if bucket.count == count:
+                return False
+            bucket.count = count
+            bucket.save(update_fields=['count'])
+            return True
+
+    @staticmethod
+    def filterFor(
+            states: typing.Optional[typing.Iterable[str]] = None,
+            cacheLevel: typing.Optional[int] = None,
+            inUse: typing.Optional[bool] = None,
+            excludeStates: typing.Optional[typing.Iterable[str]] = None,
+            prefix: str = ''
+        ) -> Q:
+        """
+        Returns the Q filter for buckets matching the conditions.
+        Prefix is used to filter from related models (i.e. 'occupancy__' from ServicePool)
+        """
+        fltr = Q()
+        if states is not None:
+            fltr &= Q(**{prefix + 'state__in': list(states)})
+        if excludeStates is not None:
+            fltr &= ~Q(**{prefix + 'state__in': list(excludeStates)})
+        if cacheLevel is not None:
+            fltr &= Q(**{prefix + 'cache_level': cacheLevel})
+        if inUse is not None:
+            fltr &= Q(**{prefix + 'in_use': inUse})
+        return fltr
+
+    @staticmethod
+    def countFor(
+            servicePool: typing.Union[ServicePool, int],
+            states: typing.Optional[typing.Iterable[str]] = None,
+            cacheLevel: typing.Optional[int] = None,
+            inUse: typing.Optional[bool] = None,
+            excludeStates: typing.Optional[typing.Iterable[str]] = None
+        ) -> int:
+        """
+        Returns the number of user services of the service pool matching the conditions
+        """
+        servicePoolId = servicePool.id if isinstance(servicePool, ServicePool) else servicePool
+        return ServicePoolOccupancy.objects.filter(
+            ServicePoolOccupancy.filterFor(states, cacheLevel, inUse, excludeStates), deployed_service_id=servicePoolId
+        ).aggregate(total=Sum('count'))['total'] or 0
+
+    @staticmethod
+    def countForProvider(providerId: int, states: typing.Iterable[str]) -> int:
+        """
+        Returns the number of user services, in any of the states, of all the service pools of a provider
+        """
+        return ServicePoolOccupancy.objects.filter(
+            deployed_service__service__provider_id=providerId, state__in=list(states)
+        ).aggregate(total=Sum('count'))['total'] or 0
+
+    @staticmethod
+    def reconcile(servicePoolsIds: typing.Optional[typing.Iterable[int]] = None) -> int:
+        """
+        Recalculates the buckets of the service pools (all if None) from user services table.
+        Returns the number of buckets that had to be fixed
+        """
+        from .user_service import UserService  # pylint: disable=import-outside-toplevel
+
+        userServices = UserService.objects.all()
+        buckets = ServicePoolOccupancy.objects.all()
+        if servicePoolsIds is not None:
+            servicePoolsIds = list(servicePoolsIds)
+            userServices = userServices.filter(deployed_service__in=servicePoolsIds)
+            buckets = buckets.filter(deployed_service__in=servicePoolsIds)
+
+        # Counts are compared without locking, and only the buckets that seems wrong are locked (one by one) and fixed
+        stored: typing.Dict[OccupancyKey, int] = {
+            (v[0], v[1], v[2], v[3]): v[4]
+            for v in buckets.values_list('deployed_service', 'state', 'cache_level', 'in_use', 'count')
+        }
+        real: typing.Dict[OccupancyKey, int] = {
+            (v[0], v[1], v[2], v[3]): v[4]
+            for v in userServices.values_list('deployed_service', 'state', 'cache_level', 'in_use').annotate(Count('id')).order_by()
+        }
+        wrong = sorted(key for key in set(stored) | set(real) if stored.get(key, 0) != real.get(key, 0) or key not in real)
+
+        fixed = 0
+        for key in wrong:
+            fixed += ServicePoolOccupancy._fix(key)
+
+        return fixed
+
+    def __str__(self) -> str:
+        return 'Occupancy of {}: state {}, cache level {}, in use {} = {}'.format(self.deployed_service_id, self.state, self.cache_level, self.in_use, self.count)
@@ -67,24 +67,19 @@ class StatsCounters(models.Model):
         """
         Returns the average stats grouped by interval for owner_type and owner_id (optional)
 
-        Note: if someone cant get this more optimized, please, contribute it!
+        If interval is a multiple of an accumulation level (or is calculated from max_intervals),
+        pre-aggregated counters (StatsCountersAccum) are used instead of grouping raw counters table.
         """
+        from .stats_counters_accum import StatsCountersAccum  # pylint: disable=import-outside-toplevel
 
-        filt = 'owner_type'
-        if isinstance(owner_type, (list, tuple, types.GeneratorType)):
-            filt += ' in (' + ','.join((str(x) for x in owner_type)) + ')'
-        else:
-            filt += '=' + str(owner_type)
+        if isinstance(owner_type, types.GeneratorType):
+            owner_type = list(owner_type)
 
         owner_id = kwargs.get('owner_id', None)
-        if owner_id:
-            filt += ' AND OWNER_ID'
-            if isinstance(owner_id, (list, tuple, types.GeneratorType)):
-                filt += ' in (' + ','.join(str(x) for x in owner_id) + ')'
-            else:
-                filt += '=' + str(owner_id)
-
-        filt += ' AND counter_type=' + str(counter_type)
+        if isinstance(owner_id, types.GeneratorType):
+            owner_id = list(owner_id)
+        if isinstance(owner_id, (list, tuple)) and not owner_id:
+            return []
 
         since = kwargs.get('since', None)
         to = kwargs.get('to', None)
@@ -98,27 +93,73 @@ class StatsCounters(models.Model):
 
         limit = kwargs.get('limit')
 
+        use_max = kwargs.get('use_max', False)
+
+        def filtered(q: models.QuerySet) -> models.QuerySet:
+            q = q.filter(counter_type=counter_type)
+            q = q.filter(owner_type__in=owner_type) if isinstance(owner_type, (list, tuple)) else q.filter(owner_type=owner_type)
+            if owner_id:
+                q = q.filter(owner_id__in=owner_id) if isinstance(owner_id, (list, tuple)) else q.filter(owner_id=owner_id)
+            return q
+
+        accumulated = StatsCountersAccum.isReady(StatsCountersAccum.HOUR)
+        exact = True
+
         if max_intervals:
             # Protect against division by "elements-1" a few lines below
             max_intervals = int(max_intervals) if int(max_intervals) > 1 else 2
 
-            if owner_id is None:
-                q = StatsCounters.objects.filter(stamp__gte=since, stamp__lte=to)
+            # Finest accumulation level is enough to know how many counters are there, and (roughly) first & last
+            if accumulated:
+                rng = filtered(StatsCountersAccum.objects.filter(interval_type=StatsCountersAccum.HOUR, stamp__gte=since, stamp__lt=to + StatsCountersAccum.HOUR)).aggregate(  # @UndefinedVariable
+                    count=models.Sum('v_count'), first=models.Min('stamp'), last=models.Max('stamp')
+                )
             else:
-                if isinstance(owner_id, (list, tuple, types.GeneratorType)):
-                    q = StatsCounters.objects.filter(owner_id__in=owner_id, stamp__gte=since, stamp__lte=to)
-                else:
-                    q = StatsCounters.objects.filter(owner_id=owner_id, stamp__gte=since, stamp__lte=to)
+                rng = filtered(StatsCounters.objects.filter(stamp__gte=since, stamp__lte=to)).aggregate(  # @UndefinedVariable
+                    count=models.Count('id'), first=models.Min('stamp'), last=models.Max('stamp')
+                )
+
+            if (rng['count'] or 0) > max_intervals:
+                interval = max(int((rng['last'] - rng['first']) / (max_intervals - 1)), 1)
+                exact = False
 
-            if isinstance(owner_type, (list, tuple, types.GeneratorType)):
-                q = q.filter(owner_type__in=owner_type)
+        level = StatsCountersAccum.levelFor(interval, exact) if accumulated else None
+
+        if level:
+            # Interval is rounded up to a multiple of accumulation level, so (at most) max_intervals are returned
+            interval = (interval + level - 1) // level * level
+            q = filtered(StatsCountersAccum.objects.filter(interval_type=level, stamp__gte=since, stamp__lt=to + level)).annotate(  # @UndefinedVariable
+                group=StatsCountersAccum.bucket('stamp', interval)
+            ).values('group').annotate(
+                cnt=models.Sum('v_count'), total=models.Sum('v_sum'), vmax=models.Max('v_max')
+            ).order_by('group')
+
+            if limit:
+                q = q[:int(limit)]
+
+            logger.debug('Stats query (accumulated, level %s): %s', level, q.query)
+
+            return (
+                StatsCounters(
+                    id=-1, owner_id=-1, owner_type=-1, counter_type=-1, stamp=v['group'],
+                    value=v['vmax'] if use_max else -(-v['total'] // v['cnt'])
+                ) for v in q
+            )
+
+        filt = 'owner_type'
+        if isinstance(owner_type, (list, tuple)):
+            filt += ' in (' + ','.join((str(x) for x in owner_type)) + ')'
+        else:
+            filt += '=' + str(owner_type)
+
+        if owner_id:
+            filt += ' AND OWNER_ID'
+            if isinstance(owner_id, (list, tuple)):
+                filt += ' in (' + ','.join(str(x) for x in owner_id) + ')'
             else:
-                q = q.filter(owner_type=owner_type)
+                filt += '=' + str(owner_id)
 
-            if q.count() > max_intervals:
-                first = q.order_by('stamp')[0].stamp
-                last = q.order_by('stamp').reverse()[0].stamp
-                interval = int((last - first) / (max_intervals - 1))
+        filt += ' AND counter_type=' + str(counter_type)
 
         stampValue = '{ceil}(stamp/{interval})'.format(ceil=getSqlFnc('CEIL'), interval=interval)
         filt += ' AND stamp>={since} AND stamp<={to} GROUP BY {stampValue} ORDER BY stamp'.format(
@@ -130,7 +171,7 @@ class StatsCounters(models.Model):
         if limit:
             filt += ' LIMIT {}'.format(limit)
 
-        if kwargs.get('use_max', False):
+        if use_max:
             fnc = getSqlFnc('MAX') + ('(value)')
         else:
             fnc = getSqlFnc('CEIL') + '({}(value))'.format(getSqlFnc('AVG'))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020 Virtual Cable S.L.U.
+# Copyright (c) 2012-2019 Virtual Cable S.L.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright notice,
+#      this list of conditions and the following disclaimer in the documentation
+#      and/or other materials provided with the distribution.
+#    * Neither the name of Virtual Cable S.L. nor the names of its contributors
+#      may be used to endorse or promote products derived from this software
+#      without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. moduleauthor:: Adolfo Gómez, dkmaster at dkmon dot com
+"""
+import typing
+import logging
+
+from django.db import models, transaction
+
+from .stats_counters import StatsCounters
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCountersAccum(models.Model):
+    """
+    Pre-aggregated (rolled up) counter statistics, so long time series can be retrieved without
+    grouping the raw counters table.
+
+    Every row keeps count, sum, max & min of the counters of an owner & counter type in the
+    interval (stamp - interval_type, stamp]
+    """
+    HOUR = 3600
+    DAY = 86400
+
+    # Accumulation levels, finest first, as (interval, source interval). Source None means raw counters
+    LEVELS: typing.ClassVar[typing.Tuple[typing.Tuple[int, typing.Optional[int]], ...]] = ((HOUR, None), (DAY, HOUR))
+
+    owner_id = models.IntegerField(default=0)
+    owner_type = models.SmallIntegerField(default=0)
+    counter_type = models.SmallIntegerField(default=0)
+    interval_type = models.IntegerField(default=HOUR)
+    stamp = models.IntegerField(default=0)
+    v_count = models.IntegerField(default=0)
+    v_sum = models.BigIntegerField(default=0)
+    v_max = models.IntegerField(default=0)
+    v_min = models.IntegerField(default=0)
+
+    class Meta:
+        """
+        Meta class to declare db table
+        """
+        db_table = 'uds_stats_c_accum'
+        app_label = 'uds'
+        index_together = (
+            ('interval_type', 'counter_type', 'owner_type', 'stamp'),
+        )
+
+    @staticmethod
+    def bucket(field: str, interval: int) -> models.Expression:
+        """
+        Expression that returns the end of the interval that contains the value of field
+        (same as ceil(field / interval) * interval, but using only integer arithmetic)
+        """
+        return models.ExpressionWrapper(models.F(field) + (interval - models.F(field) % interval) % interval, output_field=models.IntegerField())
+
+    @staticmethod
+    def isReady(interval: int) -> bool:
+        """
+        True if counters has been accumulated for this interval
+        """
+        return StatsCountersAccum.objects.filter(interval_type=interval).exists()  # @UndefinedVariable
+
+    @staticmethod
+    def levelFor(interval: int, exact: bool = True) -> typing.Optional[int]:
+        """
+        Returns the coarsest accumulation level that can be used to group counters by interval.
+        If exact, interval must be a multiple of the level, else any level not greater than interval is valid.
+        """
+        for level, _ in reversed(StatsCountersAccum.LEVELS):
+            if interval >= level and (not exact or interval % level == 0):
+                return level
+        return None
+
+    @staticmethod
+    def accumulate(interval: int, source: typing.Optional[int]) -> int:
+        """
+        Accumulates the counters (from raw table if source is None, or from accumulated source interval)
+        that are newer than last accumulated interval (that is recalculated, because it may be incomplete).
+        Returns the number of rows written
+        """
+        last = StatsCountersAccum.objects.filter(interval_type=interval).aggregate(models.Max('stamp'))['stamp__max']  # @UndefinedVariable
+        q: models.QuerySet
+        if source is None:
+            q = StatsCounters.objects.all()  # @UndefinedVariable
+            aggregates = {'cnt': models.Count('id'), 'total': models.Sum('value'), 'vmax': models.Max('value'), 'vmin': models.Min('value')}
+        else:
+            q = StatsCountersAccum.objects.filter(interval_type=source)  # @UndefinedVariable
+            aggregates = {'cnt': models.Sum('v_count'), 'total': models.Sum('v_sum'), 'vmax': models.Max('v_max'), 'vmin': models.Min('v_min')}
+
+        if last is not None:
+            q = q.filter(stamp__gt=last - interval)
+
+        rows = q.annotate(
+            group=StatsCountersAccum.bucket('stamp', interval)
+        ).values('owner_type', 'owner_id', 'counter_type', 'group').annotate(**aggregates).order_by()
+
+        written = 0
+        with transaction.atomic():
+            if last is not None:
+                StatsCountersAccum.objects.filter(interval_type=interval, stamp__gte=last).delete()  # @UndefinedVariable
+            batch: typing.List[StatsCountersAccum] = []
+            for r in rows.iterator():
+                batch.append(StatsCountersAccum(
+                    owner_type=r['owner_type'], owner_id=r['owner_id'], counter_type=r['counter_type'], interval_type=interval,
+                    stamp=r['group'], v_count=r['cnt'], v_sum=r['total'], v_max=r['vmax'], v_min=r['vmin']
+                ))
+                if len(batch) >= 1000:
+                    StatsCountersAccum.objects.bulk_create(batch)  # @UndefinedVariable
+                    written += len(batch)
+                    batch = []
+            StatsCountersAccum.objects.bulk_create(batch)  # @UndefinedVariable
+            written += len(batch)
+
+        return written
+
+    @staticmethod
+    def accumulateAll() -> None:
+        """
+        Updates all accumulation levels
+        """
+        for interval, source in StatsCountersAccum.LEVELS:
+            written = StatsCountersAccum.accumulate(interval, source)
+            logger.debug('Accumulated %s counters for interval %s', written, interval)
+
+    def __str__(self):
+        return 'Accumulated counter of {}({}): {} - {} - {} [{}]'.format(self.owner_type, self.owner_id, self.stamp, self.interval_type, self.counter_type, self.v_count)
@@ -108,12 +108,22 @@ class Transport(ManagedObjectModel, TaggingMixin):
 
         :note: Ip addresses has been only tested with IPv4 addresses
         """
-        if self.networks.count() == 0:
-            return True
+        from uds.core.util import network_index  # pylint: disable=import-outside-toplevel
+
         ip = net.ipToLong(ipStr)
-        if self.nets_positive:
-            return self.networks.filter(net_start__lte=ip, net_end__gte=ip).count() > 0
-        return self.networks.filter(net_start__lte=ip, net_end__gte=ip).count() == 0
+        matches = network_index.index().transportMatches(self.id, ip)
+        if matches is not None:
+            hasNetworks, inNetworks = matches
+            if not hasNetworks:
+                return True
+            return inNetworks if self.nets_positive else not inNetworks
+
+        # Not (yet) on index, uses .all() so prefetched networks (if any) are matched in memory
+        networks = self.networks.all()
+        if not networks:
+            return True
+        inNetworks = any(n.net_start <= ip <= n.net_end for n in networks)
+        return inNetworks if self.nets_positive else not inNetworks
 
     def validForOs(self, os: str) -> bool:
         logger.debug('Checkin if os "%s" is in "%s"', os, self.allowed_oss)
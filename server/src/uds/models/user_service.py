@@ -33,7 +33,7 @@
 import logging
 import typing
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import signals
 
 from uds.core.environment import Environment
@@ -44,6 +44,7 @@ from uds.core.util.state import State
 from .uuid_model import UUIDModel
 from .service_pool import ServicePool
 from .service_pool_publication import ServicePoolPublication
+from .service_pool_occupancy import ServicePoolOccupancy, OccupancyKey
 from .user import User
 from .util import NEVER
 from .util import getSqlDatetime
@@ -86,6 +87,12 @@ class UserService(UUIDModel):  # pylint: disable=too-many-public-methods
 
     cluster_node = models.CharField(max_length=128, default=None, blank=True, null=True, db_index=True)
 
+    # Occupancy bucket (see ServicePoolOccupancy) of this user service as stored on db, None if not known
+    _occupancy: typing.Optional[OccupancyKey] = None
+    _OCCUPANCY_FIELDS: typing.ClassVar[typing.Tuple[typing.Tuple[str, str], ...]] = (
+        ('deployed_service', 'deployed_service_id'), ('state', 'state'), ('cache_level', 'cache_level'), ('in_use', 'in_use')
+    )
+
 
     class Meta(UUIDModel.Meta):
         """
@@ -100,6 +107,33 @@ class UserService(UUIDModel):  # pylint: disable=too-many-public-methods
             'state'
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(attr in field_names for _, attr in UserService._OCCUPANCY_FIELDS):
+            instance._occupancy = (instance.deployed_service_id, instance.state, instance.cache_level, instance.in_use)
+        return instance
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Saves the user service, keeping its service pool occupancy updated on same transaction
+        """
+        previous = self._occupancy
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(force_insert, force_update, using, update_fields)
+            if previous is None and not adding:  # Unknown stored values, reconciliation will fix it
+                return
+            # Fields not saved keeps its previous stored value
+            saved = None if update_fields is None or previous is None else set(update_fields)
+            current = typing.cast(OccupancyKey, tuple(
+                getattr(self, attr) if saved is None or field in saved or attr in saved else previous[i]  # type: ignore
+                for i, (field, attr) in enumerate(UserService._OCCUPANCY_FIELDS)
+            ))
+            if current != previous:
+                ServicePoolOccupancy.move(previous, current)
+            self._occupancy = current
+
     @property
     def name(self) -> str:
         """
@@ -523,6 +557,15 @@ class UserService(UUIDModel):  # pylint: disable=too-many-public-methods
 
         logger.debug('Deleted user service %s', toDelete)
 
+    @staticmethod
+    def afterDelete(sender, **kwargs):
+        """
+        Used to keep service pool occupancy updated
+        """
+        deleted: 'UserService' = kwargs['instance']
+        ServicePoolOccupancy.adjust(deleted._occupancy or (deleted.deployed_service_id, deleted.state, deleted.cache_level, deleted.in_use), -1)
+
 
 # Connects a pre deletion signal to Authenticator
 signals.pre_delete.connect(UserService.beforeDelete, sender=UserService)
+signals.post_delete.connect(UserService.afterDelete, sender=UserService)
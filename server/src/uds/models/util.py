@@ -31,6 +31,7 @@
 .. moduleauthor:: Adolfo Gómez, dkmaster at dkmon dot com
 """
 import logging
+import typing
 from time import mktime
 
 from datetime import datetime
@@ -75,6 +76,15 @@ def getSqlDatetime() -> datetime:
 def getSqlDatetimeAsUnix() -> int:
     return int(mktime(getSqlDatetime().timetuple()))
 
+def selectForUpdateSkipLocked() -> typing.Dict[str, bool]:
+    """
+    Returns the select_for_update keyword arguments needed to skip rows locked by other transactions,
+    so several workers can claim rows concurrently. Empty if database does not supports it
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        return {'skip_locked': True}
+    return {}
+
 def getSqlFnc(fncName):
     """
     Convert different sql functions for different platforms
@@ -28,6 +28,8 @@
 """
 .. moduleauthor:: Adolfo Gómez, dkmaster at dkmon dot com
 """
+import contextlib
+import time
 import threading
 import logging
 import typing
@@ -47,21 +49,105 @@ if typing.TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
-lock = threading.Lock()
+
+class ConnectionPool:
+    """
+    Keyed (usually one key per provider) pool of oVirt sdk connections.
+
+    Every key can use up to maxConnections connections concurrently. Idle connections are reused (checked before
+    if they have been idle for more than checkAfter seconds) and closed after maxIdle seconds without use.
+    """
+    maxConnections: int = 4
+    maxIdle: int = 300
+    checkAfter: int = 60
+
+    _lock: threading.Lock
+    _idle: typing.Dict[str, typing.List[typing.Tuple[float, ovirt.Connection]]]
+    _slots: typing.Dict[str, threading.BoundedSemaphore]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+
+    def _evict(self) -> typing.List[ovirt.Connection]:
+        """
+        Removes (and returns, to be closed outside lock) the connections idle for too long.
+        Must be invoked with lock acquired
+        """
+        limit = time.time() - self.maxIdle
+        evicted: typing.List[ovirt.Connection] = []
+        for key, conns in self._idle.items():
+            evicted += [c for t, c in conns if t < limit]
+            self._idle[key] = [(t, c) for t, c in conns if t >= limit]
+        return evicted
+
+    @staticmethod
+    def _close(connections: typing.Iterable[ovirt.Connection]) -> None:
+        for c in connections:
+            try:
+                c.close()
+            except Exception:
+                # Nothing happens, may it was already disconnected
+                pass
+
+    def get(self, key: str, factory: typing.Callable[[], ovirt.Connection]) -> ovirt.Connection:
+        """
+        Borrows a connection for key, creating it using factory if no idle one is available.
+        Waits if maxConnections are already borrowed for this key
+        """
+        with self._lock:
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.maxConnections))
+        slots.acquire()
+
+        try:
+            with self._lock:
+                evicted = self._evict()
+                conns = self._idle.get(key)
+                idleSince, conn = conns.pop() if conns else (0.0, None)
+            self._close(evicted)
+
+            if conn and idleSince < time.time() - self.checkAfter:
+                try:
+                    if not conn.test():
+                        raise Exception('Connection test failed')
+                except Exception:
+                    self._close([conn])
+                    conn = None
+
+            return conn or factory()
+        except Exception:
+            slots.release()
+            raise
+
+    def put(self, key: str, conn: ovirt.Connection, healthy: bool = True) -> None:
+        """
+        Returns a borrowed connection. If it is not healthy (i.e. got a connection error), it is closed
+        """
+        with self._lock:
+            if healthy:
+                self._idle.setdefault(key, []).append((time.time(), conn))
+            evicted = self._evict()
+            slots = self._slots[key]
+        if not healthy:
+            evicted.append(conn)
+        self._close(evicted)
+        slots.release()
+
+
+pool = ConnectionPool()
+
 
 class Client:
     """
     Module to manage oVirt connections using ovirtsdk.
 
-    Due to the fact that we can't create two proxy connections at same time, we serialize all access to ovirt platform.
-    Only one request and one live connection can exists at a time.
+    Connections are borrowed from a pool shared by all clients of same provider, so concurrent requests
+    (to same or different oVirt platforms) do not need to be serialized, nor connections recreated on every request.
 
-    This can waste a lot of time, so use of cache here is more than important to achieve aceptable performance.
+    Anyway, use of cache here is more than important to achieve aceptable performance.
 
     """
-    cached_api: typing.ClassVar[typing.Optional[ovirt.Connection]] = None
-    cached_api_key: typing.ClassVar[typing.Optional[str]] = None
-
     CACHE_TIME_LOW = 60 * 5  # Cache time for requests are 5 minutes by default
     CACHE_TIME_HIGH = 60 * 30  # Cache time for requests that are less probable to change (as cluster perteinance of a machine)
 
@@ -81,35 +167,30 @@ class Client:
         """
         return "{}{}{}{}{}".format(prefix, self._host, self._username, self._password, self._timeout)
 
-    def __getApi(self) -> ovirt.Connection:
+    @contextlib.contextmanager
+    def __api(self) -> typing.Iterator[ovirt.Connection]:
         """
-        Gets the api connection.
-
-        Again, due to the fact that ovirtsdk don't allow (at this moment, but it's on the "TODO" list) concurrent access to
-        more than one server, we keep only one opened connection.
-
-        Must be accesed "locked", so we can safely alter cached_api and cached_api_key
+        Borrows an api connection from pool for the enclosed block, returning it when done.
+        Connections that raised a connection error are not reused
         """
         aKey = self.__getKey('o-host')
-        # if cached_api_key == aKey:
-        #    return cached_api
 
-        if Client.cached_api:
+        def connect() -> ovirt.Connection:
             try:
-                Client.cached_api.close()
-            except Exception:
-                # Nothing happens, may it was already disconnected
-                pass
-        try:
-            Client.cached_api_key = aKey
-            Client.cached_api = ovirt.Connection(url='https://' + self._host + '/ovirt-engine/api', username=self._username, password=self._password, timeout=self._timeout, insecure=True)  # , debug=True, log=logger )
+                return ovirt.Connection(url='https://' + self._host + '/ovirt-engine/api', username=self._username, password=self._password, timeout=self._timeout, insecure=True)  # , debug=True, log=logger )
+            except:
+                logger.exception('Exception connection ovirt at %s', self._host)
+                raise Exception("Can't connet to server at {}".format(self._host))
 
-            return Client.cached_api
-        except:
-            logger.exception('Exception connection ovirt at %s', self._host)
-            Client.cached_api = None
-            Client.cached_api_key = None
-            raise Exception("Can't connet to server at {}".format(self._host))
+        conn = pool.get(aKey, connect)
+        healthy = True
+        try:
+            yield conn
+        except ovirt.ConnectionError:
+            healthy = False
+            raise
+        finally:
+            pool.put(aKey, conn, healthy)
 
     def __init__(self, host: str, username: str, password: str, timeout: typing.Union[str, int], cache: 'Cache'):
         self._host = host
@@ -121,13 +202,11 @@ class Client:
 
     def test(self) -> bool:
         try:
-            lock.acquire(True)
-            return self.__getApi().test()
+            with self.__api() as api:
+                return api.test()
         except Exception as e:
             logger.error('Testing Server failed for oVirt: %s', e)
             return False
-        finally:
-            lock.release()
 
     def isFullyFunctionalVersion(self) -> typing.Tuple[bool, str]:
         """
@@ -156,11 +235,7 @@ class Client:
         if val is not None and force is False:
             return val
 
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             vms: typing.Iterable[typing.Any] = api.system_service().vms_service().list()
 
             logger.debug('oVirt VMS: %s', vms)
@@ -178,8 +253,19 @@ class Client:
 
             return res
 
-        finally:
-            lock.release()
+    def getVmsStates(self) -> typing.Dict[str, str]:
+        """
+        Obtains the states of all machines inside ovirt, with just one request.
+        This method do not uses cache at all.
+
+        Returns
+            A dictionary, with machine ids as keys and machine states (same values as getMachineState) as values
+        """
+        with self.__api() as api:
+            return {
+                vm.id: vm.status.value if vm.status is not None else 'unknown'
+                for vm in api.system_service().vms_service().list()
+            }
 
     def getClusters(self, force: bool = False) -> typing.List[typing.MutableMapping[str, typing.Any]]:
         """
@@ -203,11 +289,7 @@ class Client:
         if val and not force:
             return val
 
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             clusters = api.system_service().clusters_service().list()
 
             res: typing.List[typing.MutableMapping[str, typing.Any]] = []
@@ -229,9 +311,6 @@ class Client:
 
             return res
 
-        finally:
-            lock.release()
-
     def getClusterInfo(self, clusterId: str, force: bool = False) -> typing.MutableMapping[str, typing.Any]:
         """
         Obtains the cluster info
@@ -254,11 +333,7 @@ class Client:
         if val and not force:
             return val
 
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             c = api.system_service().clusters_service().service(clusterId).get()
 
             dc = c.data_center
@@ -269,8 +344,6 @@ class Client:
             res = {'name': c.name, 'id': c.id, 'datacenter_id': dc}
             self._cache.put(clKey, res, Client.CACHE_TIME_HIGH)
             return res
-        finally:
-            lock.release()
 
     def getDatacenterInfo(self, datacenterId: str, force: bool = False) -> typing.MutableMapping[str, typing.Any]:
         """
@@ -303,11 +376,7 @@ class Client:
         if val is not None and force is False:
             return val
 
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             datacenter_service = api.system_service().data_centers_service().service(datacenterId)
             d = datacenter_service.get()
 
@@ -332,8 +401,6 @@ class Client:
 
             self._cache.put(dcKey, res, Client.CACHE_TIME_HIGH)
             return res
-        finally:
-            lock.release()
 
     def getStorageInfo(self, storageId: str, force: bool = False) -> typing.MutableMapping[str, typing.Any]:
         """
@@ -361,11 +428,7 @@ class Client:
         if val and not force:
             return val
 
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             dd = api.system_service().storage_domains_service().service(storageId).get()
 
             res = {
@@ -378,8 +441,6 @@ class Client:
 
             self._cache.put(sdKey, res, Client.CACHE_TIME_LOW)
             return res
-        finally:
-            lock.release()
 
     def makeTemplate(
             self,
@@ -406,11 +467,7 @@ class Client:
         """
         logger.debug("n: %s, c: %s, vm: %s, cl: %s, st: %s, dt: %s", name, comments, machineId, clusterId, storageId, displayType)
 
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             # cluster = ov.clusters_service().service('00000002-0002-0002-0002-0000000002e4') # .get()
             # vm = ov.vms_service().service('e7ff4e00-b175-4e80-9c1f-e50a5e76d347') # .get()
 
@@ -448,8 +505,6 @@ class Client:
             # display=display)
 
             return api.system_service().templates_service().add(template).id
-        finally:
-            lock.release()
 
     def getTemplateState(self, templateId: str) -> str:
         """
@@ -463,11 +518,7 @@ class Client:
 
         (don't know if ovirt returns something more right now, will test what happens when template can't be published)
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             try:
                 template = api.system_service().templates_service().service(templateId).get()
 
@@ -478,9 +529,6 @@ class Client:
             except Exception:  # Not found
                 return 'removed'
 
-        finally:
-            lock.release()
-
     def deployFromTemplate(
             self,
             name: str,
@@ -509,11 +557,7 @@ class Client:
         """
         logger.debug('Deploying machine with name "%s" from template %s at cluster %s with display %s and usb %s, memory %s and guaranteed %s',
                      name, templateId, clusterId, displayType, usbType, memoryMB, guaranteedMB)
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             logger.debug('Deploying machine %s', name)
 
             cluster = ovirt.types.Cluster(id=clusterId)
@@ -532,24 +576,15 @@ class Client:
 
             return api.system_service().vms_service().add(par).id
 
-        finally:
-            lock.release()
-
     def removeTemplate(self, templateId: str) -> None:
         """
         Removes a template from ovirt server
 
         Returns nothing, and raises an Exception if it fails
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             api.system_service().templates_service().service(templateId).remove()
             # This returns nothing, if it fails it raises an exception
-        finally:
-            lock.release()
 
     def getMachineState(self, machineId: str) -> str:
         """
@@ -567,11 +602,7 @@ class Client:
              suspended, image_illegal, image_locked or powering_down
              Also can return'unknown' if Machine is not known
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             try:
                 vm = api.system_service().vms_service().service(machineId).get()
 
@@ -582,9 +613,6 @@ class Client:
             except Exception:  # machine not found
                 return 'unknown'
 
-        finally:
-            lock.release()
-
     def startMachine(self, machineId: str) -> None:
         """
         Tries to start a machine. No check is done, it is simply requested to oVirt.
@@ -596,11 +624,7 @@ class Client:
 
         Returns:
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             vmService = api.system_service().vms_service().service(machineId)
 
             if vmService.get() is None:
@@ -608,9 +632,6 @@ class Client:
 
             vmService.start()
 
-        finally:
-            lock.release()
-
     def stopMachine(self, machineId: str) -> None:
         """
         Tries to start a machine. No check is done, it is simply requested to oVirt
@@ -620,11 +641,7 @@ class Client:
 
         Returns:
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             vmService = api.system_service().vms_service().service(machineId)
 
             if vmService.get() is None:
@@ -632,9 +649,6 @@ class Client:
 
             vmService.stop()
 
-        finally:
-            lock.release()
-
     def suspendMachine(self, machineId: str) -> None:
         """
         Tries to start a machine. No check is done, it is simply requested to oVirt
@@ -644,11 +658,7 @@ class Client:
 
         Returns:
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             vmService = api.system_service().vms_service().service(machineId)
 
             if vmService.get() is None:
@@ -656,9 +666,6 @@ class Client:
 
             vmService.suspend()
 
-        finally:
-            lock.release()
-
     def removeMachine(self, machineId: str) -> None:
         """
         Tries to delete a machine. No check is done, it is simply requested to oVirt
@@ -668,11 +675,7 @@ class Client:
 
         Returns:
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             vmService = api.system_service().vms_service().service(machineId)
 
             if vmService.get() is None:
@@ -680,93 +683,73 @@ class Client:
 
             vmService.remove()
 
-        finally:
-            lock.release()
-
     def updateMachineMac(self, machineId: str, macAddres: str) -> None:
         """
         Changes the mac address of first nic of the machine to the one specified
         """
-        try:
-            lock.acquire(True)
-
-            api = self.__getApi()
-
+        with self.__api() as api:
             vmService = api.system_service().vms_service().service(machineId)
 
             if vmService.get() is None:
                 raise Exception('Machine not found')
 
-            nic = vmService.nics_service().list()[0]  # If has no nic, will raise an exception (IndexError)
+            try:
+                nic = vmService.nics_service().list()[0]  # If has no nic, will raise an exception (IndexError)
+            except IndexError:
+                raise Exception('Machine do not have network interfaces!!')
             nic.mac.address = macAddres
             nicService = vmService.nics_service().service(nic.id)
             nicService.update(nic)
-        except IndexError:
-            raise Exception('Machine do not have network interfaces!!')
-
-        finally:
-            lock.release()
 
     def fixUsb(self, machineId: str) -> None:
         # Fix for usb support
         if self._needsUsbFix:
-            try:
-                lock.acquire(True)
-
-                api = self.__getApi()
+            with self.__api() as api:
                 usb = ovirt.types.Usb(enabled=True, type=ovirt.types.UsbType.NATIVE)
                 vms = api.system_service().vms_service().service(machineId)
                 vmu = ovirt.types.Vm(usb=usb)
                 vms.update(vmu)
-            finally:
-                lock.release()
 
     def getConsoleConnection(self, machineId: str) -> typing.Optional[typing.MutableMapping[str, typing.Any]]:
         """
         Gets the connetion info for the specified machine
         """
         try:
-            lock.acquire(True)
-            api = self.__getApi()
-
-            vmService = api.system_service().vms_service().service(machineId)
-            vm = vmService.get()
-
-            if vm is None:
-                raise Exception('Machine not found')
-
-            display = vm.display
-            ticket = vmService.ticket()
-
-            # Get host subject
-            cert_subject = ''
-            if display.certificate is not None:
-                cert_subject = display.certificate.subject
-            else:
-                for i in api.system_service().hosts_service().list():
-                    for k in api.system_service().hosts_service().service(i.id).nics_service().list():
-                        if k.ip.address == display.address:
-                            cert_subject = i.certificate.subject
+            with self.__api() as api:
+                vmService = api.system_service().vms_service().service(machineId)
+                vm = vmService.get()
+
+                if vm is None:
+                    raise Exception('Machine not found')
+
+                display = vm.display
+                ticket = vmService.ticket()
+
+                # Get host subject
+                cert_subject = ''
+                if display.certificate is not None:
+                    cert_subject = display.certificate.subject
+                else:
+                    for i in api.system_service().hosts_service().list():
+                        for k in api.system_service().hosts_service().service(i.id).nics_service().list():
+                            if k.ip.address == display.address:
+                                cert_subject = i.certificate.subject
+                                break
+                        # If found
+                        if cert_subject != '':
                             break
-                    # If found
-                    if cert_subject != '':
-                        break
 
-            return {
-                'type': display.type.value,
-                'address': display.address,
-                'port': display.port,
-                'secure_port': display.secure_port,
-                'monitors': display.monitors,
-                'cert_subject': cert_subject,
-                'ticket': {
-                    'value': ticket.value,
-                    'expiry': ticket.expiry
+                return {
+                    'type': display.type.value,
+                    'address': display.address,
+                    'port': display.port,
+                    'secure_port': display.secure_port,
+                    'monitors': display.monitors,
+                    'cert_subject': cert_subject,
+                    'ticket': {
+                        'value': ticket.value,
+                        'expiry': ticket.expiry
+                    }
                 }
-            }
-
         except Exception:
             return None
-
-        finally:
-            lock.release()
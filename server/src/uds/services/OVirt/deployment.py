@@ -256,7 +256,7 @@ if sys.platform == 'win32':
 
     def __checkMachineState(self, chkState: typing.Union[typing.List[str], typing.Tuple[str, ...], str]) -> str:
         logger.debug('Checking that state of machine %s (%s) is %s', self._vmid, self._name, chkState)
-        state = self.service().getMachineState(self._vmid)
+        state = self.service().getMachineState(self._vmid, snapshot=True)
 
         # If we want to check an state and machine does not exists (except in case that we whant to check this)
         if state == 'unknown' and chkState != 'unknown':
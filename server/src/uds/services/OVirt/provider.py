@@ -37,6 +37,7 @@ from django.utils.translation import ugettext_noop as _
 from uds.core import services
 from uds.core.ui import gui
 from uds.core.util import validators
+from uds.core.util.state_snapshot import StateSnapshot
 
 from .service import OVirtLinkedService
 
@@ -50,6 +51,8 @@ if typing.TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 CACHE_TIME_FOR_SERVER = 1800
+# Validity of the machines states snapshot used for checking user services states
+SNAPSHOT_VALIDITY = 5
 
 
 class OVirtProvider(services.ServiceProvider):  # pylint: disable=too-many-public-methods
@@ -306,13 +309,16 @@ class OVirtProvider(services.ServiceProvider):  # pylint: disable=too-many-publi
         """
         return self.__getApi().getTemplateState(templateId)
 
-    def getMachineState(self, machineId: str) -> str:
+    def getMachineState(self, machineId: str, snapshot: bool = False) -> str:
         """
         Returns the state of the machine
-        This method do not uses cache at all (it always tries to get machine state from oVirt server)
+        This method do not uses cache at all (it always tries to get machine state from oVirt server),
+        unless snapshot is requested. In that case, state is looked up first on the machines states snapshot
+        shared by all user services of this provider (so their states are checked with just one api call)
 
         Args:
             machineId: Id of the machine to get state
+            snapshot: If the states snapshot can be used
 
         Returns:
             one of this values:
@@ -322,6 +328,10 @@ class OVirtProvider(services.ServiceProvider):  # pylint: disable=too-many-publi
              suspended, image_illegal, image_locked or powering_down
              Also can return'unknown' if Machine is not known
         """
+        if snapshot:
+            state = StateSnapshot(self.cache, 'statesSnapshot', SNAPSHOT_VALIDITY, self.__getApi().getVmsStates).get(machineId)
+            if state:
+                return state
         return self.__getApi().getMachineState(machineId)
 
     def removeTemplate(self, templateId: str) -> None:
@@ -342,13 +342,14 @@ class OVirtLinkedService(Service):  # pylint: disable=too-many-public-methods
         """
         self.parent().removeTemplate(templateId)
 
-    def getMachineState(self, machineId: str) -> str:
+    def getMachineState(self, machineId: str, snapshot: bool = False) -> str:
         """
         Invokes getMachineState from parent provider
         (returns if machine is "active" or "inactive"
 
         Args:
             machineId: If of the machine to get state
+            snapshot: If the provider machines states snapshot can be used
 
         Returns:
             one of this values:
@@ -358,7 +359,7 @@ class OVirtLinkedService(Service):  # pylint: disable=too-many-public-methods
              suspended, image_illegal, image_locked or powering_down
              Also can return'unknown' if Machine is not known
         """
-        return self.parent().getMachineState(machineId)
+        return self.parent().getMachineState(machineId, snapshot)
 
     def startMachine(self, machineId: str) -> None:
         """
@@ -434,6 +435,10 @@ class OVirtLinkedService(Service):  # pylint: disable=too-many-public-methods
         """
         return int(self.lenName.value)
 
+    def prefetchIds(self, count: int) -> None:
+        self.nameGenerator().prefetch(self.getBaseName(), count, self.getLenName())
+        self.macGenerator().prefetch(self.getMacRange(), count)
+
     def getDisplay(self) -> str:
         """
         Returns the selected display type (for created machines, for administration
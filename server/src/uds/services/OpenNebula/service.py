@@ -306,6 +306,9 @@ class LiveService(Service):
         """
         return self.lenName.num()
 
+    def prefetchIds(self, count: int) -> None:
+        self.nameGenerator().prefetch(self.getBaseName(), count, self.getLenName())
+
     def getConsoleConnection(self, machineId: str) -> typing.Dict[str, typing.Any]:
         return self.parent().getConsoleConnection(machineId)
 
@@ -189,7 +189,7 @@ class LiveDeployment(UserDeployment):  # pylint: disable=too-many-public-methods
 
     def __checkMachineState(self, chkState: str) -> str:
         logger.debug('Checking that state of machine %s (%s) is %s', self._vmid, self._name, chkState)
-        status = self.service().getMachineState(self._vmid)
+        status = self.service().getMachineState(self._vmid, snapshot=True)
 
         # If we want to check an state and machine does not exists (except in case that we whant to check this)
         if openstack.statusIsLost(status):
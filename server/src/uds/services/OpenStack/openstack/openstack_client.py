@@ -39,6 +39,8 @@ import requests
 
 from django.utils.translation import ugettext as _
 
+from uds.core.util import http_sessions
+
 # Not imported at runtime, just for type checking
 if typing.TYPE_CHECKING:
     pass
@@ -77,13 +79,14 @@ def getRecurringUrlJson(
         key: str,
         params: typing.Dict[str, str] = None,
         errMsg: str = None,
-        timeout: int = 10
+        timeout: int = 10,
+        session: typing.Optional[requests.Session] = None
     ) -> typing.Iterable[typing.Any]:
     counter = 0
     while True:
         counter += 1
         logger.debug('Requesting url #%s: %s / %s', counter, url, params)
-        r = requests.get(url, params=params, headers=headers, verify=VERIFY_SSL, timeout=timeout)
+        r = (session or requests).get(url, params=params, headers=headers, verify=VERIFY_SSL, timeout=timeout)
 
         ensureResponseIsValid(r, errMsg)
 
@@ -142,6 +145,8 @@ class Client:  # pylint: disable=too-many-public-methods
     _project: typing.Optional[str]
     _region: typing.Optional[str]
     _timeout: int
+    _sessionKey: str
+    _session: requests.Session
 
     # Legacyversion is True for versions <= Ocata
     def __init__(
@@ -178,6 +183,17 @@ class Client:  # pylint: disable=too-many-public-methods
             if self._authUrl[-1] != '/':
                 self._authUrl += '/'
 
+        # Connections to same openstack are kept alive and shared by all clients
+        # (per user, so providers using different credentials on same openstack does not share them)
+        self._sessionKey = 'openstack:{}:{}:{}'.format(self._authUrl, domain, username)
+        self._session = http_sessions.getSession(self._sessionKey)
+
+    def closeSession(self) -> None:
+        """
+        Drops the kept alive connections to this openstack (shared with every other client of it)
+        """
+        http_sessions.closeSession(self._sessionKey)
+
     def _getEndpointFor(self, type_: str) -> str:  # If no region is indicatad, first endpoint is returned
         if not self._catalog:
             raise Exception('No catalog for endpoints')
@@ -232,7 +248,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
         # logger.debug('Request data: {}'.format(data))
 
-        r = requests.post(
+        r = self._session.post(
             self._authUrl + 'v3/auth/tokens',
             data=json.dumps(data),
             headers={'content-type': 'application/json'},
@@ -267,7 +283,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='projects',
             errMsg='List Projects',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authRequired
@@ -277,7 +294,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='regions',
             errMsg='List Regions',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -289,7 +307,8 @@ class Client:  # pylint: disable=too-many-public-methods
             key='servers',
             params=params,
             errMsg='List Vms',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -299,7 +318,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='images',
             errMsg='List Images',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -309,7 +329,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='volume_types',
             errMsg='List Volume Types',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -320,7 +341,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='volumes',
             errMsg='List Volumes',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -330,7 +352,8 @@ class Client:  # pylint: disable=too-many-public-methods
                 headers=self._requestHeaders(),
                 key='snapshots',
                 errMsg='List snapshots',
-                timeout=self._timeout
+                timeout=self._timeout,
+                session=self._session
             ):
             if volumeId is None or s['volume_id'] == volumeId:
                 yield s
@@ -342,7 +365,8 @@ class Client:  # pylint: disable=too-many-public-methods
                 headers=self._requestHeaders(),
                 key='availabilityZoneInfo',
                 errMsg='List Availability Zones',
-                timeout=self._timeout
+                timeout=self._timeout,
+                session=self._session
             ):
             if az['zoneState']['available'] is True:
                 yield az['zoneName']
@@ -354,7 +378,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='flavors',
             errMsg='List Flavors',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -364,7 +389,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='networks',
             errMsg='List Networks',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
         if not nameFromSubnets:
             yield from nets
@@ -387,7 +413,8 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='subnets',
             errMsg='List Subnets',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -404,7 +431,8 @@ class Client:  # pylint: disable=too-many-public-methods
             key='ports',
             params=params,
             errMsg='List ports',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
@@ -414,12 +442,13 @@ class Client:  # pylint: disable=too-many-public-methods
             headers=self._requestHeaders(),
             key='security_groups',
             errMsg='List security groups',
-            timeout=self._timeout
+            timeout=self._timeout,
+            session=self._session
         )
 
     @authProjectRequired
     def getServer(self, serverId: str) -> typing.Dict[str, typing.Any]:
-        r = requests.get(
+        r = self._session.get(
             self._getEndpointFor('compute') + '/servers/{server_id}'.format(server_id=serverId),
             headers=self._requestHeaders(),
             verify=VERIFY_SSL,
@@ -430,7 +459,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def getVolume(self, volumeId: str) -> typing.Dict[str, typing.Any]:
-        r = requests.get(
+        r = self._session.get(
             self._getEndpointFor('volumev2') + '/volumes/{volume_id}'.format(volume_id=volumeId),
             headers=self._requestHeaders(),
             verify=VERIFY_SSL,
@@ -447,7 +476,7 @@ class Client:  # pylint: disable=too-many-public-methods
         States are:
             creating, available, deleting, error,  error_deleting
         """
-        r = requests.get(
+        r = self._session.get(
             self._getEndpointFor('volumev2') + '/snapshots/{snapshot_id}'.format(snapshot_id=snapshotId),
             headers=self._requestHeaders(),
             verify=VERIFY_SSL,
@@ -469,7 +498,7 @@ class Client:  # pylint: disable=too-many-public-methods
         if description:
             data['snapshot']['description'] = description
 
-        r = requests.put(
+        r = self._session.put(
             self._getEndpointFor('volumev2') + '/snapshots/{snapshot_id}'.format(snapshot_id=snapshotId),
             data=json.dumps(data),
             headers=self._requestHeaders(),
@@ -495,7 +524,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
         # First, ensure volume is in state "available"
 
-        r = requests.post(
+        r = self._session.post(
             self._getEndpointFor('volumev2') + '/snapshots',
             data=json.dumps(data),
             headers=self._requestHeaders(),
@@ -519,7 +548,7 @@ class Client:  # pylint: disable=too-many-public-methods
             }
         }
 
-        r = requests.post(
+        r = self._session.post(
             self._getEndpointFor('volumev2') + '/volumes',
             data=json.dumps(data),
             headers=self._requestHeaders(),
@@ -569,7 +598,7 @@ class Client:  # pylint: disable=too-many-public-methods
             }
         }
 
-        r = requests.post(self._getEndpointFor('compute') + '/servers',
+        r = self._session.post(self._getEndpointFor('compute') + '/servers',
                           data=json.dumps(data),
                           headers=self._requestHeaders(),
                           verify=VERIFY_SSL,
@@ -581,14 +610,14 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def deleteServer(self, serverId: str) -> None:
-        # r = requests.post(
+        # r = self._session.post(
         #     self._getEndpointFor('compute') + '/servers/{server_id}/action'.format(server_id=serverId),
         #     data='{"forceDelete": null}',
         #     headers=self._requestHeaders(),
         #     verify=VERIFY_SSL,
         #     timeout=self._timeout
         # )
-        r = requests.delete(
+        r = self._session.delete(
             self._getEndpointFor('compute') + '/servers/{server_id}'.format(server_id=serverId),
             headers=self._requestHeaders(),
             verify=VERIFY_SSL,
@@ -601,7 +630,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def deleteSnapshot(self, snapshotId: str) -> None:
-        r = requests.delete(
+        r = self._session.delete(
             self._getEndpointFor('volumev2') + '/snapshots/{snapshot_id}'.format(snapshot_id=snapshotId),
             headers=self._requestHeaders(),
             verify=VERIFY_SSL,
@@ -614,7 +643,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def startServer(self, serverId: str) -> None:
-        r = requests.post(
+        r = self._session.post(
             self._getEndpointFor('compute') + '/servers/{server_id}/action'.format(server_id=serverId),
             data='{"os-start": null}',
             headers=self._requestHeaders(),
@@ -628,7 +657,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def stopServer(self, serverId: str) -> None:
-        r = requests.post(
+        r = self._session.post(
             self._getEndpointFor('compute') + '/servers/{server_id}/action'.format(server_id=serverId),
             data='{"os-stop": null}',
             headers=self._requestHeaders(),
@@ -640,7 +669,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def suspendServer(self, serverId: str) -> None:
-        r = requests.post(
+        r = self._session.post(
             self._getEndpointFor('compute') + '/servers/{server_id}/action'.format(server_id=serverId),
             data='{"suspend": null}',
             headers=self._requestHeaders(),
@@ -652,7 +681,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def resumeServer(self, serverId: str) -> None:
-        r = requests.post(
+        r = self._session.post(
             self._getEndpointFor('compute') + '/servers/{server_id}/action'.format(server_id=serverId),
             data='{"resume": null}',
             headers=self._requestHeaders(),
@@ -664,7 +693,7 @@ class Client:  # pylint: disable=too-many-public-methods
 
     @authProjectRequired
     def resetServer(self, serverId: str) -> None:
-        r = requests.post(   # pylint: disable=unused-variable
+        r = self._session.post(   # pylint: disable=unused-variable
             self._getEndpointFor('compute') + '/servers/{server_id}/action'.format(server_id=serverId),
             data='{"reboot":{"type":"HARD"}}',
             headers=self._requestHeaders(),
@@ -679,7 +708,7 @@ class Client:  # pylint: disable=too-many-public-methods
         # First, ensure requested api is supported
         # We need api version 3.2 or greater
         try:
-            r = requests.get(
+            r = self._session.get(
                 self._authUrl,
                 verify=VERIFY_SSL,
                 headers=self._requestHeaders()
@@ -126,6 +126,13 @@ class OpenStackProvider(ServiceProvider):
         if values is not None:
             self.timeout.value = validators.validateTimeout(self.timeout.value)
 
+    def releaseConnections(self) -> None:
+        self.api().closeSession()
+        self._api = None
+
+    def destroy(self) -> None:
+        self.releaseConnections()
+
     def api(self, projectId=None, region=None) -> openstack.Client:
         projectId = projectId or self.tenant.value or None
         region = region or self.region.value or None
@@ -131,6 +131,12 @@ class ProviderLegacy(ServiceProvider):
         if values is not None:
             self.timeout.value = validators.validateTimeout(self.timeout.value)
 
+    def releaseConnections(self) -> None:
+        self.api().closeSession()
+
+    def destroy(self) -> None:
+        self.releaseConnections()
+
     def api(self, projectId=None, region=None) -> openstack.Client:
         return openstack.Client(
             self.host.value,
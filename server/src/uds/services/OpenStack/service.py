@@ -37,6 +37,7 @@ from django.utils.translation import ugettext_noop as _
 from uds.core.transports import protocols
 from uds.core.services import Service, types as serviceTypes
 from uds.core.util import tools
+from uds.core.util.state_snapshot import StateSnapshot
 from uds.core.ui import gui
 
 from .publication import LivePublication
@@ -53,6 +54,9 @@ if typing.TYPE_CHECKING:
     from .provider_legacy import ProviderLegacy
     Provider = typing.Union[OpenStackProvider, ProviderLegacy]
 
+# Validity of the servers states snapshot used for checking user services states
+SNAPSHOT_VALIDITY = 5
+
 
 class LiveService(Service):
     """
@@ -256,12 +260,15 @@ class LiveService(Service):
         """
         self.api.deleteSnapshot(templateId)
 
-    def getMachineState(self, machineId: str) -> str:
+    def getMachineState(self, machineId: str, snapshot: bool = False) -> str:
         """
-        Invokes getServer from openstack client
+        Invokes getServer from openstack client.
+        If snapshot, state is looked up first on the servers states snapshot shared by all user services
+        of this service (so their states are checked with just one api call)
 
         Args:
             machineId: If of the machine to get state
+            snapshot: If the servers states snapshot can be used
 
         Returns:
             one of this values:
@@ -284,6 +291,12 @@ class LiveService(Service):
                 VERIFY_RESIZE. System is awaiting confirmation that the server is operational after a move or resize.
                 SHUTOFF. The server was powered down by the user, either through the OpenStack Compute API or from within the server. For example, the user issued a shutdown -h command from within the server. If the OpenStack Compute manager detects that the VM was powered down, it transitions the server to the SHUTOFF status.
         """
+        if snapshot:
+            status = StateSnapshot(self.cache, 'statesSnapshot', SNAPSHOT_VALIDITY, lambda: {s['id']: s['status'] for s in self.api.listServers(detail=True)}).get(machineId)
+            # Errors are logged (with its fault) by direct check
+            if status and status not in ('ERROR', 'DELETED'):
+                return status
+
         server = self.api.getServer(machineId)
         if server['status'] in ('ERROR', 'DELETED'):
             logger.warning('Got server status %s for %s: %s', server['status'], machineId, server.get('fault'))
@@ -377,3 +390,6 @@ class LiveService(Service):
         Returns the length of numbers part
         """
         return int(self.lenName.value)
+
+    def prefetchIds(self, count: int) -> None:
+        self.nameGenerator().prefetch(self.getBaseName(), count, self.getLenName())
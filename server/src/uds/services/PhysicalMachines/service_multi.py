@@ -39,7 +39,7 @@ from django.db import transaction
 
 from uds.core.ui import gui
 from uds.core.util import log
-from uds.core.util import connection
+from uds.core.util import reachability
 from uds.core.services import types as serviceTypes
 
 from .deployment import IPMachineDeployed
@@ -150,15 +150,23 @@ class IPMachinesService(IPServiceBase):
     def getUnassignedMachine(self) -> typing.Optional[str]:
         # Search first unassigned machine
         try:
-            for ip in self._ips:
-                theIP = ip.split('~')[0]
+            assigned = self.storage.getMany(ip.split('~')[0] for ip in self._ips)
+            candidates = [ip for ip, v in assigned.items() if v is None]
+            if self._port > 0 and candidates:  # Skip the ones that recently failed, checked with just one query
+                failed = self.cache.getMany('port{}'.format(ip) for ip in candidates)
+                candidates = [ip for ip in candidates if not failed['port{}'.format(ip)]]
+            # Next candidates are probed concurrently, so a non responding host does not delay checking next ones
+            probes: typing.Dict[str, typing.Any] = {}
+            for n, theIP in enumerate(candidates):
+                if self._port > 0:
+                    for ip in candidates[n:n + 8]:
+                        if ip not in probes:
+                            probes[ip] = reachability.prober().probe(ip, self._port, timeout=0.5)
                 if self.storage.readData(theIP) is None:
-                    if self._port > 0 and self.cache.get('port{}'.format(theIP)):
-                        continue  # The check failed not so long ago, skip it...
                     self.storage.saveData(theIP, theIP)
                     # Now, check if it is available on port, if required...
                     if self._port > 0:
-                        if connection.testServer(theIP, self._port, timeOut=0.5) is False:
+                        if probes[theIP].result() is False:
                             # Log into logs of provider, so it can be "shown" on services logs
                             self.parent().doLog(log.WARN, 'Host {} not accesible on port {}'.format(theIP, self._port))
                             self.storage.remove(theIP)  # Return Machine to pool
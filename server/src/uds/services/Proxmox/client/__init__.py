@@ -9,6 +9,7 @@ import requests
 from . import types
 
 from uds.core.util.decorators import allowCache, ensureConected
+from uds.core.util import http_sessions
 
 # DEFAULT_PORT = 8006
 
@@ -55,6 +56,9 @@ class ProxmoxClient:
     _ticket: str
     _csrf: str
 
+    _sessionKey: str
+    _session: requests.Session
+
     cache: typing.Optional['Cache']
 
     def __init__(
@@ -73,6 +77,10 @@ class ProxmoxClient:
         self._validateCert = validateCertificate
         self._timeout = timeout
         self._url = 'https://{}:{}/api2/json/'.format(self._host, self._port)
+        # Connections to same proxmox host are kept alive and shared by all clients
+        # (per user, so providers using different credentials on same host does not share cookies)
+        self._sessionKey = 'proxmox:{}:{}:{}'.format(self._host, self._port, username)
+        self._session = http_sessions.getSession(self._sessionKey)
 
         self.cache = cache
 
@@ -82,6 +90,12 @@ class ProxmoxClient:
         # Disable warnings from urllib for 
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+    def closeSession(self) -> None:
+        """
+        Drops the kept alive connections to this host (shared with every other client of it)
+        """
+        http_sessions.closeSession(self._sessionKey)
+
     @property
     def headers(self):
         return {
@@ -114,7 +128,7 @@ class ProxmoxClient:
         return self._url + path
 
     def _get(self, path: str) -> typing.Any:
-        result = requests.get(
+        result = self._session.get(
             self._getPath(path),
             headers=self.headers,
             cookies={'PVEAuthCookie': self._ticket},
@@ -127,7 +141,7 @@ class ProxmoxClient:
         return ProxmoxClient.checkError(result)
 
     def _post(self, path: str, data: typing.Optional[typing.Iterable[typing.Tuple[str, str]]] = None) -> typing.Any:
-        result = requests.post(
+        result = self._session.post(
             self._getPath(path),
             data=data,
             headers=self.headers,
@@ -141,7 +155,7 @@ class ProxmoxClient:
         return ProxmoxClient.checkError(result)
 
     def _delete(self, path: str, data: typing.Optional[typing.Iterable[typing.Tuple[str, str]]] = None) -> typing.Any:
-        result = requests.delete(
+        result = self._session.delete(
             self._getPath(path),
             data=data,
             headers=self.headers,
@@ -166,7 +180,7 @@ class ProxmoxClient:
                 return
 
         try:
-            result = requests.post(
+            result = self._session.post(
                 url=self._getPath('access/ticket'),
                 data=self._credentials,
                 headers=self.headers,
@@ -338,6 +352,13 @@ class ProxmoxClient:
     def getTask(self, node: str, upid: str) -> types.TaskStatus:
         return types.TaskStatus.fromJson(self._get('nodes/{}/tasks/{}/status'.format(node, urllib.parse.quote(upid))))
 
+    @ensureConected
+    def listTasks(self) -> typing.List[types.TaskStatus]:
+        """
+        Recent (running and finished) tasks of all cluster nodes
+        """
+        return [types.TaskStatus.fromClusterTask(t) for t in self._get('cluster/tasks')['data']]
+
     @ensureConected
     @allowCache('vms', CACHE_DURATION, cachingArgs=1, cachingKWArgs='node', cachingKeyFnc=cachingKeyHelper)
     def listVms(self, node: typing.Union[None, str, typing.Iterable[str]] = None) -> typing.List[types.VMInfo]:
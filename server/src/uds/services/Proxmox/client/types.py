@@ -121,6 +121,12 @@ class TaskStatus(typing.NamedTuple):
     def fromJson(dictionary: typing.MutableMapping[str, typing.Any]) -> 'TaskStatus':
         return convertFromDict(TaskStatus, dictionary['data'])
 
+    @staticmethod
+    def fromClusterTask(dictionary: typing.MutableMapping[str, typing.Any]) -> 'TaskStatus':
+        # On cluster tasks list, "status" is the exit status, and only finished tasks has "endtime"
+        finished = 'endtime' in dictionary
+        return convertFromDict(TaskStatus, dict(dictionary, status='stopped' if finished else 'running', exitstatus=dictionary.get('status', '') if finished else ''))
+
     def isRunning(self) -> bool:
         return self.status == 'running'
 
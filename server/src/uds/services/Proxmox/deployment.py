@@ -397,7 +397,7 @@ if sys.platform == 'win32':
 
         node, upid = self.__getTask()
 
-        task = self.service().getTaskInfo(node, upid)
+        task = self.service().getTaskInfo(node, upid, snapshot=True)
 
         if task.isErrored():
             return self.__error(task.exitstatus)
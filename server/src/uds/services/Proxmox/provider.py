@@ -35,6 +35,7 @@ from django.utils.translation import ugettext_noop as _
 from uds.core import services
 from uds.core.ui import gui
 from uds.core.util import validators
+from uds.core.util.state_snapshot import StateSnapshot
 
 from .service import ProxmoxLinkedService
 
@@ -48,6 +49,8 @@ if typing.TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 CACHE_TIME_FOR_SERVER = 1800
+# Validity of the cluster tasks snapshot used for checking user services states
+SNAPSHOT_VALIDITY = 5
 
 
 class ProxmoxProvider(services.ServiceProvider):  # pylint: disable=too-many-public-methods
@@ -93,6 +96,13 @@ class ProxmoxProvider(services.ServiceProvider):  # pylint: disable=too-many-pub
             self.timeout.value = validators.validateTimeout(self.timeout.value)
             logger.debug(self.host.value)
 
+    def releaseConnections(self) -> None:
+        self.__getApi().closeSession()
+        self._api = None
+
+    def destroy(self) -> None:
+        self.releaseConnections()
+
     def testConnection(self) -> bool:
         """
         Test that conection to Proxmox server is fine
@@ -152,9 +162,20 @@ class ProxmoxProvider(services.ServiceProvider):  # pylint: disable=too-many-pub
     def removeMachine(self, vmId: int) -> client.types.UPID:
         return self.__getApi().deleteVm(vmId)
 
-    def getTaskInfo(self, node: str, upid: str) -> client.types.TaskStatus:
+    def getTaskInfo(self, node: str, upid: str, snapshot: bool = False) -> client.types.TaskStatus:
+        """
+        Returns task status. If snapshot, it is looked up first on the cluster tasks snapshot
+        shared by all user services of this provider (so their states are checked with just one api call)
+        """
+        if snapshot:
+            task = self.__tasksSnapshot().get(upid)
+            if task:
+                return task
         return self.__getApi().getTask(node, upid)
 
+    def __tasksSnapshot(self) -> StateSnapshot:
+        return StateSnapshot(self.cache, 'tasksSnapshot', SNAPSHOT_VALIDITY, lambda: {t.upid: t for t in self.__getApi().listTasks()})
+
     def enableHA(self, vmId: int, started: bool = False, group: typing.Optional[str] = None) -> None:
         self.__getApi().enableVmHA(vmId, started, group)
 
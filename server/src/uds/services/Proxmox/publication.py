@@ -110,7 +110,7 @@ class ProxmoxPublication(services.Publication):
             return self._state
         node, upid = self._task.split(',')
         try:
-            task = self.service().getTaskInfo(node, upid)
+            task = self.service().getTaskInfo(node, upid, snapshot=True)
             if task.isRunning():
                 return State.RUNNING
         except Exception as e:
@@ -233,8 +233,8 @@ class ProxmoxLinkedService(Service):  # pylint: disable=too-many-public-methods
         config = self.parent().getMachineConfiguration(vmId)
         return config.networks[0].mac
 
-    def getTaskInfo(self, node: str, upid: str) -> 'client.types.TaskStatus':
-        return self.parent().getTaskInfo(node, upid)
+    def getTaskInfo(self, node: str, upid: str, snapshot: bool = False) -> 'client.types.TaskStatus':
+        return self.parent().getTaskInfo(node, upid, snapshot)
 
     def startMachine(self,vmId: int) -> 'client.types.UPID':
         return self.parent().startMachine(vmId)
@@ -273,6 +273,9 @@ class ProxmoxLinkedService(Service):  # pylint: disable=too-many-public-methods
     def getLenName(self) -> int:
         return int(self.lenName.value)
 
+    def prefetchIds(self, count: int) -> None:
+        self.nameGenerator().prefetch(self.getBaseName(), count, self.getLenName())
+
     def isHaEnabled(self) -> bool:
         return self.ha.isTrue()
 
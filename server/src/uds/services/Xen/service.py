@@ -399,3 +399,7 @@ class XenLinkedService(Service):  # pylint: disable=too-many-public-methods
         Returns the length of numbers part
         """
         return int(self.lenName.value)
+
+    def prefetchIds(self, count: int) -> None:
+        self.nameGenerator().prefetch(self.getBaseName(), count, self.getLenName())
+        self.macGenerator().prefetch(self.getMacRange(), count)
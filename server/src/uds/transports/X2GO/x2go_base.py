@@ -43,7 +43,7 @@ from uds.core.managers.user_preferences import CommonPrefs
 from uds.core.ui import gui
 from uds.core import transports
 from uds.core.util import os_detector as OsDetector
-from uds.core.util import connection
+from uds.core.util import reachability
 
 # Not imported at runtime, just for type checking
 if typing.TYPE_CHECKING:
@@ -204,7 +204,7 @@ class BaseX2GOTransport(transports.Transport):
         ready = self.cache.get(ip)
         if ready is None:
             # Check again for ready
-            if connection.testServer(ip, 22):
+            if reachability.prober().isReachable(ip, 22):
                 self.cache.put(ip, 'Y', READY_CACHE_TIMEOUT)
                 return True
             self.cache.put(ip, 'N', READY_CACHE_TIMEOUT)
@@ -84,7 +84,7 @@ def checkLogin(  # pylint: disable=too-many-branches, too-many-statements
         except Exception:
             authenticator = Authenticator()
         userName = form.cleaned_data['user']
-        if GlobalConfig.LOWERCASE_USERNAME.getBool(True) is True:
+        if GlobalConfig.LOWERCASE_USERNAME.getBool() is True:
             userName = userName.lower()
 
         cache = Cache('auth')
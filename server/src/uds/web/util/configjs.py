@@ -127,13 +127,13 @@ def udsJs(request: 'HttpRequest') -> str:
         'csrf': csrf_token,
         'image_size': Image.MAX_IMAGE_SIZE,
         'experimental_features': GlobalConfig.EXPERIMENTAL_FEATURES.getBool(),
-        'reload_time': GlobalConfig.RELOAD_TIME.getInt(True),
+        'reload_time': GlobalConfig.RELOAD_TIME.getInt(),
         'site_name': GlobalConfig.SITE_NAME.get(),
         'site_copyright_info': GlobalConfig.SITE_COPYRIGHT.get(),
         'site_copyright_link': GlobalConfig.SITE_COPYRIGHT_LINK.get(),
         'site_logo_name': GlobalConfig.SITE_LOGO_NAME.get(),
         'site_information': GlobalConfig.SITE_INFO.get(),
-        'site_filter_on_top': GlobalConfig.SITE_FILTER_ONTOP.getBool(True),
+        'site_filter_on_top': GlobalConfig.SITE_FILTER_ONTOP.getBool(),
         'launcher_wait_time': 5000,
         'messages': {
             # Calendar denied message
@@ -198,7 +198,7 @@ def udsJs(request: 'HttpRequest') -> str:
         config['urls']['admin'] = reverse('uds.admin.views.index')
         config['urls']['rest'] = reverse('REST', kwargs={'arguments': ''})
         # Admin config
-        page_size = GlobalConfig.ADMIN_PAGESIZE.getInt(True)
+        page_size = GlobalConfig.ADMIN_PAGESIZE.getInt()
         # Fix page size to razonable usable values
         page_size = 10 if page_size < 10 else 50 if page_size > 50 else page_size
         config['admin'] = {
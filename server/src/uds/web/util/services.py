@@ -28,6 +28,7 @@
 '''
 @author: Adolfo Gómez, dkmaster at dkmon dot com
 '''
+import pickle
 import logging
 import typing
 
@@ -35,20 +36,63 @@ from django.utils.translation import ugettext
 from django.utils import formats
 from django.urls import reverse
 
-from uds.models import ServicePool, Transport, Network, ServicePoolGroup, MetaPool, getSqlDatetime
+from uds.models import ServicePool, Transport, Network, ServicePoolGroup, MetaPool, UserService, getSqlDatetime
 from uds.core.util.config import GlobalConfig
 from uds.core.util import html
+from uds.core.util import states
 
 from uds.core.managers import userServiceManager
 
 # Not imported at runtime, just for type checking
 if typing.TYPE_CHECKING:
+    from datetime import datetime
     from django.http import HttpRequest # pylint: disable=ungrouped-imports
+    from uds.models import User
 
 
 logger = logging.getLogger(__name__)
 
 
+def _toBeReplaced(pools: typing.Iterable[ServicePool], user: 'User') -> typing.Dict[int, 'datetime']:
+    """Batched version of ServicePool.toBeReplaced for a list of pools
+
+    Uses prefetched publications & osmanagers, and just one query to get the publications
+    of the user services assigned to this user on all pools
+
+    Returns:
+        typing.Dict[int, datetime] -- pool id -> date of replacement, only for pools that are going to be replaced
+    """
+    activePubs: typing.Dict[int, int] = {}
+    for pool in pools:
+        pub = next((p for p in pool.publications.all() if p.state == states.publication.USABLE), None)
+        # If no publication or current revision, it's not going to be replaced
+        if pub is None or (pool.osmanager and pool.osmanager.getInstance().isPersistent()):
+            continue
+        activePubs[pool.id] = pub.id
+
+    if not activePubs:
+        return {}
+
+    assigned: typing.Dict[int, typing.Optional[int]] = {}
+    for poolId, publicationId in UserService.objects.filter(
+            deployed_service_id__in=activePubs.keys(), cache_level=0, user=user, state__in=states.userService.VALID_STATES
+        ).values_list('deployed_service_id', 'publication_id'):  # @UndefinedVariable
+        assigned.setdefault(poolId, publicationId)
+
+    result: typing.Dict[int, 'datetime'] = {}
+    for pool in pools:
+        if pool.id not in assigned or assigned[pool.id] is None or assigned[pool.id] == activePubs[pool.id]:
+            continue
+        try:
+            ret = pool.recoverValue('toBeReplacedIn')
+            if ret:
+                result[pool.id] = pickle.loads(ret)
+        except Exception:
+            pass
+
+    return result
+
+
 def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
     """Obtains the service data dictionary will all available services for this request
 
@@ -73,6 +117,22 @@ def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  #
     availMetaPools = list(MetaPool.getForGroups(groups, request.user))  # Pass in user to get "number_assigned" to optimize
     now = getSqlDatetime()
 
+    # Transports and calendars are shared between pools, so results are memoized by id
+    # Transports networks are prefetched, so ip checks are done in memory
+    validTransports: typing.Dict[int, bool] = {}
+    checkedCalendars: typing.Dict[int, bool] = {}
+
+    def isValidTransport(t: Transport) -> bool:
+        if t.id not in validTransports:
+            try:
+                typeTrans = t.getType()
+                validTransports[t.id] = bool(
+                    typeTrans and t.validForIp(request.ip) and typeTrans.supportsOs(os['OS']) and t.validForOs(os['OS'])
+                )
+            except Exception:
+                validTransports[t.id] = False
+        return validTransports[t.id]
+
     # Information for administrators
     nets = ''
     validTrans = ''
@@ -102,8 +162,7 @@ def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  #
             # if pool.isInMaintenance():
             #    continue
             for t in pool.transports.all():
-                typeTrans = t.getType()
-                if t.getType() and t.validForIp(request.ip) and typeTrans.supportsOs(os['OS']) and t.validForOs(os['OS']):
+                if isValidTransport(t):
                     hasUsablePools = True
                     break
 
@@ -137,13 +196,18 @@ def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  #
                 'allow_users_remove': False,
                 'allow_users_reset': False,
                 'maintenance': meta.isInMaintenance(),
-                'not_accesible': not meta.isAccessAllowed(now),
+                'not_accesible': not meta.isAccessAllowed(now, checkedCalendars),
                 'in_use': in_use,
                 'to_be_replaced': None,
                 'to_be_replaced_text': '',
                 'custom_calendar_text': meta.calendar_message,
             })
 
+    # Only add toBeReplaced info in case we allow it. This will generate some "overload" on the services
+    toBeReplacedPools: typing.Dict[int, 'datetime'] = {}
+    if GlobalConfig.NOTIFY_REMOVAL_BY_PUB.getBool(False):
+        toBeReplacedPools = _toBeReplaced([svr for svr in availServicePools if not svr.is_meta and svr.pubs_active > 0], request.user)
+
     # Now generic user service
     svr: ServicePool
     for svr in availServicePools:
@@ -155,12 +219,8 @@ def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  #
 
         trans = []
         for t in sorted(svr.transports.all(), key=lambda x: x.priority):   # In memory sort, allows reuse prefetched and not too big array
-            try:
-                typeTrans = t.getType()
-            except Exception:
-                continue
-            if t.validForIp(request.ip) and typeTrans.supportsOs(os['OS']) and t.validForOs(os['OS']):
-                if typeTrans.ownLink:
+            if isValidTransport(t):
+                if t.getType().ownLink:
                     link = reverse('TransportOwnLink', args=('F' + svr.uuid, t.uuid))
                 else:
                     link = html.udsAccessLink(request, 'F' + svr.uuid, t.uuid)
@@ -191,8 +251,7 @@ def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  #
 
         group = svr.servicesPoolGroup.as_dict if svr.servicesPoolGroup else ServicePoolGroup.default().as_dict
 
-        # Only add toBeReplaced info in case we allow it. This will generate some "overload" on the services
-        toBeReplaced = svr.toBeReplaced(request.user) if svr.pubs_active > 0 and GlobalConfig.NOTIFY_REMOVAL_BY_PUB.getBool(False) else None
+        toBeReplaced = toBeReplacedPools.get(svr.id)
         # tbr = False
         if toBeReplaced:
             toBeReplaced = formats.date_format(toBeReplaced, "SHORT_DATETIME_FORMAT")
@@ -214,7 +273,7 @@ def getServicesData(request: 'HttpRequest') -> typing.Dict[str, typing.Any]:  #
             'allow_users_remove': svr.allow_users_remove,
             'allow_users_reset': svr.allow_users_reset,
             'maintenance': svr.isInMaintenance(),
-            'not_accesible': not svr.isAccessAllowed(now),
+            'not_accesible': not svr.isAccessAllowed(now, checkedCalendars),
             'in_use': in_use,
             'to_be_replaced': toBeReplaced,
             'to_be_replaced_text': toBeReplacedTxt,
@@ -41,6 +41,6 @@ def custom(request, component):
 
     if component == 'styles.css':
         content_type = 'text/css'
-        value = GlobalConfig.SITE_CSS.get(True)
+        value = GlobalConfig.SITE_CSS.get()
 
     return HttpResponse(content_type=content_type, content=value)